@@ -0,0 +1,168 @@
+"""
+NetTools - Speed Test Analytics
+Vectorized (NumPy) statistics over speed test history
+"""
+
+import logging
+import threading
+import time
+import warnings
+
+import numpy as np
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('download_speed', 'upload_speed', 'ping', 'jitter')
+PERCENTILES = (5, 25, 50, 75, 95)
+DAY_NAMES = ('lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom')
+
+# Cache of computed analytics, keyed by (range, test_type, window, z, data version)
+CACHE_TTL = 300  # relative ranges slide with time even when no data changes
+CACHE_MAX_ENTRIES = 32
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_speed_test_analytics(range_filter: str = '30d', test_type: str = 'wan',
+                             window: int = 12, z_threshold: float = 3.0) -> dict:
+    """Return (cached) analytics for a speed test range."""
+    key = (range_filter, test_type, window, z_threshold, db.get_data_versions()['speed_tests'])
+    now = time.monotonic()
+
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and now - hit[0] < CACHE_TTL:
+            return hit[1]
+
+    timestamps, values = db.get_speed_test_columns(range_filter, test_type, METRICS)
+    result = compute_analytics(timestamps, values, window=window, z_threshold=z_threshold)
+    result['range'] = range_filter
+    result['test_type'] = test_type
+
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            # Evict the oldest entry
+            del _cache[min(_cache, key=lambda k: _cache[k][0])]
+        _cache[key] = (now, result)
+    return result
+
+
+def compute_analytics(timestamps: list, values: list, window: int = 12,
+                      z_threshold: float = 3.0) -> dict:
+    """
+    Compute summary analytics in one vectorized pass.
+
+    Args:
+        timestamps: list of 'YYYY-MM-DD HH:MM:SS' strings (ascending)
+        values: list of row tuples, one column per entry in METRICS (None allowed)
+        window: rolling window size (number of tests)
+        z_threshold: |z| above which a value is flagged as an anomaly
+
+    Returns:
+        dict with count, percentiles, rolling, hourly, weekday and anomalies
+    """
+    n = len(timestamps)
+    if n == 0:
+        return {'count': 0, 'percentiles': {}, 'rolling': {}, 'hourly': {},
+                'weekday': {}, 'anomalies': []}
+
+    ts = np.array(timestamps, dtype='datetime64[s]')
+    data = np.array(values, dtype=np.float64).reshape(n, len(METRICS))  # None -> NaN
+    valid = ~np.isnan(data)
+
+    # --- Percentiles (all metrics at once) ---
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        pct = np.nanpercentile(data, PERCENTILES, axis=0)  # shape (len(PERCENTILES), metrics)
+
+    # --- Rolling mean / median ---
+    window = max(1, min(int(window), n))
+    windows = np.lib.stride_tricks.sliding_window_view(data, window, axis=0)  # (n-w+1, metrics, w)
+    with warnings.catch_warnings():
+        # All-NaN windows (e.g. LAN tests without ping) legitimately yield NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        rolling_mean = np.nanmean(windows, axis=2)
+        rolling_median = np.nanmedian(windows, axis=2)
+    rolling_ts = ts[window - 1:]
+
+    # --- Hour-of-day and day-of-week profiles ---
+    days = ts.astype('datetime64[D]')
+    hours = (ts - days).astype('timedelta64[h]').astype(np.int64)
+    weekdays = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    hourly = _group_means(hours, data, valid, 24)
+    weekday = _group_means(weekdays, data, valid, 7)
+
+    # --- Z-score anomalies ---
+    with warnings.catch_warnings(), np.errstate(all='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(data, axis=0)
+        std = np.nanstd(data, axis=0)
+        z = (data - mean) / np.where(std > 0, std, np.nan)
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) > z_threshold)
+    ts_str = np.datetime_as_string(ts[rows], unit='s')
+
+    anomalies = [
+        {
+            'timestamp': t.replace('T', ' '),
+            'metric': METRICS[c],
+            'value': round(float(data[r, c]), 2),
+            'z': round(float(z[r, c]), 2),
+        }
+        for t, r, c in zip(ts_str.tolist(), rows.tolist(), cols.tolist())
+    ]
+
+    rolling_ts_str = [t.replace('T', ' ') for t in np.datetime_as_string(rolling_ts, unit='s').tolist()]
+
+    return {
+        'count': n,
+        'window': window,
+        'percentiles': {
+            metric: {f"p{p}": _round(pct[i, m]) for i, p in enumerate(PERCENTILES)}
+            for m, metric in enumerate(METRICS)
+        },
+        'rolling': {
+            'timestamps': rolling_ts_str,
+            **{
+                metric: {'mean': _to_list(rolling_mean[:, m]), 'median': _to_list(rolling_median[:, m])}
+                for m, metric in enumerate(METRICS)
+            },
+        },
+        'hourly': {
+            'hours': list(range(24)),
+            'count': hourly[1].tolist(),
+            **{metric: _to_list(hourly[0][:, m]) for m, metric in enumerate(METRICS)},
+        },
+        'weekday': {
+            'days': list(DAY_NAMES),
+            'count': weekday[1].tolist(),
+            **{metric: _to_list(weekday[0][:, m]) for m, metric in enumerate(METRICS)},
+        },
+        'anomalies': anomalies,
+    }
+
+
+def _group_means(groups: np.ndarray, data: np.ndarray, valid: np.ndarray, size: int):
+    """
+    Per-group means of every metric column, ignoring NaNs.
+    Returns (means with shape (size, metrics), row counts per group).
+    """
+    # Offset each column's group ids so one bincount handles every metric
+    cols = data.shape[1]
+    offsets = groups[:, None] + np.arange(cols) * size
+    sums = np.bincount(offsets[valid], weights=data[valid], minlength=size * cols)
+    counts = np.bincount(offsets[valid], minlength=size * cols)
+    with np.errstate(all='ignore'):
+        means = (sums / counts).reshape(cols, size).T
+    return means, np.bincount(groups, minlength=size)
+
+
+def _round(value) -> float:
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def _to_list(arr: np.ndarray) -> list:
+    """Round and convert to a JSON-friendly list (NaN -> None)."""
+    rounded = np.round(arr, 2)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
@@ -0,0 +1,222 @@
+"""
+NetTools - Native ARP Sweep
+In-process ARP discovery (replaces forking arp-scan and parsing its output).
+
+- Requests are paced to a packet rate; each round only re-sends to the
+  addresses that have not answered yet
+- Replies are matched against a hash table of pending addresses, so late,
+  duplicate or unsolicited (gratuitous) replies are ignored
+- Packets go through a backend: RawSocketBackend (AF_PACKET, Linux, needs
+  CAP_NET_RAW) on real interfaces or veth pairs, ReplayBackend to feed
+  captured frames (pcap) without hardware
+- arp_sweep() is a generator: devices are yielded as they answer
+"""
+
+import fcntl
+import ipaddress
+import select
+import socket
+import struct
+import time
+from typing import Iterable, Iterator, Optional
+
+ETH_P_ARP = 0x0806
+ARP_REQUEST = 1
+ARP_REPLY = 2
+BROADCAST = b'\xff' * 6
+# Ethernet header + ARP payload, padded to the 60-byte Ethernet minimum
+_FRAME = struct.Struct('!6s6sH HHBBH 6s4s6s4s')
+_MIN_FRAME = 60
+
+SIOCGIFADDR = 0x8915
+SIOCGIFHWADDR = 0x8927
+
+
+def format_mac(mac: bytes) -> str:
+    return ':'.join(f'{b:02X}' for b in mac)
+
+
+def build_request(src_mac: bytes, src_ip: bytes, target_ip: bytes) -> bytes:
+    """Broadcast 'who-has target_ip' frame."""
+    frame = _FRAME.pack(BROADCAST, src_mac, ETH_P_ARP, 1, 0x0800, 6, 4, ARP_REQUEST,
+                        src_mac, src_ip, b'\x00' * 6, target_ip)
+    return frame.ljust(_MIN_FRAME, b'\x00')
+
+
+def build_reply(src_mac: bytes, src_ip: bytes, dst_mac: bytes, dst_ip: bytes) -> bytes:
+    """'src_ip is-at src_mac' frame (used by test backends)."""
+    frame = _FRAME.pack(dst_mac, src_mac, ETH_P_ARP, 1, 0x0800, 6, 4, ARP_REPLY,
+                        src_mac, src_ip, dst_mac, dst_ip)
+    return frame.ljust(_MIN_FRAME, b'\x00')
+
+
+def parse_reply(frame: bytes) -> Optional[tuple]:
+    """(sender_mac, sender_ip) of an IPv4 ARP reply frame, None for anything else."""
+    if len(frame) < _FRAME.size:
+        return None
+    (_, _, ethertype, htype, ptype, hlen, plen, op,
+     sender_mac, sender_ip, _, _) = _FRAME.unpack_from(frame)
+    if ethertype != ETH_P_ARP or op != ARP_REPLY or (htype, ptype, hlen, plen) != (1, 0x0800, 6, 4):
+        return None
+    return sender_mac, sender_ip
+
+
+# --- Backends ---
+class PacketBackend:
+    """Link-layer transport used by arp_sweep."""
+
+    #: Source MAC (6 bytes) and IPv4 address (4 bytes) of the requests
+    mac = b'\x00' * 6
+    ip = b'\x00' * 4
+
+    def send(self, frame: bytes):
+        raise NotImplementedError
+
+    def recv(self, timeout: float) -> Optional[bytes]:
+        """Next received frame, or None if nothing arrives within timeout seconds."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawSocketBackend(PacketBackend):
+    """AF_PACKET socket bound to an interface, receiving only ARP frames."""
+
+    def __init__(self, interface: str):
+        self.interface = interface
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        try:
+            self.sock.bind((interface, ETH_P_ARP))
+            self.sock.setblocking(False)
+            request = struct.pack('256s', interface[:15].encode())
+            self.mac = fcntl.ioctl(self.sock, SIOCGIFHWADDR, request)[18:24]
+            self.ip = fcntl.ioctl(self.sock, SIOCGIFADDR, request)[20:24]
+        except OSError:
+            self.sock.close()
+            raise
+
+    def send(self, frame: bytes):
+        self.sock.send(frame)
+
+    def recv(self, timeout: float) -> Optional[bytes]:
+        readable, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+        if not readable:
+            return None
+        try:
+            return self.sock.recv(2048)
+        except BlockingIOError:
+            return None
+
+    def close(self):
+        self.sock.close()
+
+
+class ReplayBackend(PacketBackend):
+    """
+    Replays captured frames instead of touching the network; sent frames are
+    kept in .sent. Build it from a list of frames or with from_pcap().
+    """
+
+    def __init__(self, frames: Iterable[bytes], mac: bytes = b'\x02\x00\x00\x00\x00\x01',
+                 ip: str = '0.0.0.0'):
+        self.frames = list(frames)
+        self.mac = mac
+        self.ip = socket.inet_aton(ip)
+        self.sent = []
+
+    @classmethod
+    def from_pcap(cls, path: str, **kwargs) -> 'ReplayBackend':
+        """Frames of a classic libpcap file (Ethernet link type)."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic = data[:4]
+        if magic in (b'\xd4\xc3\xb2\xa1', b'\x4d\x3c\xb2\xa1'):
+            endian = '<'
+        elif magic in (b'\xa1\xb2\xc3\xd4', b'\xa1\xb2\x3c\x4d'):
+            endian = '>'
+        else:
+            raise ValueError(f"{path} is not a pcap file")
+        record = struct.Struct(endian + 'IIII')
+        frames, offset = [], 24
+        while offset + record.size <= len(data):
+            _, _, captured, _ = record.unpack_from(data, offset)
+            offset += record.size
+            frames.append(data[offset:offset + captured])
+            offset += captured
+        return cls(frames, **kwargs)
+
+    def send(self, frame: bytes):
+        self.sent.append(frame)
+
+    def recv(self, timeout: float) -> Optional[bytes]:
+        if self.frames:
+            return self.frames.pop(0)
+        time.sleep(max(0.0, min(timeout, 0.05)))
+        return None
+
+
+# --- Sweep ---
+def arp_sweep(targets, backend: PacketBackend, rate: int = 1000, retries: int = 2,
+              timeout: float = 1.0, cancel_event=None) -> Iterator[dict]:
+    """
+    ARP-ping every host address of a network (CIDR or IPv4Network) or a list
+    of addresses, yielding {'ip_address', 'mac_address'} as each one
+    answers. Up to retries + 1
+    rounds; each round re-sends only to non-responders and then waits
+    `timeout` seconds for late replies. Stops early (without raising) when
+    cancel_event is set.
+    """
+    if isinstance(targets, (str, ipaddress.IPv4Network)):
+        network = ipaddress.IPv4Network(targets, strict=False)
+        hosts = network.hosts() if network.num_addresses > 2 else iter(network)
+    else:
+        hosts = (ipaddress.IPv4Address(address) for address in targets)
+    # Hash tables keyed by packed IP: addresses still waiting, and answers
+    pending = {addr.packed for addr in hosts if addr.packed != backend.ip}
+    answered = {}
+    interval = 1.0 / max(1, rate)
+
+    def cancelled() -> bool:
+        return bool(cancel_event and cancel_event.is_set())
+
+    def receive(wait: float) -> Optional[dict]:
+        frame = backend.recv(wait)
+        reply = parse_reply(frame) if frame else None
+        if reply is None:
+            return None
+        mac, ip = reply
+        if ip not in pending or ip in answered:
+            return None
+        answered[ip] = mac
+        pending.discard(ip)
+        return {'ip_address': socket.inet_ntoa(ip), 'mac_address': format_mac(mac)}
+
+    for _ in range(retries + 1):
+        if not pending or cancelled():
+            return
+        next_send = time.monotonic()
+        for target in sorted(pending):
+            if target not in pending:
+                continue
+            # Read replies while waiting for the next send slot
+            while (wait := next_send - time.monotonic()) > 0:
+                device = receive(wait)
+                if device:
+                    yield device
+            if cancelled():
+                return
+            backend.send(build_request(backend.mac, backend.ip, target))
+            next_send += interval
+
+        deadline = time.monotonic() + timeout
+        while pending and not cancelled() and (wait := deadline - time.monotonic()) > 0:
+            device = receive(min(wait, 0.2))
+            if device:
+                yield device
@@ -0,0 +1,215 @@
+"""
+NetTools - Benchmark and equivalence check: device type classifier
+Compares device_classifier.infer_device_type (Aho-Corasick DFA + LRU cache)
+with the previous implementation, kept below verbatim as the reference:
+
+1. Equivalence: both must return the same type for every keyword of the
+   rule table (as brand, as hostname, embedded in other text), every pair
+   of keywords, random mixes of keyword fragments and real vendor strings.
+   Exits with status 1 on any mismatch.
+2. Speed: classifying the devices of repeated scans (vendor/hostname pairs
+   drawn from a fixed population, as a periodic scan sees them).
+
+Run from the backend directory:
+    python benchmarks/bench_device_classifier.py [devices per scan]
+"""
+
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import device_classifier  # noqa: E402
+from device_classifier import ROUTER_SUBTYPES, RULES, infer_device_type  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+SCANS = 50
+REPEAT = 5
+
+VENDORS = [
+    'Apple, Inc.', 'Samsung Electronics Co.,Ltd', 'TP-LINK TECHNOLOGIES CO.,LTD.', 'Espressif Inc.',
+    'Raspberry Pi Trading Ltd', 'Intel Corporate', 'Ubiquiti Networks Inc.', 'Sonos, Inc.',
+    'Hon Hai Precision Ind. Co.,Ltd.', 'Xiaomi Communications Co Ltd', 'Amazon Technologies Inc.',
+    'Google, Inc.', 'Hewlett Packard', 'Synology Incorporated', 'AVM Audiovisuelles Marketing',
+    'Nintendo Co.,Ltd', 'Sony Interactive Entertainment Inc.', 'Hikvision Digital Technology',
+    'Shenzhen Reolink Technology', 'Tuya Smart Inc.', 'Murata Manufacturing Co.,Ltd.', '',
+]
+HOSTNAMES = [
+    '', 'iphone-de-ana', 'galaxy-s23', 'living-room-tv', 'esp32-kitchen', 'nas01', 'printer-office',
+    'ps5', 'unifi-ap-lr', 'desktop-7g2k', 'macbook-pro', 'pihole', 'fritz.box', 'camera-garage',
+    'echo-dot', 'chromecast', 'gs308-switch', 'proxmox', 'laptop-juan',
+]
+
+
+def legacy_infer_device_type(brand: str = '', hostname: str = '', mac: str = '') -> str:
+    """
+    Infer the device type from brand/vendor name, hostname, and MAC prefix.
+    Returns one of: router, switch, ap, printer, phone, tablet, tv, camera,
+    iot, server, desktop, laptop, nas, gaming, other
+    """
+    brand_lower = (brand or '').lower()
+    hostname_lower = (hostname or '').lower()
+    combined = f"{brand_lower} {hostname_lower}"
+
+    # Router / Gateway
+    router_keywords = ['router', 'gateway', 'mikrotik', 'ubiquiti', 'netgear',
+                       'tp-link', 'tplink', 'asus', 'linksys', 'dlink', 'd-link',
+                       'cisco', 'zyxel', 'huawei', 'openwrt', 'pfsense', 'fritz']
+    if any(k in combined for k in router_keywords):
+        # Distinguish APs and switches from routers
+        if any(k in combined for k in ['unifi', 'ap', 'access point', 'uap']):
+            return 'ap'
+        if any(k in combined for k in ['switch', 'gs3', 'gs1']):
+            return 'switch'
+        return 'router'
+
+    # Access Points
+    if any(k in combined for k in ['access point', 'unifi', 'aruba', 'ruckus', 'meraki']):
+        return 'ap'
+
+    # Switches
+    if any(k in combined for k in ['switch', 'netgear gs', 'prosafe']):
+        return 'switch'
+
+    # Printers
+    if any(k in combined for k in ['printer', 'print', 'epson', 'canon', 'brother',
+                                    'hp inc', 'hewlett', 'lexmark', 'xerox', 'kyocera',
+                                    'ricoh', 'sharp', 'konica']):
+        return 'printer'
+
+    # Phones (mobile)
+    if any(k in combined for k in ['iphone', 'samsung galaxy', 'xiaomi', 'huawei',
+                                    'oneplus', 'pixel', 'android', 'oppo', 'vivo',
+                                    'realme', 'motorola', 'phone']):
+        return 'phone'
+
+    # Tablets
+    if any(k in combined for k in ['ipad', 'tablet', 'galaxy tab', 'fire hd',
+                                    'surface']):
+        return 'tablet'
+
+    # Smart TVs / Streaming
+    if any(k in combined for k in ['samsung elec', 'lg elec', 'sony', 'roku',
+                                    'fire tv', 'chromecast', 'apple tv', 'nvidia shield',
+                                    'tv', 'vizio', 'hisense', 'tcl']):
+        return 'tv'
+
+    # Cameras / Security
+    if any(k in combined for k in ['camera', 'cam', 'hikvision', 'dahua', 'reolink',
+                                    'ring', 'nest', 'arlo', 'wyze', 'ezviz', 'axis']):
+        return 'camera'
+
+    # IoT / Smart Home
+    if any(k in combined for k in ['espressif', 'esp32', 'esp8266', 'tuya', 'sonoff',
+                                    'shelly', 'tasmota', 'zigbee', 'alexa', 'echo',
+                                    'google home', 'homepod', 'smartthings', 'hue',
+                                    'nest', 'ring', 'iot']):
+        return 'iot'
+
+    # NAS / Storage
+    if any(k in combined for k in ['synology', 'qnap', 'nas', 'drobo', 'buffalo',
+                                    'western digital', 'wd my']):
+        return 'nas'
+
+    # Gaming
+    if any(k in combined for k in ['playstation', 'xbox', 'nintendo', 'steam deck',
+                                    'gaming']):
+        return 'gaming'
+
+    # Servers
+    if any(k in combined for k in ['server', 'proxmox', 'vmware', 'dell emc',
+                                    'supermicro', 'lenovo server']):
+        return 'server'
+
+    # Desktops / Laptops
+    if any(k in combined for k in ['intel', 'amd', 'dell', 'lenovo', 'hp ',
+                                    'acer', 'msi']):
+        return 'desktop'
+
+    # Apple devices (when we can't distinguish type)
+    if any(k in combined for k in ['apple', 'macbook', 'imac', 'mac mini']):
+        return 'desktop'
+
+    # Raspberry Pi / SBCs
+    if any(k in combined for k in ['raspberry', 'raspberrypi']):
+        return 'server'
+
+    return 'other'
+
+
+def corpus():
+    keywords = sorted({k for _, keywords in RULES + ROUTER_SUBTYPES for k in keywords})
+    cases = [('', ''), (None, None), ('', 'host'), ('Unknown', '')]
+    for keyword in keywords:
+        cases += [(keyword, ''), ('', keyword), (keyword.upper(), ''),
+                  (f'x{keyword}y', ''), ('', f'my-{keyword}-01')]
+    for first, second in itertools.product(keywords, repeat=2):
+        cases += [(first, second), (f'{first}{second}', '')]
+    fragments = [k[:n] for k in keywords for n in range(1, len(k) + 1)] + [' ', '-', '.']
+    rng = random.Random(42)
+    for _ in range(20000):
+        cases.append((''.join(rng.choice(fragments) for _ in range(rng.randint(1, 5))),
+                      ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 3)))))
+    cases += list(itertools.product(VENDORS, HOSTNAMES))
+    return cases
+
+
+def check_equivalence() -> int:
+    mismatches = 0
+    cases = corpus()
+    for brand, hostname in cases:
+        expected = legacy_infer_device_type(brand=brand, hostname=hostname)
+        got = infer_device_type(brand=brand, hostname=hostname)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"  MISMATCH brand={brand!r} hostname={hostname!r}: {got} != {expected}")
+    print(f"equivalence: {len(cases)} cases, {mismatches} mismatches")
+    return mismatches
+
+
+def scans():
+    rng = random.Random(7)
+    population = [(rng.choice(VENDORS), f'{rng.choice(HOSTNAMES)}{rng.randint(0, 9) if rng.random() < .3 else ""}',
+                   ':'.join(f'{rng.randint(0, 255):02X}' for _ in range(6)))
+                  for _ in range(DEVICES)]
+    return [population] * SCANS
+
+
+def measure(fn, workload, clear=None):
+    timings = []
+    for _ in range(REPEAT):
+        if clear:
+            clear()
+        started = time.perf_counter()
+        for devices in workload:
+            for brand, hostname, mac in devices:
+                fn(brand=brand, hostname=hostname, mac=mac)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    if check_equivalence():
+        sys.exit(1)
+
+    workload = scans()
+    calls = DEVICES * SCANS
+    legacy = measure(legacy_infer_device_type, workload)
+    uncached = measure(lambda **kw: device_classifier._classify.__wrapped__(
+        f"{(kw['brand'] or '').lower()} {(kw['hostname'] or '').lower()}"), workload)
+    cached = measure(infer_device_type, workload, clear=device_classifier._classify.cache_clear)
+    print(f"{SCANS} scans x {DEVICES} devices ({calls} calls)")
+    print(f"{'variant':<18}{'median ms':>10}{'us/call':>10}")
+    for name, ms in (('legacy', legacy), ('compiled', uncached), ('compiled+cache', cached)):
+        note = '   (baseline)' if name == 'legacy' else f'   ({legacy / ms:.1f}x faster)'
+        print(f"{name:<18}{ms:>10.1f}{ms * 1000 / calls:>10.2f}{note}")
+    print(f"cache: {device_classifier.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
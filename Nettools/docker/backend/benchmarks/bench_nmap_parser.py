@@ -0,0 +1,164 @@
+"""
+NetTools - Benchmark and equivalence check: nmap output parsing
+Compares nmap_xml (incremental XML parsing of -oX -, fed line by line as the
+subprocess runner reads it, nothing buffered) with the previous regex parser
+of nmap's normal output (kept below verbatim as the reference, which needed
+the whole stdout buffered) on large recorded outputs of the same scan:
+
+1. Equivalence: same IP, MAC, hostname and vendor for every host.
+   Exits with status 1 on any mismatch.
+2. Speed, and peak Python heap (tracemalloc) of the parsing itself, per
+   recorded output.
+
+Run from the backend directory:
+    python benchmarks/bench_nmap_parser.py [hosts up]
+"""
+
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nmap_xml import NmapXmlParser  # noqa: E402
+
+HOSTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+REPEAT = 3
+VENDORS = ['Apple', 'Espressif', 'TP-Link Technologies', 'Raspberry Pi Trading', 'Intel Corporate', 'Unknown']
+
+
+# --- Previous implementation (network_service._scan_with_nmap output loop) ---
+def legacy_parse(stdout: str) -> list:
+    devices = []
+    current = {}
+
+    for line in stdout.split('\n'):
+        # Match host line
+        host_match = re.search(r'Nmap scan report for (?:(\S+) \()?(\d+\.\d+\.\d+\.\d+)\)?', line)
+        if host_match:
+            if current.get('ip_address'):
+                devices.append(current)
+            hostname = host_match.group(1) or ''
+            current = {
+                'ip_address': host_match.group(2),
+                'mac_address': '',
+                'hostname': hostname,
+                'brand': '',
+                'device_type': 'other',
+            }
+
+        # Match MAC line
+        mac_match = re.search(r'MAC Address: ((?:[0-9A-F]{2}:){5}[0-9A-F]{2})\s*\(?(.*?)\)?$', line)
+        if mac_match and current:
+            current['mac_address'] = mac_match.group(1)
+            current['brand'] = mac_match.group(2).strip() if mac_match.group(2) else ''
+
+    if current.get('ip_address'):
+        devices.append(current)
+
+    return devices
+
+
+# --- Recorded outputs of the same scan ---
+def recorded_scan(hosts: int):
+    """(normal output, XML output) lines of a -sn scan of a /16 with `hosts` hosts up."""
+    rng = random.Random(42)
+    addresses = rng.sample(range(1, 65535), hosts)
+    normal = ['Starting Nmap 7.93 ( https://nmap.org ) at 2024-01-01 00:00 UTC']
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>', '<!DOCTYPE nmaprun>',
+           '<?xml-stylesheet href="file:///usr/bin/../share/nmap/nmap.xsl" type="text/xsl"?>',
+           '<nmaprun scanner="nmap" args="nmap -sn -PR 10.0.0.0/16 -oX -" start="1704067200" '
+           'version="7.93" xmloutputversion="1.05">',
+           '<verbose level="0"/>', '<debugging level="0"/>']
+    for index, address in enumerate(sorted(addresses)):
+        ip = f'10.0.{address >> 8}.{address & 0xFF}'
+        mac = ':'.join(f'{rng.getrandbits(8):02X}' for _ in range(6))
+        vendor = rng.choice(VENDORS)
+        hostname = f'host-{index}.lan' if rng.random() < 0.4 else ''
+        normal.append(f'Nmap scan report for {hostname} ({ip})' if hostname else f'Nmap scan report for {ip}')
+        normal.append('Host is up (0.00042s latency).')
+        normal.append(f'MAC Address: {mac} ({vendor})')
+        xml.append('<hosthint><status state="up" reason="arp-response" reason_ttl="0"/>')
+        xml.append(f'<address addr="{ip}" addrtype="ipv4"/>')
+        xml.append(f'<address addr="{mac}" addrtype="mac" vendor="{vendor}"/>' if vendor != 'Unknown'
+                   else f'<address addr="{mac}" addrtype="mac"/>')
+        xml.append('<hostnames>\n</hostnames>\n</hosthint>')
+        xml.append('<host><status state="up" reason="arp-response" reason_ttl="0"/>')
+        xml.append(f'<address addr="{ip}" addrtype="ipv4"/>')
+        xml.append(f'<address addr="{mac}" addrtype="mac" vendor="{vendor}"/>' if vendor != 'Unknown'
+                   else f'<address addr="{mac}" addrtype="mac"/>')
+        xml.append('<hostnames>')
+        if hostname:
+            xml.append(f'<hostname name="{hostname}" type="PTR"/>')
+        xml.append('</hostnames>')
+        xml.append('<times srtt="420" rttvar="5000" to="100000"/>')
+        xml.append('</host>')
+    normal.append(f'Nmap done: 65536 IP addresses ({hosts} hosts up) scanned in 512.00 seconds')
+    xml.append('<runstats><finished time="1704067712" elapsed="512.00" exit="success"/>'
+               f'<hosts up="{hosts}" down="{65536 - hosts}" total="65536"/>')
+    xml.append('</runstats>')
+    xml.append('</nmaprun>')
+    return [line + '\n' for line in normal], [line + '\n' for line in xml]
+
+
+def run_legacy(lines: list, keep: bool = True) -> list:
+    # The runner buffered every line and joined them into result.stdout
+    buffered = []
+    for line in lines:
+        buffered.append(line)
+    devices = legacy_parse(''.join(buffered))
+    return devices if keep else []
+
+
+def run_xml(lines: list, keep: bool = True) -> list:
+    # Fed line by line from the runner's on_line callback, nothing buffered
+    parser = NmapXmlParser()
+    hosts = []
+    for line in lines:
+        for host in parser.feed(line):
+            if keep and host['state'] == 'up':
+                hosts.append(host)
+    hosts.extend(parser.close())
+    return hosts
+
+
+def measure(fn, lines):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn(lines)
+        timings.append((time.perf_counter() - started) * 1000)
+    # Peak heap of the parsing itself (results dropped as they come)
+    tracemalloc.start()
+    fn(lines, keep=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(timings), peak
+
+
+def main():
+    normal, xml = recorded_scan(HOSTS)
+    print(f"recorded: {HOSTS} hosts up, normal {sum(map(len, normal)) / 1024:.0f} KiB, "
+          f"XML {sum(map(len, xml)) / 1024:.0f} KiB")
+    legacy, legacy_ms, legacy_peak = measure(run_legacy, normal)
+    hosts, xml_ms, xml_peak = measure(run_xml, xml)
+
+    expected = [(d['ip_address'], d['mac_address'], d['hostname'], '' if d['brand'] == 'Unknown' else d['brand'])
+                for d in legacy]
+    got = [(h['ip_address'], h['mac_address'], h['hostname'], h['vendor']) for h in hosts]
+    mismatches = sum(a != b for a, b in zip(expected, got)) + abs(len(expected) - len(got))
+    print(f"equivalence: {len(expected)} hosts, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+    print(f"{'parser':<14}{'median ms':>10}{'us/host':>10}{'peak KiB':>10}")
+    print(f"{'legacy regex':<14}{legacy_ms:>10.1f}{legacy_ms * 1000 / HOSTS:>10.2f}{legacy_peak / 1024:>10.0f}")
+    print(f"{'xml stream':<14}{xml_ms:>10.1f}{xml_ms * 1000 / HOSTS:>10.2f}{xml_peak / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
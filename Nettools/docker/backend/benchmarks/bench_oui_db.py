@@ -0,0 +1,175 @@
+"""
+NetTools - Benchmark and equivalence check: OUI vendor database
+Compares oui_db (compiled binary index, memory-mapped, binary search) with
+the previous lookup (arp-scan's ieee-oui.txt loaded into a dict, kept below
+verbatim as the reference) on synthetic registries of the real IEEE sizes:
+
+1. Equivalence: for MA-L prefixes both must return the same vendor; MA-M and
+   MA-S prefixes (unknown to the old lookup) must win over the MA-L block
+   they belong to. Exits with status 1 on any mismatch.
+2. Memory: Python heap allocated to load each database (tracemalloc).
+3. Speed: lookups per scan-sized batch of MACs.
+
+Run from the backend directory:
+    python benchmarks/bench_oui_db.py [MACs per batch]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import oui_db  # noqa: E402
+
+MACS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+# Approximate sizes of the IEEE registries (2024)
+MA_L, MA_M, MA_S = 38000, 6000, 6500
+BATCHES = 20
+REPEAT = 5
+
+
+# --- Previous implementation (network_service.lookup_vendor / _load_oui) ---
+def legacy_load_oui(path: str) -> dict:
+    vendors = {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            prefix, _, vendor = line.rstrip('\n').partition('\t')
+            if len(prefix) == 6 and vendor:
+                vendors[prefix.upper()] = vendor.strip()
+    return vendors
+
+
+def legacy_lookup(vendors: dict, mac: str) -> str:
+    return vendors.get(mac.replace(':', '').replace('-', '')[:6].upper(), '')
+
+
+# --- Synthetic registries ---
+def registries(directory: str):
+    rng = random.Random(42)
+    words = ['Technologies', 'Electronics', 'Networks', 'Co.,Ltd', 'Inc.', 'Corporation',
+             'Shenzhen', 'Communication', 'Systems', 'Industrial', 'GmbH', 'Devices']
+    ma_l = {rng.getrandbits(24): f"{' '.join(rng.sample(words, 3))} {i}" for i in range(MA_L)}
+    blocks = rng.sample(sorted(ma_l), 200)
+    for block in blocks:
+        ma_l[block] = 'IEEE Registration Authority'
+    ma_m = {(rng.choice(blocks) << 4) | rng.getrandbits(4): f'MA-M Vendor {i}' for i in range(MA_M)}
+    ma_s = {(rng.choice(blocks) << 12) | rng.getrandbits(12): f'MA-S Vendor {i}' for i in range(MA_S)}
+
+    def write_csv(name, registry, width, entries):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write('Registry,Assignment,Organization Name,Organization Address\n')
+            for prefix, vendor in entries.items():
+                f.write(f'{registry},{prefix:0{width}X},"{vendor}",Somewhere\n')
+        return path
+
+    sources = [write_csv('oui.csv', 'MA-L', 6, ma_l), write_csv('mam.csv', 'MA-M', 7, ma_m),
+               write_csv('oui36.csv', 'MA-S', 9, ma_s)]
+    arp_scan = os.path.join(directory, 'ieee-oui.txt')
+    with open(arp_scan, 'w') as f:
+        f.write('# arp-scan ieee-oui.txt\n')
+        for prefix, vendor in ma_l.items():
+            f.write(f'{prefix:06X}\t{vendor}\n')
+    return sources, arp_scan, ma_l, ma_m, ma_s
+
+
+def random_mac(rng, prefix: int, bits: int) -> str:
+    value = (prefix << (48 - bits)) | rng.getrandbits(48 - bits)
+    return ':'.join(f'{(value >> shift) & 0xFF:02X}' for shift in range(40, -8, -8))
+
+
+def check_equivalence(db, legacy, ma_l, ma_m, ma_s) -> int:
+    rng = random.Random(1)
+    mismatches = checked = 0
+
+    def check(mac, expected):
+        nonlocal mismatches, checked
+        checked += 1
+        got = db.lookup(mac)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"  MISMATCH {mac}: {got!r} != {expected!r}")
+
+    def most_specific(mac):
+        value = int(mac.replace(':', ''), 16)
+        return ma_s.get(value >> 12) or ma_m.get(value >> 20)
+
+    for prefix in ma_l:
+        mac = random_mac(rng, prefix, 24)
+        # Same answer as the old lookup unless the MAC falls in an MA-M/MA-S assignment
+        check(mac, most_specific(mac) or legacy_lookup(legacy, mac))
+    for prefix in ma_m:
+        mac = random_mac(rng, prefix, 28)
+        check(mac, most_specific(mac))
+    for prefix, vendor in ma_s.items():
+        check(random_mac(rng, prefix, 36), vendor)
+    for _ in range(20000):
+        mac = ':'.join(f'{rng.getrandbits(8):02X}' for _ in range(6))
+        check(mac, most_specific(mac) or ma_l.get(int(mac.replace(':', ''), 16) >> 24, ''))
+    print(f"equivalence: {checked} lookups, {mismatches} mismatches")
+    return mismatches
+
+
+def allocated(load):
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = load()
+    elapsed = (time.perf_counter() - started) * 1000
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current, elapsed
+
+
+def measure(fn, batches):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        for batch in batches:
+            for mac in batch:
+                fn(mac)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        sources, arp_scan, ma_l, ma_m, ma_s = registries(directory)
+        output = os.path.join(directory, 'oui.bin')
+        started = time.perf_counter()
+        total = oui_db.build(sources, output)
+        build_ms = (time.perf_counter() - started) * 1000
+        print(f"build: {total} prefixes in {build_ms:.0f} ms, {os.path.getsize(output) / 1024:.0f} KiB "
+              f"(ieee-oui.txt: {os.path.getsize(arp_scan) / 1024:.0f} KiB)")
+
+        legacy, legacy_bytes, legacy_ms = allocated(lambda: legacy_load_oui(arp_scan))
+        db, db_bytes, db_ms = allocated(lambda: oui_db.OuiDatabase(output))
+        print(f"{'load':<10}{'heap KiB':>10}{'ms':>8}")
+        print(f"{'legacy':<10}{legacy_bytes / 1024:>10.0f}{legacy_ms:>8.1f}")
+        print(f"{'mmap':<10}{db_bytes / 1024:>10.1f}{db_ms:>8.2f}")
+
+        if check_equivalence(db, legacy, ma_l, ma_m, ma_s):
+            sys.exit(1)
+
+        rng = random.Random(7)
+        prefixes = sorted(ma_l)
+        batches = [[random_mac(rng, rng.choice(prefixes), 24) for _ in range(MACS)] for _ in range(BATCHES)]
+        calls = MACS * BATCHES
+        legacy_ms = measure(lambda mac: legacy_lookup(legacy, mac), batches)
+        db_ms = measure(db.lookup, batches)
+        print(f"{BATCHES} batches x {MACS} MACs ({calls} lookups)")
+        print(f"{'variant':<10}{'median ms':>10}{'us/call':>10}")
+        print(f"{'legacy':<10}{legacy_ms:>10.1f}{legacy_ms * 1000 / calls:>10.2f}   (MA-L only)")
+        print(f"{'mmap':<10}{db_ms:>10.1f}{db_ms * 1000 / calls:>10.2f}   (MA-S, MA-M, MA-L)")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
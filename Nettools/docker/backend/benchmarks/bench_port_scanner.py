@@ -0,0 +1,155 @@
+"""
+NetTools - Benchmark and correctness check: TCP port scanner
+Scans listening sockets opened on 127.0.0.1 by this script (random ports,
+some sending a banner) with port_scanner, and compares it with a plain
+sequential blocking connect() loop over the same ports:
+
+1. Correctness: both must find exactly the listening ports, and the
+   scanner must return the banners. Exits with status 1 on any mismatch.
+2. Speed: ports per second of each, and of the scanner at several
+   concurrency levels. On loopback closed ports are refused at once, which
+   only measures per-port overhead; a second run scans "filtered" ports
+   (listeners with a full accept queue, whose SYNs are dropped until the
+   connect times out), the common case on real networks.
+
+Run from the backend directory:
+    python benchmarks/bench_port_scanner.py [ports to scan]
+"""
+
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import port_scanner  # noqa: E402
+
+PORTS = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+LISTENERS = 40
+FILTERED = 100
+FILTERED_TIMEOUT = 0.2
+HOST = '127.0.0.1'
+
+
+def open_listeners(count: int):
+    """count listening sockets on free ports; half of them greet with a banner."""
+    sockets, banners = [], {}
+    for index in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((HOST, 0))
+        sock.listen(64)
+        port = sock.getsockname()[1]
+        banner = f'SSH-2.0-Bench_{index}' if index % 2 else ''
+        banners[port] = banner
+        sockets.append(sock)
+        threading.Thread(target=serve, args=(sock, banner), daemon=True).start()
+    return sockets, banners
+
+
+def serve(sock, banner: str):
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except OSError:
+            return
+        if banner:
+            try:
+                conn.sendall(banner.encode() + b'\r\n')
+            except OSError:
+                pass
+        conn.close()
+
+
+def open_filtered(count: int):
+    """count ports that never answer: backlog 0 listeners filled by a held connection."""
+    sockets, ports = [], []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((HOST, 0))
+        sock.listen(0)
+        filler = socket.create_connection(sock.getsockname())
+        sockets += [sock, filler]
+        ports.append(sock.getsockname()[1])
+    return sockets, ports
+
+
+def sequential_scan(ports, timeout: float) -> list:
+    found = []
+    for port in ports:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            if sock.connect_ex((HOST, port)) == 0:
+                found.append(port)
+    return found
+
+
+def main():
+    sockets, banners = open_listeners(LISTENERS)
+    # Scan range: the listeners plus random other ports (almost all closed)
+    rng = random.Random(42)
+    others = set(rng.sample(range(1024, 65536), PORTS))
+    ports = sorted(others | set(banners))
+    expected = sorted(banners)
+    print(f"{len(ports)} ports on {HOST}, {len(expected)} listening")
+
+    started = time.perf_counter()
+    seq_found = sequential_scan(ports, 1.0)
+    seq_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = port_scanner.scan_ports_sync([HOST], ports, banners=True, rate=1_000_000)
+    scan_s = time.perf_counter() - started
+    found = results[HOST]['ports']
+
+    mismatches = 0
+    # Other local services may be listening on some of the random ports too
+    extra = sorted(set(seq_found) - set(expected))
+    if [p['port'] for p in found] != seq_found:
+        print(f"  MISMATCH open ports: scanner {len(found)}, sequential {len(seq_found)}")
+        mismatches += 1
+    for p in found:
+        if p['port'] in banners and p['banner'] != banners[p['port']]:
+            print(f"  MISMATCH banner on {p['port']}: {p['banner']!r} != {banners[p['port']]!r}")
+            mismatches += 1
+    print(f"correctness: {len(found)} open ({len(extra)} outside the listeners), "
+          f"{results[HOST]['scanned']} scanned, {mismatches} mismatches")
+
+    print(f"{'variant':<22}{'seconds':>9}{'ports/s':>10}")
+    print(f"{'sequential connect':<22}{seq_s:>9.2f}{len(ports) / seq_s:>10.0f}")
+    print(f"{'asyncio (banners)':<22}{scan_s:>9.2f}{len(ports) / scan_s:>10.0f}")
+    for concurrency in (1, 50, 200, 500):
+        started = time.perf_counter()
+        port_scanner.scan_ports_sync([HOST], ports, concurrency=concurrency, rate=1_000_000)
+        elapsed = time.perf_counter() - started
+        print(f"{f'asyncio c={concurrency}':<22}{elapsed:>9.2f}{len(ports) / elapsed:>10.0f}")
+    started = time.perf_counter()
+    port_scanner.scan_ports_sync([HOST], ports, rate=2000)
+    elapsed = time.perf_counter() - started
+    print(f"{'asyncio rate=2000/s':<22}{elapsed:>9.2f}{len(ports) / elapsed:>10.0f}")
+
+    filtered_sockets, filtered = open_filtered(FILTERED)
+    print(f"{FILTERED} filtered ports, {FILTERED_TIMEOUT}s connect timeout")
+    started = time.perf_counter()
+    seq_found = sequential_scan(filtered, FILTERED_TIMEOUT)
+    seq_s = time.perf_counter() - started
+    started = time.perf_counter()
+    results = port_scanner.scan_ports_sync([HOST], filtered, timeout=FILTERED_TIMEOUT, rate=1_000_000)
+    scan_s = time.perf_counter() - started
+    if seq_found or results[HOST]['ports']:
+        print("  MISMATCH: filtered ports reported open")
+        mismatches += 1
+    print(f"{'sequential connect':<22}{seq_s:>9.2f}{FILTERED / seq_s:>10.0f}")
+    print(f"{'asyncio c=200':<22}{scan_s:>9.2f}{FILTERED / scan_s:>10.0f}")
+
+    for sock in sockets + filtered_sockets:
+        sock.close()
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+NetTools - Benchmark: /api/speedtest/results payloads
+Compares, for 10,000 stored speed tests (range=all, limit=10000):
+
+  rows/default   list of row dicts through FastAPI's default path
+                 (jsonable_encoder + stdlib JSONResponse), as before
+  rows/fast      list of row dicts returned as FastJSONResponse
+  columnar/fast  ?format=columnar parallel arrays as FastJSONResponse
+
+Times include the database query. Run from the backend directory:
+    python benchmarks/bench_speedtest_payload.py [rows]
+"""
+
+import gzip
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['NETTOOLS_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='nettools-bench-'), 'bench.db')
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import database as db  # noqa: E402
+from responses import FastJSONResponse, orjson  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEAT = 7
+
+
+def populate(count: int):
+    db.init_db()
+    conn = db.get_db()
+    start = datetime.now() - timedelta(hours=count)
+    conn.executemany(
+        """INSERT INTO speed_tests (timestamp, test_type, download_speed, upload_speed, ping, jitter,
+                                    server_name, server_id, server_location, isp, external_ip, raw_data)
+           VALUES (?, 'wan', ?, ?, ?, ?, 'Server', '1234', 'Madrid', 'ISP', '203.0.113.7', '{}')""",
+        [((start + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M:%S'),
+          round(random.uniform(80, 600), 2), round(random.uniform(10, 60), 2),
+          round(random.uniform(5, 40), 2), round(random.uniform(0.5, 5), 2))
+         for i in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def rows_default() -> bytes:
+    rows = db.get_speed_tests(range_filter='all', limit=ROWS)
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def rows_fast() -> bytes:
+    return FastJSONResponse(db.get_speed_tests(range_filter='all', limit=ROWS)).body
+
+
+def columnar_fast() -> bytes:
+    return FastJSONResponse(db.get_speed_tests(range_filter='all', limit=ROWS, columnar=True)).body
+
+
+def measure(fn):
+    fn()  # warm-up
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        body = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), body
+
+
+def main():
+    populate(ROWS)
+    print(f"{ROWS} speed tests, orjson {'available' if orjson else 'NOT installed (stdlib fallback)'}")
+    print(f"{'variant':<15}{'median ms':>10}{'bytes':>12}{'gzip bytes':>12}")
+    baseline = None
+    for name, fn in (('rows/default', rows_default), ('rows/fast', rows_fast), ('columnar/fast', columnar_fast)):
+        ms, body = measure(fn)
+        line = f"{name:<15}{ms:>10.1f}{len(body):>12}{len(gzip.compress(body)):>12}"
+        if baseline is None:
+            baseline = (ms, len(body))
+            print(line + "   (baseline)")
+        else:
+            print(line + f"   ({baseline[0] / ms:.1f}x faster, {len(body) / baseline[1]:.0%} of the bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+NetTools - Bufferbloat / Latency-Under-Load Probe
+Measures latency to the gateway and a WAN target while a speed test loads the link
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# One probe every PROBE_INTERVAL seconds per target (~10 packets/s, 64 bytes each:
+# negligible next to the traffic of a speed test)
+PROBE_INTERVAL = 0.1
+PROBE_TIMEOUT = 1.0
+DEFAULT_WAN_TARGET = '1.1.1.1'
+TCP_FALLBACK_PORT = 443
+
+PHASES = ('idle', 'download', 'upload')
+LATENCY_PERCENTILES = (50, 90, 99)
+
+# Grade by added latency under load (ms), as popularised by the Waveform test
+GRADES = ((5, 'A+'), (30, 'A'), (60, 'B'), (200, 'C'), (400, 'D'))
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP_PAYLOAD = b'nettools' * 7
+
+
+def get_default_gateway() -> Optional[str]:
+    """Read the IPv4 default gateway from /proc/net/route."""
+    try:
+        with open('/proc/net/route') as f:
+            next(f)  # header
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[1] == '00000000' and fields[2] != '00000000':
+                    return socket.inet_ntoa(struct.pack('<L', int(fields[2], 16)))
+    except (OSError, ValueError, StopIteration):
+        pass
+    return None
+
+
+def _is_ipv4(host: str) -> bool:
+    try:
+        socket.inet_aton(host)
+        return True
+    except OSError:
+        return False
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _open_icmp_socket():
+    """
+    Open an ICMP socket: unprivileged ping socket if allowed by
+    net.ipv4.ping_group_range, otherwise a raw socket (needs CAP_NET_RAW).
+    Returns (socket, is_raw) or (None, False).
+    """
+    for sock_type, is_raw in ((socket.SOCK_DGRAM, False), (socket.SOCK_RAW, True)):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            sock.setblocking(False)
+            return sock, is_raw
+        except (PermissionError, OSError):
+            continue
+    return None, False
+
+
+class _Target:
+    """Per-target probe state."""
+
+    def __init__(self, name: str, host: str):
+        self.name = name
+        self.host = host
+        self.pending = {}   # seq -> (send time, phase)
+        self.samples = {phase: [] for phase in PHASES}
+        self.sent = {phase: 0 for phase in PHASES}
+
+
+class LatencyProbe:
+    """
+    Async latency prober. Sends one ICMP echo per interval to each target
+    (TCP connect timing when ICMP sockets are unavailable) and files every
+    RTT under the current phase. Set `phase` as the speed test progresses.
+    """
+
+    def __init__(self, targets: dict, interval: float = PROBE_INTERVAL):
+        self.targets = [_Target(name, host) for name, host in targets.items() if host]
+        self.interval = interval
+        self.phase = 'idle'
+        self.method = None
+        self._tasks = []
+        self._sockets = []
+        self._ident = os.getpid() & 0xFFFF
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for target in self.targets:
+            # Resolve once so replies can be matched by source address
+            try:
+                infos = await loop.getaddrinfo(target.host, None, family=socket.AF_INET)
+                target.host = infos[0][4][0]
+            except (OSError, IndexError):
+                logger.warning(f"Bufferbloat probe: cannot resolve {target.host}")
+        self.targets = [t for t in self.targets if _is_ipv4(t.host)]
+
+        for index, target in enumerate(self.targets):
+            sock, is_raw = _open_icmp_socket()
+            if sock is not None:
+                self.method = 'icmp'
+                self._sockets.append(sock)
+                ident = (self._ident + index) & 0xFFFF
+                self._tasks.append(loop.create_task(self._icmp_sender(target, sock, ident)))
+                self._tasks.append(loop.create_task(self._icmp_receiver(target, sock, is_raw, ident)))
+            else:
+                self.method = 'tcp'
+                self._tasks.append(loop.create_task(self._tcp_sender(target)))
+
+    async def stop(self) -> dict:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for sock in self._sockets:
+            sock.close()
+        return self.summary()
+
+    # --- ICMP ---
+    async def _icmp_sender(self, target: _Target, sock, ident: int):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        while True:
+            seq = (seq + 1) & 0xFFFF
+            header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+            checksum = _checksum(header + ICMP_PAYLOAD)
+            packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + ICMP_PAYLOAD
+            target.pending[seq] = (time.perf_counter(), self.phase)
+            target.sent[self.phase] += 1
+            try:
+                await loop.sock_sendto(sock, packet, (target.host, 0))
+            except OSError:
+                pass
+            self._expire(target)
+            await asyncio.sleep(self.interval)
+
+    async def _icmp_receiver(self, target: _Target, sock, is_raw: bool, ident: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            data, addr = await loop.sock_recvfrom(sock, 2048)
+            received = time.perf_counter()
+            if addr[0] != target.host:
+                continue
+            if is_raw:
+                data = data[(data[0] & 0x0F) * 4:]  # strip IP header
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, reply_ident, seq = struct.unpack('!BBHHH', data[:8])
+            # Ping sockets rewrite the identifier, so only raw sockets can check it
+            if icmp_type != ICMP_ECHO_REPLY or (is_raw and reply_ident != ident):
+                continue
+            sent = target.pending.pop(seq, None)
+            if sent:
+                target.samples[sent[1]].append((received - sent[0]) * 1000)
+
+    def _expire(self, target: _Target):
+        """Forget probes older than PROBE_TIMEOUT (they count as lost)."""
+        cutoff = time.perf_counter() - PROBE_TIMEOUT
+        for seq in [s for s, (t, _) in target.pending.items() if t < cutoff]:
+            del target.pending[seq]
+
+    # --- TCP fallback ---
+    async def _tcp_sender(self, target: _Target):
+        while True:
+            phase = self.phase
+            target.sent[phase] += 1
+            rtt = await self._tcp_rtt(target.host)
+            if rtt is not None:
+                target.samples[phase].append(rtt)
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    async def _tcp_rtt(host: str) -> Optional[float]:
+        """Time a TCP handshake; a refused connection (RST) is still a valid RTT."""
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, TCP_FALLBACK_PORT), timeout=PROBE_TIMEOUT
+            )
+            writer.close()
+        except ConnectionRefusedError:
+            pass
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return (time.perf_counter() - started) * 1000
+
+    # --- Results ---
+    def summary(self) -> dict:
+        targets = {}
+        for target in self.targets:
+            phases = {}
+            for phase in PHASES:
+                samples = sorted(target.samples[phase])
+                sent = target.sent[phase]
+                phases[phase] = {
+                    'samples': len(samples),
+                    'loss': round((1 - len(samples) / sent) * 100, 1) if sent else None,
+                    **{f'p{p}': _percentile(samples, p) for p in LATENCY_PERCENTILES},
+                }
+            targets[target.name] = {'host': target.host, 'phases': phases}
+        return {'method': self.method, 'targets': targets}
+
+
+def _percentile(sorted_samples: list, pct: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return round(sorted_samples[index], 2)
+
+
+def grade(added_latency: Optional[float]) -> Optional[str]:
+    """Bufferbloat grade from the latency added under load (ms)."""
+    if added_latency is None:
+        return None
+    for limit, letter in GRADES:
+        if added_latency < limit:
+            return letter
+    return 'F'
+
+
+def build_report(summary: dict) -> dict:
+    """
+    Reduce a probe summary to the values stored with a speed test row.
+    The WAN target is preferred (it crosses the bottleneck link); the gateway
+    is used when the WAN target gave no samples.
+    """
+    targets = summary.get('targets', {})
+    chosen = None
+    for name in ('wan', 'gateway'):
+        phases = targets.get(name, {}).get('phases', {})
+        if phases.get('idle', {}).get('p50') is not None:
+            chosen = phases
+            break
+
+    report = {
+        'idle_latency': None,
+        'download_latency_p50': None, 'download_latency_p90': None, 'download_latency_p99': None,
+        'upload_latency_p50': None, 'upload_latency_p90': None, 'upload_latency_p99': None,
+        'bufferbloat_grade': None,
+    }
+    if not chosen:
+        return report
+
+    idle = chosen['idle']['p50']
+    report['idle_latency'] = idle
+    added = []
+    for phase in ('download', 'upload'):
+        for p in LATENCY_PERCENTILES:
+            report[f'{phase}_latency_p{p}'] = chosen[phase][f'p{p}']
+        if chosen[phase]['p90'] is not None:
+            added.append(chosen[phase]['p90'] - idle)
+
+    report['bufferbloat_grade'] = grade(max(added)) if added else None
+    return report
+
+
+def default_targets(wan_target: str = DEFAULT_WAN_TARGET) -> dict:
+    return {'gateway': get_default_gateway(), 'wan': wan_target or DEFAULT_WAN_TARGET}
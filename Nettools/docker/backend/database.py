@@ -5,44 +5,196 @@ NetTools - Database Manager (SQLite)
 import sqlite3
 import os
 import json
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 
+import metrics
+
 DB_PATH = os.environ.get('NETTOOLS_DB_PATH', '/data/nettools.db')
+# Latest one-time data migration applied by init_db() (PRAGMA user_version)
+SCHEMA_VERSION = 1
+
+
+# ==========================================
+#  Timed connections (Prometheus metrics)
+# ==========================================
+
+_OPERATIONS = ('select', 'insert', 'update', 'delete', 'pragma', 'create', 'alter')
+_operation_children = {op: metrics.db_query_duration.labels(op) for op in _OPERATIONS + ('other',)}
+_commit_timer = metrics.db_commit_duration.labels()
+# SQL text -> histogram child; statements are mostly constants, so this stays small
+_sql_children = {}
+_SQL_CACHE_MAX = 1024
+
+
+def _query_timer(sql: str):
+    child = _sql_children.get(sql)
+    if child is None:
+        word = sql.lstrip()[:6].lower()
+        if word.startswith('with'):
+            word = 'select'
+        child = _operation_children.get(word) or _operation_children['other']
+        if len(_sql_children) < _SQL_CACHE_MAX:
+            _sql_children[sql] = child
+    return child
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _query_timer(sql).observe(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _query_timer(sql).observe(time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection recording statement and commit times."""
 
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
 
-def _get_timezone():
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _commit_timer.observe(time.perf_counter() - started)
+
+
+def _get_timezone(conn=None):
     """Get configured timezone offset. Returns a timezone object."""
     try:
-        if os.path.exists(DB_PATH):
-            conn = sqlite3.connect(DB_PATH)
+        if conn is not None:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'timezone'").fetchone()
+        elif os.path.exists(DB_PATH):
+            conn = sqlite3.connect(DB_PATH, factory=TimedConnection)
             conn.row_factory = sqlite3.Row
             row = conn.execute("SELECT value FROM settings WHERE key = 'timezone'").fetchone()
             conn.close()
-            if row and row['value']:
-                offset_hours = int(row['value'])
-                return timezone(timedelta(hours=offset_hours))
+        else:
+            row = None
+        if row and row['value']:
+            offset_hours = int(row['value'])
+            return timezone(timedelta(hours=offset_hours))
     except Exception:
         pass
     # Default: UTC+1 (CET)
     return timezone(timedelta(hours=1))
 
 
-def now_local():
+def now_local(conn=None):
     """Get current datetime in configured timezone, formatted for SQLite."""
-    tz = _get_timezone()
+    tz = _get_timezone(conn)
     return datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
 
 
 def get_db():
     """Get database connection."""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
 
+def _open(conn=None):
+    """(connection, owned): the caller's connection (shared read transaction) or a new one."""
+    if conn is not None:
+        return conn, False
+    return get_db(), True
+
+
+# Latency-under-load columns of speed_tests (see bufferbloat_service.build_report)
+BUFFERBLOAT_COLUMNS = (
+    'idle_latency',
+    'download_latency_p50', 'download_latency_p90', 'download_latency_p99',
+    'upload_latency_p50', 'upload_latency_p90', 'upload_latency_p99',
+    'bufferbloat_grade',
+)
+
+
+# Every write to devices takes the next value of the 'devices' counter in
+# data_versions (change_version column); deletes leave a tombstone with it.
+# Triggers keep this true for all writers (scans, API edits, clears).
+DEVICE_VERSION_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS devices_version_insert AFTER INSERT ON devices
+    BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'devices';
+        UPDATE devices SET change_version = (SELECT version FROM data_versions WHERE name = 'devices')
+            WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS devices_version_update AFTER UPDATE ON devices
+    WHEN NEW.change_version IS OLD.change_version
+    BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'devices';
+        UPDATE devices SET change_version = (SELECT version FROM data_versions WHERE name = 'devices')
+            WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS devices_version_delete AFTER DELETE ON devices
+    BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'devices';
+        INSERT OR REPLACE INTO device_tombstones (device_id, change_version)
+            VALUES (OLD.id, (SELECT version FROM data_versions WHERE name = 'devices'));
+    END;
+"""
+
+# Tombstones are kept this many days; the newest pruned change_version is
+# stored as the 'device_tombstones' row of data_versions: older `since`
+# values get a full resync
+TOMBSTONE_RETENTION_DAYS = 30
+
+# Tables with a write counter in data_versions (ETags of the read endpoints).
+# devices has its own triggers above that also stamp rows and tombstones.
+VERSIONED_TABLES = ('speed_tests', 'devices', 'device_snapshots', 'settings', 'device_ports')
+
+
+def _version_triggers(table: str) -> str:
+    return '\n'.join(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_version_{op.lower()} AFTER {op} ON {table}
+    BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+    END;
+    """ for op in ('INSERT', 'UPDATE', 'DELETE'))
+
+
+# Presence checks refresh last_seen of devices already online at most this often (seconds)
+LAST_SEEN_RESOLUTION = 300
+
+# Columns of the devices table (valid values for /api/devices?fields=)
+DEVICE_FIELDS = (
+    'id', 'ip_address', 'mac_address', 'hostname', 'custom_name', 'description',
+    'brand', 'location', 'device_type', 'ip_type', 'status', 'is_online',
+    'first_seen', 'last_seen', 'created_at', 'updated_at', 'change_version', 'missed_scans',
+    'ports_scanned_at',
+)
+
+
+def _add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """Schema migration helper: add a column on databases created by older versions."""
+    try:
+        cursor.execute(f"SELECT {column} FROM {table} LIMIT 1")
+    except sqlite3.OperationalError:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
 def init_db():
     """Initialize database schema."""
     conn = get_db()
@@ -61,7 +213,16 @@ def init_db():
             server_location TEXT,
             isp TEXT,
             external_ip TEXT,
-            raw_data TEXT
+            raw_data TEXT,
+            test_type TEXT DEFAULT 'wan',
+            idle_latency REAL,
+            download_latency_p50 REAL,
+            download_latency_p90 REAL,
+            download_latency_p99 REAL,
+            upload_latency_p50 REAL,
+            upload_latency_p90 REAL,
+            upload_latency_p99 REAL,
+            bufferbloat_grade TEXT
         );
 
         CREATE TABLE IF NOT EXISTS devices (
@@ -99,6 +260,17 @@ def init_db():
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
 
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS device_tombstones (
+            device_id INTEGER PRIMARY KEY,
+            change_version INTEGER NOT NULL,
+            deleted_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+
         CREATE TABLE IF NOT EXISTS device_snapshots (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -108,6 +280,18 @@ def init_db():
             new_devices INTEGER DEFAULT 0
         );
 
+        CREATE TABLE IF NOT EXISTS device_ports (
+            device_id INTEGER NOT NULL,
+            protocol TEXT NOT NULL DEFAULT 'tcp',
+            port INTEGER NOT NULL,
+            service TEXT,
+            banner TEXT,
+            first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (device_id, protocol, port),
+            FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
+        );
+
         CREATE INDEX IF NOT EXISTS idx_speed_tests_timestamp ON speed_tests(timestamp);
         CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices(ip_address);
         CREATE INDEX IF NOT EXISTS idx_devices_mac ON devices(mac_address);
@@ -117,10 +301,27 @@ def init_db():
     """)
 
     # Migrations: add columns if they don't exist (for upgrades)
-    try:
-        cursor.execute("SELECT ip_type FROM devices LIMIT 1")
-    except sqlite3.OperationalError:
-        cursor.execute("ALTER TABLE devices ADD COLUMN ip_type TEXT DEFAULT 'dhcp'")
+    _add_column_if_missing(cursor, 'devices', 'ip_type', "TEXT DEFAULT 'dhcp'")
+    _add_column_if_missing(cursor, 'devices', 'change_version', "INTEGER DEFAULT 0")
+    # Consecutive scans/checks that did not see the device (offline after offline_after_misses)
+    _add_column_if_missing(cursor, 'devices', 'missed_scans', "INTEGER DEFAULT 0")
+    # Last port scan (NULL = never scanned; device_ports holds the open ports)
+    _add_column_if_missing(cursor, 'devices', 'ports_scanned_at', "DATETIME")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_change_version ON devices(change_version)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_device_tombstones_version ON device_tombstones(change_version)")
+    for table in VERSIONED_TABLES:
+        cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)", (table,))
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('device_tombstones', 0)")
+    cursor.executescript(DEVICE_VERSION_TRIGGERS)
+    for table in VERSIONED_TABLES:
+        if table != 'devices':
+            cursor.executescript(_version_triggers(table))
+
+    _add_column_if_missing(cursor, 'speed_tests', 'test_type', "TEXT DEFAULT 'wan'")
+    for column in BUFFERBLOAT_COLUMNS:
+        _add_column_if_missing(cursor, 'speed_tests', column, 'TEXT' if column == 'bufferbloat_grade' else 'REAL')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_speed_tests_type_timestamp ON speed_tests(test_type, timestamp)")
 
     # Default settings
     defaults = {
@@ -129,12 +330,16 @@ def init_db():
         'speed_test_retention': '30',
         'auto_network_scan': 'true',
         'network_scan_frequency': '15',
-        'network_range': '192.168.1.0/24',
+        'presence_check_frequency': '2',
+        'offline_after_misses': '3',
+        'network_range': 'auto',
         'notify_new_devices': 'true',
         'telegram_enabled': 'false',
         'telegram_bot_token': '',
         'telegram_chat_id': '',
         'timezone': '1',
+        'bufferbloat_test': 'true',
+        'bufferbloat_target': '1.1.1.1',
     }
 
     for key, value in defaults.items():
@@ -142,6 +347,15 @@ def init_db():
             "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
             (key, value)
         )
+    # One-time data migrations, tracked in PRAGMA user_version
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # The old default was never used by arp-scan (--localnet on eth0): keep
+        # scanning whatever is connected instead of a subnet the host may not
+        # have. Only once, so a range chosen later is left alone.
+        cursor.execute("UPDATE settings SET value = 'auto' WHERE key = 'network_range' AND value = '192.168.1.0/24'")
+    if version < SCHEMA_VERSION:
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     conn.commit()
     conn.close()
@@ -151,12 +365,11 @@ def init_db():
 def save_speed_test(data: dict) -> dict:
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO speed_tests (timestamp, download_speed, upload_speed, ping, jitter,
-                                  server_name, server_id, server_location, isp, external_ip, raw_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        now_local(),
+    columns = ('test_type', 'download_speed', 'upload_speed', 'ping', 'jitter',
+               'server_name', 'server_id', 'server_location', 'isp', 'external_ip',
+               'raw_data') + BUFFERBLOAT_COLUMNS
+    values = [
+        data.get('test_type', 'wan'),
         data.get('download_speed'),
         data.get('upload_speed'),
         data.get('ping'),
@@ -167,7 +380,11 @@ def save_speed_test(data: dict) -> dict:
         data.get('isp'),
         data.get('external_ip'),
         json.dumps(data.get('raw_data', {})),
-    ))
+    ] + [data.get(column) for column in BUFFERBLOAT_COLUMNS]
+    cursor.execute(f"""
+        INSERT INTO speed_tests (timestamp, {', '.join(columns)})
+        VALUES (?, {', '.join('?' for _ in columns)})
+    """, [now_local()] + values)
     conn.commit()
     row_id = cursor.lastrowid
     result = dict(conn.execute("SELECT * FROM speed_tests WHERE id = ?", (row_id,)).fetchone())
@@ -175,36 +392,61 @@ def save_speed_test(data: dict) -> dict:
     return result
 
 
-def get_speed_tests(range_filter: str = '24h', limit: int = 500) -> list:
-    conn = get_db()
+def _fetch_columnar(conn, query: str, params) -> dict:
+    """Run a query and return parallel arrays {column: [values...]} (no per-row dicts)."""
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples
+    rows = cursor.execute(query, params).fetchall()
+    names = [d[0] for d in cursor.description]
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(column) for name, column in zip(names, values)}
+
+
+# Columns of ?format=columnar speed test results (what the charts plot)
+CHART_COLUMNS = ('id', 'timestamp', 'download_speed', 'upload_speed', 'ping', 'jitter')
+
+
+def get_speed_tests(range_filter: str = '24h', limit: int = 500, test_type: str = 'wan', conn=None,
+                    columnar: bool = False):
+    """
+    Speed tests in a range, oldest first: a list of row dicts, or with
+    columnar=True parallel arrays of CHART_COLUMNS ({'timestamp': [...], ...}).
+    """
+    conn, owned = _open(conn)
     time_filter = _get_time_filter(range_filter)
-    query = "SELECT * FROM speed_tests"
-    params = []
+    query = f"SELECT {', '.join(CHART_COLUMNS) if columnar else '*'} FROM speed_tests WHERE test_type = ?"
+    params = [test_type]
 
     if time_filter:
-        query += f" WHERE timestamp >= datetime(?, ?)"
-        params.append(now_local())
+        query += " AND timestamp >= datetime(?, ?)"
+        params.append(now_local(conn))
         params.append(time_filter)
 
     query += " ORDER BY timestamp ASC LIMIT ?"
     params.append(limit)
 
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    try:
+        if columnar:
+            return _fetch_columnar(conn, query, params)
+        return [dict(r) for r in conn.execute(query, params).fetchall()]
+    finally:
+        if owned:
+            conn.close()
 
 
-def get_latest_speed_test() -> dict:
-    conn = get_db()
+def get_latest_speed_test(test_type: str = 'wan', conn=None) -> dict:
+    conn, owned = _open(conn)
     row = conn.execute(
-        "SELECT * FROM speed_tests ORDER BY timestamp DESC LIMIT 1"
+        "SELECT * FROM speed_tests WHERE test_type = ? ORDER BY timestamp DESC LIMIT 1",
+        (test_type,)
     ).fetchone()
-    conn.close()
+    if owned:
+        conn.close()
     return dict(row) if row else None
 
 
-def get_speed_test_stats() -> dict:
-    conn = get_db()
+def get_speed_test_stats(test_type: str = 'wan', conn=None) -> dict:
+    conn, owned = _open(conn)
     row = conn.execute("""
         SELECT
             MAX(download_speed) as best_download,
@@ -215,11 +457,36 @@ def get_speed_test_stats() -> dict:
             AVG(ping) as avg_ping,
             COUNT(*) as total_tests
         FROM speed_tests
-    """).fetchone()
-    conn.close()
+        WHERE test_type = ?
+    """, (test_type,)).fetchone()
+    if owned:
+        conn.close()
     return dict(row) if row else {}
 
 
+def get_speed_test_columns(range_filter: str = '30d', test_type: str = 'wan',
+                           columns: tuple = ('download_speed', 'upload_speed', 'ping', 'jitter')):
+    """
+    Load a speed test range column-wise for analytics.
+    Returns (timestamps, rows) where rows are plain tuples of the requested columns.
+    """
+    conn = get_db()
+    conn.row_factory = None  # plain tuples, no Row overhead
+    time_filter = _get_time_filter(range_filter)
+    query = f"SELECT timestamp, {', '.join(columns)} FROM speed_tests WHERE test_type = ?"
+    params = [test_type]
+
+    if time_filter:
+        query += " AND timestamp >= datetime(?, ?)"
+        params.append(now_local())
+        params.append(time_filter)
+
+    query += " ORDER BY timestamp ASC"
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [r[0] for r in rows], [r[1:] for r in rows]
+
+
 def clear_speed_tests():
     conn = get_db()
     conn.execute("DELETE FROM speed_tests")
@@ -228,9 +495,9 @@ def clear_speed_tests():
 
 
 # --- Devices ---
-def get_devices(status_filter: str = None) -> list:
-    conn = get_db()
-    query = "SELECT * FROM devices"
+def get_devices(status_filter: str = None, fields: tuple = None, conn=None) -> list:
+    conn, owned = _open(conn)
+    query = f"SELECT {', '.join(fields) if fields else '*'} FROM devices"
     params = []
 
     if status_filter:
@@ -239,10 +506,74 @@ def get_devices(status_filter: str = None) -> list:
 
     query += " ORDER BY is_online DESC, custom_name ASC, hostname ASC"
     rows = conn.execute(query, params).fetchall()
-    conn.close()
+    if owned:
+        conn.close()
     return [dict(r) for r in rows]
 
 
+def get_device_changes(since: int = 0, fields: tuple = None) -> dict:
+    """
+    Delta sync: devices inserted or updated after change version `since` and
+    ids deleted since then. Pass the returned 'version' as `since` next time.
+    since=0 (or a version from a reset database, or one older than the
+    pruned tombstones) returns every device with full=True, meaning the
+    client should replace its list.
+    """
+    conn = get_db()
+    try:
+        conn.execute("BEGIN")  # version, rows and tombstones from one snapshot
+        return _device_changes(conn, since, fields)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _device_changes(conn, since: int, fields: tuple = None) -> dict:
+    columns = ', '.join(fields) if fields else '*'
+    versions = dict(conn.execute(
+        "SELECT name, version FROM data_versions WHERE name IN ('devices', 'device_tombstones')").fetchall())
+    version = versions['devices']
+    # Deletions up to the pruned version are no longer known
+    full = since <= 0 or since > version or since < versions.get('device_tombstones', 0)
+    if full:
+        rows = conn.execute(
+            f"SELECT {columns} FROM devices ORDER BY is_online DESC, custom_name ASC, hostname ASC"
+        ).fetchall()
+        deleted = []
+    else:
+        rows = conn.execute(
+            f"SELECT {columns} FROM devices WHERE change_version > ? ORDER BY change_version", (since,)
+        ).fetchall()
+        deleted = [row[0] for row in conn.execute(
+            "SELECT device_id FROM device_tombstones WHERE change_version > ? ORDER BY change_version", (since,)
+        )]
+    return {
+        'version': version,
+        'full': full,
+        'devices': [dict(r) for r in rows],
+        'deleted': deleted,
+    }
+
+
+def prune_device_tombstones(days: int = TOMBSTONE_RETENTION_DAYS) -> int:
+    """Delete tombstones older than `days`, raising the delta sync horizon. Returns the count."""
+    conn = get_db()
+    try:
+        horizon = conn.execute(
+            "SELECT MAX(change_version) FROM device_tombstones WHERE deleted_at < datetime('now', ?)",
+            (f'-{days} days',)
+        ).fetchone()[0]
+        if horizon is None:
+            return 0
+        deleted = conn.execute("DELETE FROM device_tombstones WHERE change_version <= ?", (horizon,)).rowcount
+        conn.execute("UPDATE data_versions SET version = MAX(version, ?) WHERE name = 'device_tombstones'",
+                     (horizon,))
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
 def get_device(device_id: int) -> dict:
     conn = get_db()
     row = conn.execute("SELECT * FROM devices WHERE id = ?", (device_id,)).fetchone()
@@ -306,7 +637,11 @@ def update_device(device_id: int, data: dict) -> dict:
 
 
 def upsert_device_by_mac(data: dict) -> dict:
-    """Insert or update device by MAC address (used during scans)."""
+    """
+    Insert or update device by MAC address (used during scans). A known
+    device is only written when something changed or its last_seen is
+    LAST_SEEN_RESOLUTION old, so scans do not bump every change_version.
+    """
     conn = get_db()
     existing = conn.execute(
         "SELECT * FROM devices WHERE mac_address = ?",
@@ -315,28 +650,29 @@ def upsert_device_by_mac(data: dict) -> dict:
 
     if existing:
         existing = dict(existing)
-        ts = now_local()
-        # Update IP, hostname, brand (if empty), device_type (if 'other'), mark online
-        conn.execute("""
-            UPDATE devices SET
-                ip_address = ?,
-                hostname = COALESCE(?, hostname),
-                brand = CASE WHEN brand IS NULL OR brand = '' THEN ? ELSE brand END,
-                device_type = CASE WHEN device_type IS NULL OR device_type = 'other' THEN ? ELSE device_type END,
-                is_online = 1,
-                last_seen = ?,
-                updated_at = ?
-            WHERE id = ?
-        """, (
-            data.get('ip_address'),
-            data.get('hostname'),
-            data.get('brand', ''),
-            data.get('device_type', 'other'),
-            ts, ts,
-            existing['id']
-        ))
-        conn.commit()
-        result = dict(conn.execute("SELECT * FROM devices WHERE id = ?", (existing['id'],)).fetchone())
+        ts = now_local(conn)
+        # New IP and hostname, brand if empty, device_type if 'other', online
+        fields = {
+            'ip_address': data.get('ip_address'),
+            'hostname': data.get('hostname') if data.get('hostname') is not None else existing['hostname'],
+            'brand': existing['brand'] or data.get('brand', ''),
+            'device_type': (existing['device_type'] if existing['device_type'] not in (None, 'other')
+                            else data.get('device_type', 'other')),
+            'is_online': 1,
+            'missed_scans': 0,
+        }
+        # Like record_presence: rows that would not change are not written
+        # (last_seen alone is refreshed every LAST_SEEN_RESOLUTION seconds)
+        if (any(existing[key] != value for key, value in fields.items())
+                or not existing['last_seen'] or existing['last_seen'] < _last_seen_stale(ts)):
+            conn.execute(f"""
+                UPDATE devices SET {', '.join(f'{key} = ?' for key in fields)}, last_seen = ?, updated_at = ?
+                WHERE id = ?
+            """, (*fields.values(), ts, ts, existing['id']))
+            conn.commit()
+            result = dict(conn.execute("SELECT * FROM devices WHERE id = ?", (existing['id'],)).fetchone())
+        else:
+            result = existing
     else:
         cursor = conn.cursor()
         ts = now_local()
@@ -367,12 +703,135 @@ def get_all_mac_addresses() -> set:
     return {row['mac_address'] for row in rows}
 
 
-def mark_all_offline():
-    """Mark all devices as offline before scan."""
+def set_device_presence(mac: str, online: bool, ip: str = None, offline_after: int = 1):
+    """
+    Passive presence update of a known device: online refreshes last_seen
+    (and the IP if given), with the same write rule as record_presence;
+    offline counts a miss and marks the device offline after offline_after
+    consecutive misses. Returns the device if is_online changed, else None.
+    """
     conn = get_db()
-    conn.execute("UPDATE devices SET is_online = 0 WHERE status != 'manual'")
-    conn.commit()
+    try:
+        row = conn.execute("SELECT id, is_online FROM devices WHERE mac_address = ?", (mac,)).fetchone()
+        if row is None:
+            return None
+        if online:
+            now = now_local(conn)
+            conn.execute("""
+                UPDATE devices SET is_online = 1, missed_scans = 0, last_seen = ?,
+                                   ip_address = COALESCE(?, ip_address)
+                WHERE id = ?
+                  AND (is_online = 0 OR missed_scans != 0 OR last_seen IS NULL OR last_seen < ?
+                       OR ip_address IS NOT COALESCE(?, ip_address))
+            """, (now, ip, row['id'], _last_seen_stale(now), ip))
+            conn.commit()
+            changed = not row['is_online']
+        else:
+            changed = bool(_record_misses(conn, [row['id']], offline_after))
+            conn.commit()
+        if not changed:
+            return None
+        return dict(conn.execute("SELECT * FROM devices WHERE id = ?", (row['id'],)).fetchone())
+    finally:
+        conn.close()
+
+
+def offline_after_misses(settings: dict = None) -> int:
+    """Consecutive missed scans/checks before a device is marked offline."""
+    value = (settings if settings is not None else get_settings()).get('offline_after_misses', 3)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 3
+
+
+def presence_interval(settings: dict = None) -> int:
+    """Seconds between presence checks (known device checks, else full scans)."""
+    settings = settings if settings is not None else get_settings()
+    for key, default in (('presence_check_frequency', 2), ('network_scan_frequency', 15)):
+        try:
+            minutes = int(settings.get(key, default) or 0)
+        except (TypeError, ValueError):
+            minutes = default
+        if minutes > 0:
+            return minutes * 60
+    return 120
+
+
+def get_presence_targets() -> list:
+    """Known devices (not manual) with IP and MAC, for targeted presence checks."""
+    conn = get_db()
+    rows = conn.execute("""
+        SELECT id, ip_address, mac_address, is_online FROM devices
+        WHERE status != 'manual' AND ip_address IS NOT NULL AND ip_address != ''
+          AND mac_address IS NOT NULL AND mac_address != ''
+    """).fetchall()
     conn.close()
+    return [dict(row) for row in rows]
+
+
+def record_presence(seen_ids, missed_ids, offline_after: int) -> tuple:
+    """
+    Apply a presence check: seen devices are online with their miss count
+    reset; missed ones count a miss and go offline after offline_after
+    consecutive misses. Rows that would not change are not written (seen
+    devices only refresh last_seen every LAST_SEEN_RESOLUTION seconds).
+    Returns (devices that came online, ids that went offline).
+    """
+    seen_ids, missed_ids = list(seen_ids), list(missed_ids)
+    conn = get_db()
+    try:
+        came_online = []
+        if seen_ids:
+            marks = ','.join('?' * len(seen_ids))
+            came_online = [row['id'] for row in conn.execute(
+                f"SELECT id FROM devices WHERE id IN ({marks}) AND is_online = 0", seen_ids)]
+            now = now_local(conn)
+            conn.execute(f"""
+                UPDATE devices SET is_online = 1, missed_scans = 0, last_seen = ?
+                WHERE id IN ({marks})
+                  AND (is_online = 0 OR missed_scans != 0 OR last_seen IS NULL OR last_seen < ?)
+            """, (now, *seen_ids, _last_seen_stale(now)))
+        went_offline = _record_misses(conn, missed_ids, offline_after)
+        conn.commit()
+        devices = []
+        if came_online:
+            marks = ','.join('?' * len(came_online))
+            devices = [dict(row) for row in conn.execute(f"SELECT * FROM devices WHERE id IN ({marks})", came_online)]
+        return devices, went_offline
+    finally:
+        conn.close()
+
+
+def _last_seen_stale(now: str) -> str:
+    """last_seen values older than this (now - LAST_SEEN_RESOLUTION) are due for a refresh."""
+    return (datetime.strptime(now, '%Y-%m-%d %H:%M:%S')
+            - timedelta(seconds=LAST_SEEN_RESOLUTION)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _record_misses(conn, device_ids: list, offline_after: int) -> list:
+    """Count a miss for each device (not manual); returns the ids that went offline."""
+    if not device_ids:
+        return []
+    marks = ','.join('?' * len(device_ids))
+    # Offline devices are not counted further (no write, no change_version bump)
+    conn.execute(f"UPDATE devices SET missed_scans = missed_scans + 1 "
+                 f"WHERE id IN ({marks}) AND is_online != 0 AND status != 'manual'", device_ids)
+    went_offline = [row['id'] for row in conn.execute(
+        f"SELECT id FROM devices WHERE id IN ({marks}) AND is_online != 0 AND status != 'manual' "
+        f"AND missed_scans >= ?", (*device_ids, max(1, offline_after)))]
+    if went_offline:
+        marks = ','.join('?' * len(went_offline))
+        conn.execute(f"UPDATE devices SET is_online = 0 WHERE id IN ({marks})", went_offline)
+    return sorted(went_offline)
+
+
+def get_online_device_ids() -> set:
+    """Ids of devices currently online that scans can mark offline (not manual)."""
+    conn = get_db()
+    rows = conn.execute("SELECT id FROM devices WHERE is_online = 1 AND status != 'manual'").fetchall()
+    conn.close()
+    return {row['id'] for row in rows}
 
 
 def delete_device(device_id: int):
@@ -389,6 +848,70 @@ def clear_devices():
     conn.close()
 
 
+# --- Device Ports ---
+def get_device_ports(device_id: int, conn=None) -> list:
+    conn, owned = _open(conn)
+    rows = conn.execute(
+        "SELECT port, protocol, service, banner, first_seen, last_seen FROM device_ports "
+        "WHERE device_id = ? ORDER BY protocol, port",
+        (device_id,)
+    ).fetchall()
+    if owned:
+        conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_port_scan_targets(device_ids: list = None) -> list:
+    """Devices to port scan (with an IP): the given ids, or every online device."""
+    conn = get_db()
+    query = "SELECT id, ip_address, hostname, brand, device_type FROM devices WHERE ip_address IS NOT NULL AND ip_address != ''"
+    if device_ids is None:
+        rows = conn.execute(query + " AND is_online = 1").fetchall()
+    else:
+        placeholders = ','.join('?' * len(device_ids))
+        rows = conn.execute(query + f" AND id IN ({placeholders})", list(device_ids)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def save_device_ports(device_id: int, ports: list, scanned=(), device_type: str = None) -> dict:
+    """
+    Store a TCP port scan of a device: open ports are added or refreshed
+    (known ones keep first_seen, and their banner if this scan grabbed none),
+    known ports among `scanned` that are no longer open are removed. Stamps
+    ports_scanned_at and sets device_type if given and the device is still
+    'other'. Returns the device.
+    """
+    conn = get_db()
+    ts = now_local(conn)
+    closed = set(scanned) - {p['port'] for p in ports}
+    known = {row['port'] for row in conn.execute(
+        "SELECT port FROM device_ports WHERE device_id = ? AND protocol = 'tcp'", (device_id,))}
+    conn.executemany(
+        "DELETE FROM device_ports WHERE device_id = ? AND protocol = 'tcp' AND port = ?",
+        [(device_id, port) for port in known & closed]
+    )
+    conn.executemany("""
+        INSERT INTO device_ports (device_id, protocol, port, service, banner, first_seen, last_seen)
+        VALUES (?, 'tcp', ?, ?, ?, ?, ?)
+        ON CONFLICT(device_id, protocol, port) DO UPDATE SET
+            service = excluded.service,
+            banner = CASE WHEN excluded.banner != '' THEN excluded.banner ELSE banner END,
+            last_seen = excluded.last_seen
+    """, [(device_id, p['port'], p.get('service', ''), p.get('banner', ''), ts, ts) for p in ports])
+    conn.execute("""
+        UPDATE devices SET
+            ports_scanned_at = ?,
+            device_type = CASE WHEN ? IS NOT NULL AND (device_type IS NULL OR device_type = 'other')
+                               THEN ? ELSE device_type END
+        WHERE id = ?
+    """, (ts, device_type, device_type, device_id))
+    conn.commit()
+    row = conn.execute("SELECT * FROM devices WHERE id = ?", (device_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
 # --- Ping Results ---
 def save_ping_result(data: dict) -> dict:
     conn = get_db()
@@ -434,31 +957,36 @@ def save_device_snapshot():
     conn.close()
 
 
-def get_device_snapshots(range_filter: str = '24h', limit: int = 500) -> list:
-    """Get device snapshot history."""
-    conn = get_db()
+def get_device_snapshots(range_filter: str = '24h', limit: int = 500, conn=None, columnar: bool = False):
+    """Get device snapshot history (columnar=True: parallel arrays per column)."""
+    conn, owned = _open(conn)
     time_filter = _get_time_filter(range_filter)
     query = "SELECT * FROM device_snapshots"
     params = []
 
     if time_filter:
         query += " WHERE timestamp >= datetime(?, ?)"
-        params.append(now_local())
+        params.append(now_local(conn))
         params.append(time_filter)
 
     query += " ORDER BY timestamp ASC LIMIT ?"
     params.append(limit)
 
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    try:
+        if columnar:
+            return _fetch_columnar(conn, query, params)
+        return [dict(r) for r in conn.execute(query, params).fetchall()]
+    finally:
+        if owned:
+            conn.close()
 
 
 # --- Settings ---
-def get_settings() -> dict:
-    conn = get_db()
+def get_settings(conn=None) -> dict:
+    conn, owned = _open(conn)
     rows = conn.execute("SELECT key, value FROM settings").fetchall()
-    conn.close()
+    if owned:
+        conn.close()
     settings = {}
     for row in rows:
         key, value = row['key'], row['value']
@@ -486,6 +1014,48 @@ def update_settings(data: dict):
     conn.close()
 
 
+# --- Data versions ---
+_versions_local = threading.local()
+
+
+def get_data_versions() -> dict:
+    """
+    Write counters per table ({'speed_tests': 12, 'devices': 40, ...}), bumped
+    by triggers on every insert, update and delete. Read on a long-lived
+    per-thread connection: this runs on every conditional GET.
+    """
+    conn = getattr(_versions_local, 'conn', None)
+    if conn is None:
+        conn = _versions_local.conn = get_db()
+    return dict(conn.execute("SELECT name, version FROM data_versions").fetchall())
+
+
+# --- Dashboard ---
+def get_dashboard(range_filter: str = '24h', history_range: str = '24h',
+                  test_type: str = 'wan', limit: int = 500) -> dict:
+    """
+    Everything the UI loads on start (settings, speed tests, devices, device
+    history) from a single connection and read transaction, so all sections
+    describe the same moment.
+    """
+    conn = get_db()
+    try:
+        conn.execute("BEGIN")
+        return {
+            'settings': get_settings(conn=conn),
+            'speedtest': {
+                'latest': get_latest_speed_test(test_type, conn=conn),
+                'stats': get_speed_test_stats(test_type, conn=conn),
+                'results': get_speed_tests(range_filter, limit, test_type, conn=conn),
+            },
+            'devices': _device_changes(conn, 0),
+            'device_history': get_device_snapshots(history_range, limit, conn=conn),
+        }
+    finally:
+        conn.rollback()
+        conn.close()
+
+
 # --- Helpers ---
 def _get_time_filter(range_str: str) -> str:
     filters = {
@@ -505,6 +1075,7 @@ def get_all_data() -> dict:
     return {
         'exported_at': datetime.now().isoformat(),
         'speed_tests': get_speed_tests(range_filter='all', limit=10000),
+        'lan_tests': get_speed_tests(range_filter='all', limit=10000, test_type='lan'),
         'devices': get_devices(),
         'settings': get_settings(),
     }
@@ -0,0 +1,168 @@
+"""
+NetTools - Device Type Classifier
+Infers the device type from vendor (brand) and hostname keywords, and from
+open TCP ports when the keywords say nothing.
+
+The rule table is compiled once into an Aho-Corasick automaton (expanded to a
+DFA: one dict lookup per character). Every state knows the highest priority
+rule among the keywords ending there, so a single pass over the text gives
+the same answer as checking each rule's keywords one after another, which is
+what earlier versions did. Results are memoized in a bounded LRU cache.
+"""
+
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+# (type, keywords) in priority order: the first rule with a keyword contained
+# in "<brand> <hostname>" (lowercase) wins
+RULES = (
+    ('router', ('router', 'gateway', 'mikrotik', 'ubiquiti', 'netgear',
+                'tp-link', 'tplink', 'asus', 'linksys', 'dlink', 'd-link',
+                'cisco', 'zyxel', 'huawei', 'openwrt', 'pfsense', 'fritz')),
+    ('ap', ('access point', 'unifi', 'aruba', 'ruckus', 'meraki')),
+    ('switch', ('switch', 'netgear gs', 'prosafe')),
+    ('printer', ('printer', 'print', 'epson', 'canon', 'brother',
+                 'hp inc', 'hewlett', 'lexmark', 'xerox', 'kyocera',
+                 'ricoh', 'sharp', 'konica')),
+    ('phone', ('iphone', 'samsung galaxy', 'xiaomi', 'huawei',
+               'oneplus', 'pixel', 'android', 'oppo', 'vivo',
+               'realme', 'motorola', 'phone')),
+    ('tablet', ('ipad', 'tablet', 'galaxy tab', 'fire hd', 'surface')),
+    ('tv', ('samsung elec', 'lg elec', 'sony', 'roku',
+            'fire tv', 'chromecast', 'apple tv', 'nvidia shield',
+            'tv', 'vizio', 'hisense', 'tcl')),
+    ('camera', ('camera', 'cam', 'hikvision', 'dahua', 'reolink',
+                'ring', 'nest', 'arlo', 'wyze', 'ezviz', 'axis')),
+    ('iot', ('espressif', 'esp32', 'esp8266', 'tuya', 'sonoff',
+             'shelly', 'tasmota', 'zigbee', 'alexa', 'echo',
+             'google home', 'homepod', 'smartthings', 'hue',
+             'nest', 'ring', 'iot')),
+    ('nas', ('synology', 'qnap', 'nas', 'drobo', 'buffalo',
+             'western digital', 'wd my')),
+    ('gaming', ('playstation', 'xbox', 'nintendo', 'steam deck', 'gaming')),
+    ('server', ('server', 'proxmox', 'vmware', 'dell emc',
+                'supermicro', 'lenovo server')),
+    # Desktops / laptops
+    ('desktop', ('intel', 'amd', 'dell', 'lenovo', 'hp ', 'acer', 'msi')),
+    # Apple devices (when we can't distinguish type)
+    ('desktop', ('apple', 'macbook', 'imac', 'mac mini')),
+    # Raspberry Pi / SBCs
+    ('server', ('raspberry', 'raspberrypi')),
+)
+
+# Router vendors also make APs and switches: checked in this order when the
+# router rule wins
+ROUTER_SUBTYPES = (
+    ('ap', ('unifi', 'ap', 'access point', 'uap')),
+    ('switch', ('switch', 'gs3', 'gs1')),
+)
+
+# Open TCP ports that give the type away, in priority order; only used when
+# no keyword rule matches
+PORT_RULES = (
+    ('printer', (9100, 631, 515)),     # JetDirect, IPP, LPD
+    ('camera', (554, 37777)),          # RTSP, Dahua
+    ('tv', (8009,)),                   # Chromecast / Cast receivers
+    ('phone', (62078,)),               # iPhone / iPad sync
+    ('nas', (5001,)),                  # Synology DSM
+    ('iot', (6053, 6668)),             # ESPHome, Tuya
+    ('router', (8291,)),               # MikroTik Winbox
+    ('server', (32400, 8123, 10000)),  # Plex, Home Assistant, Webmin
+    ('desktop', (3389,)),              # RDP
+)
+
+CACHE_SIZE = 4096
+
+
+class _Automaton:
+    """Aho-Corasick DFA reporting the first (lowest index) rule with a keyword in the text."""
+
+    def __init__(self, rules):
+        # Trie of all keywords; rule[state] = best rule index of keywords ending there
+        goto = [{}]
+        rule = [None]
+        for index, (_, keywords) in enumerate(rules):
+            for keyword in keywords:
+                state = 0
+                for char in keyword:
+                    if char not in goto[state]:
+                        goto.append({})
+                        rule.append(None)
+                        goto[state][char] = len(goto) - 1
+                    state = goto[state][char]
+                if rule[state] is None or index < rule[state]:
+                    rule[state] = index
+
+        # Failure links (longest proper suffix that is a trie node), in BFS
+        # order, merging the suffix's rule; then full transitions per state
+        fail = [0] * len(goto)
+        self._delta = [None] * len(goto)
+        self._delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            suffix = fail[state]
+            suffix_rule = rule[suffix]
+            if suffix_rule is not None and (rule[state] is None or suffix_rule < rule[state]):
+                rule[state] = suffix_rule
+            self._delta[state] = {**self._delta[suffix], **goto[state]}
+            for char, child in goto[state].items():
+                fail[child] = self._delta[suffix].get(char, 0) if state else 0
+                queue.append(child)
+        self._rule = rule
+
+    def first_rule(self, text: str) -> Optional[int]:
+        delta, rules = self._delta, self._rule
+        state, best = 0, None
+        for char in text:
+            state = delta[state].get(char, 0)
+            found = rules[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+
+_RULES = _Automaton(RULES)
+_ROUTER = _Automaton(ROUTER_SUBTYPES)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _classify(text: str) -> str:
+    rule = _RULES.first_rule(text)
+    if rule is None:
+        return 'other'
+    if rule == 0:
+        subtype = _ROUTER.first_rule(text)
+        return ROUTER_SUBTYPES[subtype][0] if subtype is not None else 'router'
+    return RULES[rule][0]
+
+
+def infer_device_type(brand: str = '', hostname: str = '', mac: str = '', ports=None) -> str:
+    """
+    Infer the device type from brand/vendor name, hostname, MAC prefix and,
+    if known, open TCP ports.
+    Returns one of: router, switch, ap, printer, phone, tablet, tv, camera,
+    iot, server, desktop, laptop, nas, gaming, other
+    """
+    # The rules only look at brand and hostname, so the MAC is not part of
+    # the cache key (it would only split identical entries)
+    device_type = _classify(f"{(brand or '').lower()} {(hostname or '').lower()}")
+    if device_type == 'other' and ports:
+        return type_from_ports(ports)
+    return device_type
+
+
+def type_from_ports(ports) -> str:
+    """Device type given away by a set of open TCP ports ('other' if none)."""
+    ports = set(ports)
+    for device_type, rule_ports in PORT_RULES:
+        if ports.intersection(rule_ports):
+            return device_type
+    return 'other'
+
+
+def cache_info():
+    return _classify.cache_info()
@@ -0,0 +1,139 @@
+"""
+NetTools - In-process Event Broadcaster
+Fans out events to Server-Sent Events (SSE) subscribers
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE keep-alive comments (keeps nginx / proxies from closing idle streams)
+KEEPALIVE_INTERVAL = 15
+
+
+def format_sse(event: str, data) -> str:
+    """Serialize an event in the text/event-stream wire format."""
+    payload = json.dumps(data, default=str, separators=(',', ':'))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class EventBroadcaster:
+    """
+    Broadcast events to any number of asyncio subscribers.
+
+    publish() is thread-safe: it can be called from the event loop, from
+    executor threads or from APScheduler jobs. Each event is serialized once
+    and the same string is handed to every subscriber queue. Slow subscribers
+    drop their oldest pending event instead of blocking the publisher.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._max_queue = max_queue
+        self._last = None
+
+    def subscribe(self, replay_last: bool = False) -> asyncio.Queue:
+        """Register a new subscriber queue (must be called from the event loop)."""
+        queue = asyncio.Queue(maxsize=self._max_queue)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(queue)
+            if replay_last and self._last is not None:
+                queue.put_nowait(self._last)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def clear_last(self):
+        """Forget the last event so new subscribers do not replay it."""
+        with self._lock:
+            self._last = None
+
+    def publish(self, event: str, data) -> None:
+        """Publish an event to all current subscribers."""
+        message = format_sse(event, data)
+        with self._lock:
+            self._last = message
+            subscribers = tuple(self._subscribers)
+            loop = self._loop
+
+        if not subscribers or loop is None or loop.is_closed():
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._deliver(subscribers, message)
+        else:
+            loop.call_soon_threadsafe(self._deliver, subscribers, message)
+
+    @staticmethod
+    def _deliver(subscribers, message: str):
+        for queue in subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Drop the oldest event for this slow client and retry once
+                try:
+                    queue.get_nowait()
+                    queue.put_nowait(message)
+                except (asyncio.QueueEmpty, asyncio.QueueFull):
+                    pass
+
+
+async def sse_stream(broadcaster: EventBroadcaster, request, queue: asyncio.Queue = None,
+                     until=None, initial: str = None):
+    """
+    Async generator producing SSE messages for a StreamingResponse.
+
+    Args:
+        broadcaster: source of events
+        request: Starlette request (used to detect client disconnects)
+        queue: an already-subscribed queue (subscribe before starting work
+               to avoid missing the first events)
+        until: optional tuple of event names that end the stream
+        initial: optional message (from format_sse) sent first, e.g. a state
+                 snapshot; it ends the stream too if its event is in `until`
+    """
+    if queue is None:
+        queue = broadcaster.subscribe()
+    end_prefixes = tuple(f"event: {name}\n" for name in until or ())
+    try:
+        if initial is not None:
+            yield initial
+            if end_prefixes and initial.startswith(end_prefixes):
+                return
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield message
+            if end_prefixes and message.startswith(end_prefixes):
+                break
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+# Shared broadcasters
+speedtest_events = EventBroadcaster()
+# Dashboard push channel (GET /api/events): small deltas about devices,
+# speed test results, jobs and settings, shared by every open dashboard
+app_events = EventBroadcaster()
@@ -0,0 +1,50 @@
+"""
+NetTools - Single Instance Lock
+Jobs, live event streams and metrics are kept in process memory, so one
+backend process serves each database. It holds an exclusive fcntl lock on a
+file next to the database (released by the kernel when the process dies);
+a second backend started on the same database refuses to start.
+"""
+
+import logging
+import os
+
+import database as db
+
+try:
+    import fcntl
+except ImportError:  # Non-POSIX: no lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = os.path.join(os.path.dirname(db.DB_PATH), 'nettools.lock')
+
+_fd = None
+
+
+def acquire():
+    """Take the lock and write our pid into it; RuntimeError if another backend holds it."""
+    global _fd
+    if fcntl is None or _fd is not None:
+        return
+    os.makedirs(os.path.dirname(LOCK_PATH) or '.', exist_ok=True)
+    fd = os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        owner = os.pread(fd, 32, 0).decode(errors='replace').strip() or '?'
+        os.close(fd)
+        raise RuntimeError(f"Another NetTools backend (pid {owner}) is already running on "
+                           f"{db.DB_PATH}; run a single uvicorn worker")
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, str(os.getpid()).encode(), 0)
+    _fd = fd
+    logger.info(f"Backend {os.getpid()} holds {LOCK_PATH}")
+
+
+def release():
+    global _fd
+    if _fd is not None:
+        os.close(_fd)  # also releases the lock
+        _fd = None
@@ -0,0 +1,479 @@
+"""
+NetTools - Background Job Coordinator
+Runs long operations (speed tests, scans, port scans, traceroutes) as jobs with ids,
+status, progress events, cancellation and bounded queues.
+Manual (API) and scheduled jobs go through the same coordinator.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import database as db
+import metrics
+import pools
+from events import EventBroadcaster, app_events, speedtest_events
+from speedtest_service import run_speed_test
+from device_classifier import infer_device_type
+from network_service import check_hosts, scan_network, verify_hosts
+from port_scanner import parse_ports, scan_ports_sync
+from traceroute_service import run_traceroute
+
+try:
+    from telegram_service import send_new_device_alert
+except ImportError:
+    send_new_device_alert = None
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for GET /api/jobs/{id}
+JOB_HISTORY = 50
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job kind has no free slot and its queue is full."""
+
+
+class UnknownJobType(Exception):
+    pass
+
+
+class Job:
+    """A unit of work tracked by the coordinator."""
+
+    def __init__(self, kind: str, params: dict, source: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.source = source
+        self.status = QUEUED
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.exception = None  # original exception of a failed job (not serialized)
+        self.cancel_event = threading.Event()
+        self.events = EventBroadcaster()
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def emit_progress(self, data: dict):
+        """Report progress from the job function (any thread)."""
+        self.progress = data
+        self.events.publish('progress', data)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'params': self.params,
+            'source': self.source,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+        }
+
+    async def wait(self) -> 'Job':
+        """Wait (without holding a thread) until the job has finished."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.finished:
+                return self
+            self._waiters.append((loop, future))
+        await future
+        return self
+
+    def _set_state(self, status: str, **fields):
+        with self._lock:
+            self.status = status
+            for key, value in fields.items():
+                setattr(self, key, value)
+            waiters = self._waiters if self.finished else []
+            if self.finished:
+                self._waiters = []
+
+        event = 'done' if status in FINISHED_STATES else 'status'
+        self.events.publish(event, self.to_dict())
+        app_events.publish('job', {'id': self.id, 'type': self.kind, 'source': self.source, 'status': status})
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _JobType:
+    def __init__(self, func, concurrency: int, max_queued: int, pool: str):
+        self.func = func
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.pool = pools.get_pool(pool)
+        self.running = 0
+        self.queue = deque()
+
+
+class JobCoordinator:
+    """
+    Schedules jobs per type: at most `concurrency` running and `max_queued`
+    waiting. Job functions run in the type's worker pool (see pools.py) as
+    func(job, **params) and should poll job.is_cancelled() (or pass
+    job.cancel_event down) to stop early.
+    """
+
+    def __init__(self):
+        self._types = {}
+        self._jobs = OrderedDict()
+        self._lock = threading.RLock()
+
+    def register(self, kind: str, func, concurrency: int = 1, max_queued: int = 0,
+                 pool: str = 'bulk'):
+        self._types[kind] = _JobType(func, concurrency, max_queued, pool)
+        # Job types sharing a pool must not wait for each other's workers
+        work_pool = self._types[kind].pool
+        slots = sum(t.concurrency for t in self._types.values() if t.pool is work_pool)
+        if slots > work_pool.max_workers:
+            logger.warning(f"Pool '{work_pool.name}' has {work_pool.max_workers} workers for {slots} job slots "
+                           f"({', '.join(k for k, t in self._types.items() if t.pool is work_pool)}): "
+                           f"jobs may queue behind other job types")
+
+    def submit(self, kind: str, params: dict = None, source: str = 'manual') -> Job:
+        """
+        Queue a job. source is 'manual' (API) or 'scheduled'.
+        Raises JobQueueFull when the type has no running slot or queue space left.
+        """
+        job_type = self._types.get(kind)
+        if job_type is None:
+            raise UnknownJobType(f"Tipo de tarea desconocido: {kind}")
+
+        with self._lock:
+            if job_type.running >= job_type.concurrency and len(job_type.queue) >= job_type.max_queued:
+                raise JobQueueFull(kind)
+
+            job = Job(kind, params or {}, source)
+            self._jobs[job.id] = job
+            job_type.queue.append(job)
+            self._trim_history()
+            self._dispatch(job_type)
+
+        logger.info(f"Job {job.id} ({kind}, {source}) submitted")
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued job immediately, or signal a running one to stop."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_event.set()
+            job_type = self._types[job.kind]
+            if job in job_type.queue:
+                job_type.queue.remove(job)
+                job._set_state(CANCELLED, finished_at=datetime.now().isoformat(timespec='seconds'))
+        logger.info(f"Job {job_id} cancellation requested")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def active_job(self, kind: str) -> Job:
+        """Return the running or queued job of a type, if any."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and not job.finished:
+                    return job
+        return None
+
+    def is_active(self, kind: str) -> bool:
+        return self.active_job(kind) is not None
+
+    def shutdown(self):
+        """Cancel every queued or running job."""
+        with self._lock:
+            for job in list(self._jobs.values()):
+                if not job.finished:
+                    self.cancel(job.id)
+
+    # --- Internals ---
+    def _dispatch(self, job_type: _JobType):
+        while job_type.queue and job_type.running < job_type.concurrency:
+            job = job_type.queue.popleft()
+            job_type.running += 1
+            job_type.pool.submit(self._run, job, job_type)
+
+    def _run(self, job: Job, job_type: _JobType):
+        started = time.monotonic()
+        job._set_state(RUNNING, started_at=datetime.now().isoformat(timespec='seconds'))
+        try:
+            result = job_type.func(job, **job.params)
+            if job.is_cancelled():
+                job._set_state(CANCELLED, finished_at=datetime.now().isoformat(timespec='seconds'))
+            else:
+                job._set_state(SUCCEEDED, result=result, finished_at=datetime.now().isoformat(timespec='seconds'))
+        except Exception as e:
+            if job.is_cancelled():
+                job._set_state(CANCELLED, finished_at=datetime.now().isoformat(timespec='seconds'))
+            else:
+                logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                job._set_state(FAILED, error=str(e), exception=e,
+                                finished_at=datetime.now().isoformat(timespec='seconds'))
+        finally:
+            elapsed = time.monotonic() - started
+            metrics.job_duration.labels(job.kind, job.source, job.status).observe(elapsed)
+            logger.info(f"Job {job.id} ({job.kind}) {job.status} in {elapsed:.1f}s")
+            with self._lock:
+                job_type.running -= 1
+                self._dispatch(job_type)
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+
+# ==========================================
+#  Job functions
+# ==========================================
+
+def speed_test_job(job: Job, server_id: str = None, bufferbloat: bool = None) -> dict:
+    """Run a speed test and save it. Progress also goes to speedtest_events (dashboards)."""
+    settings = db.get_settings()
+    if bufferbloat is None:
+        bufferbloat = bool(settings.get('bufferbloat_test', True))
+
+    def on_progress(event):
+        job.emit_progress(event)
+        speedtest_events.publish('progress', event)
+
+    speedtest_events.clear_last()
+    try:
+        result = run_speed_test(
+            server_id,
+            on_progress=on_progress,
+            bufferbloat=bufferbloat,
+            wan_target=settings.get('bufferbloat_target'),
+            cancel_event=job.cancel_event,
+        )
+        saved = db.save_speed_test(result)
+    except Exception as e:
+        speedtest_events.publish('error', {'detail': 'Test cancelado' if job.is_cancelled() else str(e)})
+        raise
+    speedtest_events.publish('result', saved)
+    app_events.publish('speedtest_saved', saved)
+    return saved
+
+
+def network_scan_job(job: Job) -> dict:
+    """Scan the network, upsert devices, save a snapshot and alert on new devices."""
+    settings = db.get_settings()
+    network_range = settings.get('network_range', 'auto')
+    logger.info(f"Running network scan on {network_range} ({job.source})...")
+
+    # Collect existing MAC addresses and online devices before the scan
+    existing_macs = db.get_all_mac_addresses()
+    online_before = db.get_online_device_ids()
+
+    job.emit_progress({'phase': 'scanning', 'network_range': network_range})
+    new_devices = []
+    online_after = set()
+    seen = set()
+
+    def on_shard(event: dict):
+        # Store each host (nmap) or shard's devices as soon as it is reported,
+        # so large scans show up incrementally and an aborted scan keeps what
+        # it already found
+        for device_data in event['devices']:
+            key = device_data.get('mac_address') or device_data.get('ip_address')
+            if key in seen:
+                continue
+            seen.add(key)
+            device = db.upsert_device_by_mac(device_data)
+            online_after.add(device['id'])
+            mac = device_data.get('mac_address', '')
+            if mac and mac not in existing_macs:
+                new_devices.append(device_data)
+                app_events.publish('device_new', device)
+            elif device['id'] not in online_before:
+                app_events.publish('device_online', device)
+        job.emit_progress({**event, 'network_range': network_range})
+
+    devices = scan_network(network_range, cancel_event=job.cancel_event, on_progress=on_shard)
+
+    # Online devices this scan did not see are re-verified (targeted ARP + ping);
+    # the rest count a miss and go offline after N in a row
+    missing = online_before - online_after
+    confirmed = _verify_missing(job, missing)
+    _, went_offline = db.record_presence(confirmed, missing - confirmed, db.offline_after_misses(settings))
+    if went_offline:
+        app_events.publish('device_offline', {'ids': went_offline})
+
+    # Save historical snapshot
+    db.save_device_snapshot()
+    db.prune_device_tombstones()
+    metrics.scan_devices.set(len(devices))
+    logger.info(f"Network scan completed: {len(devices)} devices found, {len(new_devices)} new")
+
+    # Send Telegram notification for new devices (scheduled scans only, as before)
+    if (job.source == 'scheduled' and new_devices and send_new_device_alert
+            and settings.get('telegram_enabled', False)):
+        bot_token = settings.get('telegram_bot_token', '')
+        chat_id = settings.get('telegram_chat_id', '')
+        if bot_token and chat_id:
+            send_new_device_alert(bot_token, chat_id, new_devices)
+
+    summary = {
+        'found': len(devices),
+        'new_devices': len(new_devices),
+        'updated_devices': len(devices) - len(new_devices),
+    }
+    app_events.publish('scan_complete', {**summary, 'offline': len(went_offline)})
+    return summary
+
+
+def presence_check_job(job: Job) -> dict:
+    """
+    Cheap re-check of known devices with targeted ARP requests, run more
+    often than full scans: no discovery, no snapshot, writes only changes.
+    """
+    if coordinator.is_active('scan'):
+        return {'skipped': True}
+    settings = db.get_settings()
+    known = db.get_presence_targets()
+    if not known:
+        return {'checked': 0, 'online': 0, 'offline': 0}
+
+    job.emit_progress({'phase': 'checking', 'devices': len(known)})
+    answered, checked = check_hosts([d['ip_address'] for d in known], cancel_event=job.cancel_event)
+    mac_by_ip = {d['ip_address']: d['mac_address'] for d in answered}
+    seen = [d['id'] for d in known if mac_by_ip.get(d['ip_address']) == d['mac_address']]
+    seen_ids = set(seen)
+    missed = {d['id'] for d in known if d['ip_address'] in checked and d['id'] not in seen_ids}
+    # Only devices still online can change state: re-verify those before counting the miss
+    confirmed = _verify_missing(job, {d['id'] for d in known if d['id'] in missed and d['is_online']}, known)
+    seen += confirmed
+    missed -= confirmed
+
+    came_online, went_offline = db.record_presence(seen, missed, db.offline_after_misses(settings))
+    for device in came_online:
+        app_events.publish('device_online', device)
+    if went_offline:
+        app_events.publish('device_offline', {'ids': went_offline})
+
+    return {
+        'checked': len(checked),
+        'online': len(came_online),
+        'offline': len(went_offline),
+    }
+
+
+def _verify_missing(job: Job, device_ids: set, known: list = None) -> set:
+    """Ids among device_ids that answer a post-scan re-verification."""
+    if not device_ids:
+        return set()
+    hosts = [d for d in (known if known is not None else db.get_presence_targets()) if d['id'] in device_ids]
+    if not hosts:
+        return set()
+    job.emit_progress({'phase': 'verifying', 'devices': len(hosts)})
+    confirmed_ips = verify_hosts(hosts, cancel_event=job.cancel_event)
+    confirmed = {d['id'] for d in hosts if d['ip_address'] in confirmed_ips}
+    if confirmed:
+        logger.info(f"{len(confirmed)} of {len(hosts)} missing devices answered the re-verification")
+    return confirmed
+
+
+def port_scan_job(job: Job, device_ids: list = None, ports=None, banners: bool = False) -> dict:
+    """
+    TCP port scan of devices (every online device by default). Open ports are
+    saved per device as each host finishes; devices still typed 'other' get
+    a type from them.
+    """
+    port_list = parse_ports(ports)
+    targets = db.get_port_scan_targets(device_ids)
+    if device_ids is not None and not targets:
+        raise ValueError("Ningun dispositivo con IP que escanear")
+    by_ip = {}
+    for device in targets:
+        by_ip.setdefault(device['ip_address'], []).append(device)
+    logger.info(f"Port scan of {len(by_ip)} hosts, {len(port_list)} ports ({job.source})...")
+
+    hosts_done = 0
+    open_ports = {}
+
+    def on_host(ip: str, result: dict):
+        nonlocal hosts_done
+        hosts_done += 1
+        for device in by_ip[ip]:
+            inferred = infer_device_type(device['brand'], device['hostname'],
+                                         ports=[p['port'] for p in result['ports']])
+            # A host that ran out of time has unchecked ports: don't drop any
+            updated = db.save_device_ports(device['id'], result['ports'],
+                                           scanned=() if result['timed_out'] else port_list,
+                                           device_type=inferred if inferred != 'other' else None)
+            open_ports[device['id']] = result['ports']
+            if updated and updated['device_type'] != device['device_type']:
+                app_events.publish('device_updated', updated)
+        job.emit_progress({
+            'phase': 'scanning',
+            'ip_address': ip,
+            'device_ids': [d['id'] for d in by_ip[ip]],
+            'ports': result['ports'],
+            'timed_out': result['timed_out'],
+            'hosts_done': hosts_done,
+            'hosts_total': len(by_ip),
+        })
+
+    job.emit_progress({'phase': 'scanning', 'hosts_done': 0, 'hosts_total': len(by_ip),
+                       'ports_per_host': len(port_list)})
+    scan_ports_sync(list(by_ip), port_list, banners=banners, cancel_event=job.cancel_event,
+                    on_host=on_host)
+    logger.info(f"Port scan completed: {sum(map(len, open_ports.values()))} open ports "
+                f"on {len(open_ports)} devices")
+    return {
+        'devices': len(open_ports),
+        'ports_per_host': len(port_list),
+        'open_ports': {str(device_id): ports for device_id, ports in open_ports.items()},
+    }
+
+
+def traceroute_job(job: Job, target: str, max_hops: int = 30) -> dict:
+    """Run a traceroute, reporting each hop as a progress event."""
+    return run_traceroute(target, max_hops=max_hops, cancel_event=job.cancel_event,
+                          on_hop=job.emit_progress)
+
+
+coordinator = JobCoordinator()
+coordinator.register('speedtest', speed_test_job, concurrency=1, max_queued=0, pool='bulk')
+coordinator.register('scan', network_scan_job, concurrency=1, max_queued=0, pool='bulk')
+coordinator.register('presence', presence_check_job, concurrency=1, max_queued=0, pool='probe')
+coordinator.register('portscan', port_scan_job, concurrency=1, max_queued=0, pool='portscan')
+coordinator.register('traceroute', traceroute_job, concurrency=2, max_queued=8, pool='probe')
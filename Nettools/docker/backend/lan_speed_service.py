@@ -0,0 +1,151 @@
+"""
+NetTools - LAN Throughput Test Service
+iperf-like device-to-server throughput test served by the backend itself
+"""
+
+import http.client
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Pre-generated payload: random bytes so no proxy/gzip layer can shrink it.
+# Streamed as-is (the same bytes object is yielded repeatedly, no per-chunk copy).
+CHUNK_SIZE = 1024 * 1024
+_PAYLOAD = os.urandom(CHUNK_SIZE)
+
+# Per-request limits
+MAX_DOWNLOAD_SIZE = 1024 * 1024 * 1024  # 1 GiB
+DEFAULT_DOWNLOAD_SIZE = 100 * 1024 * 1024
+MAX_STREAMS = 16
+
+
+def iter_download(size: int):
+    """Yield `size` bytes of payload in CHUNK_SIZE pieces."""
+    size = max(0, min(int(size), MAX_DOWNLOAD_SIZE))
+    full_chunks, remainder = divmod(size, CHUNK_SIZE)
+    for _ in range(full_chunks):
+        yield _PAYLOAD
+    if remainder:
+        yield _PAYLOAD[:remainder]
+
+
+async def measure_upload(stream) -> dict:
+    """
+    Consume an upload body (async iterator of bytes) and measure its throughput.
+    The data is counted and discarded, never buffered.
+    """
+    received = 0
+    started = time.perf_counter()
+    async for chunk in stream:
+        received += len(chunk)
+    elapsed = time.perf_counter() - started
+    return {
+        'bytes': received,
+        'elapsed': round(elapsed, 4),
+        'mbps': _to_mbps(received, elapsed),
+    }
+
+
+def _to_mbps(num_bytes: int, seconds: float) -> float:
+    if seconds <= 0:
+        return 0.0
+    return round(num_bytes * 8 / seconds / 1_000_000, 2)
+
+
+def build_result(download_bytes: int, download_elapsed: float,
+                 upload_bytes: int, upload_elapsed: float,
+                 streams: int, client: str = '') -> dict:
+    """Build a speed_tests row (test_type='lan') from raw byte counts."""
+    return {
+        'test_type': 'lan',
+        'download_speed': _to_mbps(download_bytes, download_elapsed),
+        'upload_speed': _to_mbps(upload_bytes, upload_elapsed),
+        'ping': None,
+        'jitter': None,
+        'server_name': 'NetTools (LAN)',
+        'server_id': '',
+        'server_location': client,
+        'isp': '',
+        'external_ip': '',
+        'raw_data': {
+            'streams': streams,
+            'download_bytes': download_bytes,
+            'download_elapsed': round(download_elapsed, 4),
+            'upload_bytes': upload_bytes,
+            'upload_elapsed': round(upload_elapsed, 4),
+        },
+    }
+
+
+# ==========================================
+#  Multi-stream client
+# ==========================================
+
+def run_lan_test(base_url: str = 'http://127.0.0.1:8000', streams: int = 4,
+                 size: int = 25 * 1024 * 1024, timeout: int = 60) -> dict:
+    """
+    Run a multi-stream LAN throughput test against a NetTools backend.
+    Each stream downloads and then uploads `size` bytes; throughput is the
+    aggregate byte count over the wall-clock time of the whole phase.
+
+    Useful to test the endpoints end to end on localhost, or from another
+    machine on the LAN. Returns a dict ready for database.save_speed_test.
+    """
+    streams = max(1, min(int(streams), MAX_STREAMS))
+    url = urlparse(base_url)
+    host, port = url.hostname, url.port or 80
+
+    def connect():
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def download_one(_):
+        conn = connect()
+        try:
+            conn.request('GET', f'/api/lan/download?size={size}')
+            resp = conn.getresponse()
+            if resp.status != 200:
+                raise Exception(f"LAN download failed: HTTP {resp.status}")
+            received = 0
+            while True:
+                chunk = resp.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                received += len(chunk)
+            return received
+        finally:
+            conn.close()
+
+    def upload_one(_):
+        conn = connect()
+        try:
+            conn.putrequest('POST', '/api/lan/upload')
+            conn.putheader('Content-Type', 'application/octet-stream')
+            conn.putheader('Content-Length', str(size))
+            conn.endheaders()
+            for chunk in iter_download(size):
+                conn.send(chunk)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                raise Exception(f"LAN upload failed: HTTP {resp.status}")
+            return size
+        finally:
+            conn.close()
+
+    def run_phase(worker):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=streams) as pool:
+            total = sum(pool.map(worker, range(streams)))
+        return total, time.perf_counter() - started
+
+    logger.info(f"Running LAN throughput test against {base_url} ({streams} streams)...")
+    dl_bytes, dl_elapsed = run_phase(download_one)
+    ul_bytes, ul_elapsed = run_phase(upload_one)
+
+    result = build_result(dl_bytes, dl_elapsed, ul_bytes, ul_elapsed, streams, client=base_url)
+    logger.info(f"LAN test completed: DL={result['download_speed']}Mbps UL={result['upload_speed']}Mbps")
+    return result
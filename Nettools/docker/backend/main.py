@@ -5,29 +5,49 @@ Main application entry point
 
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import os
+import threading
+import time
 
 import database as db
+import instance_lock
+import metrics
+import pools
+import presence
+from responses import FastJSONResponse
+import subprocess_runner
+from subprocess_runner import SubprocessCancelled
 from models import (
     DeviceCreate, DeviceUpdate, PingRequest, PingBatchRequest,
     PingResult, SettingsUpdate, ScanResult
 )
-from speedtest_service import run_speed_test, get_servers
-from network_service import scan_network, ping_host
-from traceroute_service import run_traceroute
+from speedtest_service import get_servers
+from lan_speed_service import iter_download, measure_upload, build_result, DEFAULT_DOWNLOAD_SIZE, MAX_DOWNLOAD_SIZE, MAX_STREAMS
+from network_service import ping_host
+from port_scanner import parse_ports
 from nslookup_service import run_nslookup, reverse_lookup
-from scheduler import start_scheduler, stop_scheduler, update_schedule, is_scan_in_progress, is_test_in_progress
+from scheduler import start_scheduler, stop_scheduler, update_schedule
+from events import app_events, format_sse, speedtest_events, sse_stream
+from jobs import coordinator, Job, JobQueueFull, UnknownJobType, SUCCEEDED, CANCELLED
 
 try:
     from telegram_service import test_connection as telegram_test_connection
 except ImportError:
     telegram_test_connection = None
 
+try:
+    from analytics_service import get_speed_test_analytics
+except ImportError:
+    get_speed_test_analytics = None
+
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,18 +55,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Thread pool for blocking operations
-executor = ThreadPoolExecutor(max_workers=4)
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Disable nginx proxy buffering for streams
+}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     logger.info("Starting NetTools Backend...")
-    db.init_db()
-    start_scheduler()
-    yield
-    stop_scheduler()
+    # Jobs, live events and metrics are per process: a second backend on
+    # the same database exits here
+    instance_lock.acquire()
+    try:
+        db.init_db()
+        subprocess_runner.attach(asyncio.get_running_loop())
+        start_scheduler()
+        presence.monitor.start()
+        yield
+        presence.monitor.stop()
+        stop_scheduler()
+        coordinator.shutdown()
+        pools.shutdown()
+        subprocess_runner.detach()
+    finally:
+        instance_lock.release()
     logger.info("NetTools Backend stopped")
 
 
@@ -55,6 +90,7 @@ app = FastAPI(
     description="API para monitoreo de red y tests de velocidad",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS
@@ -66,11 +102,261 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus request timings (outermost, so CORS and errors are included)
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+# How often blocking endpoints check whether the HTTP client went away
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+async def _await_or_cancel(request: Request, awaitable, on_disconnect):
+    """
+    Await `awaitable`; if the HTTP client disconnects first, call on_disconnect()
+    (which should make the work stop early) and then wait for it to finish.
+    """
+    future = asyncio.ensure_future(awaitable)
+    while not (await asyncio.wait({future}, timeout=DISCONNECT_POLL_INTERVAL))[0]:
+        if await request.is_disconnected():
+            logger.info(f"Client disconnected, cancelling {request.url.path}")
+            on_disconnect()
+            break
+    return await future
+
+
+async def _run_cancellable(request: Request, pool, fn, *args, **kwargs):
+    """
+    Run fn(*args, cancel_event=..., **kwargs) in a worker pool. If the HTTP
+    client disconnects first, the event is set so the service kills its
+    subprocess instead of finishing work nobody will read.
+    """
+    cancel_event = threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(pool, functools.partial(fn, *args, cancel_event=cancel_event, **kwargs))
+    return await _await_or_cancel(request, future, cancel_event.set)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if If-None-Match already names `etag` (weak or strong) or '*'."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    candidates = {tag.strip() for tag in header.split(',')}
+    return bool(candidates & {etag, f'W/{etag}', '*'})
+
+
+def _conditional(request: Request, tables: tuple, sliding: bool = False, extra: str = ''):
+    """
+    ETag for a read endpoint from the write counters of the tables it reads
+    (database.get_data_versions) and the request URL, without running its query.
+    Relative time ranges (sliding=True) also move with the clock, so their
+    ETag includes the current minute and the settings version (timezone).
+
+    Returns (etag, response): response is a ready 304 when the client is up
+    to date, otherwise None and the caller runs the query.
+    """
+    versions = db.get_data_versions()
+    if sliding:
+        tables = tables + ('settings',)
+        extra += f'|t{int(time.time() // 60)}'
+    key = '|'.join([request.url.path, request.url.query, extra]
+                   + [f'{table}:{versions.get(table, 0)}' for table in tables])
+    etag = f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+    if _etag_matches(request, etag):
+        return etag, Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    return etag, None
+
+
+def _etag_json(data, etag: str) -> FastJSONResponse:
+    return FastJSONResponse(data, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
 
 # --- Health ---
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok", "service": "NetTools"}
+    return {"status": "ok", "service": "NetTools", "pid": os.getpid()}
+
+
+@app.get("/api/pools")
+async def get_pool_stats():
+    """Worker pool usage: workers, active, queued and wait times per pool."""
+    return pools.get_stats()
+
+
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """
+    Server-Sent Events push channel for dashboards (replaces polling).
+    Sends 'hello' on connect, then deltas as they happen:
+    device_new, device_online, device_updated (device row), device_offline ({ids}),
+    device_deleted ({id}), devices_cleared, scan_complete (counts),
+    speedtest_saved (result row), speedtest_deleted ({id}), speedtest_cleared,
+    settings_updated ({keys}) and job ({id, type, source, status}).
+    Clients should reload everything after a reconnect ('hello' again).
+    """
+    hello = format_sse('hello', {'worker_pid': os.getpid()})
+    return StreamingResponse(
+        sse_stream(app_events, request, initial=hello),
+        media_type='text/event-stream',
+        headers=SSE_HEADERS,
+    )
+
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    request: Request,
+    range: str = Query('24h', description="Speed test results range"),
+    history_range: str = Query('24h', description="Device history range"),
+    test_type: str = Query('wan'),
+    limit: int = Query(500, ge=1, le=10000),
+):
+    """
+    Initial UI data in one request: settings, latest/stats/results of speed
+    tests, devices (with their sync version, see ?since=), device history and
+    running jobs. Read in one database transaction; sent with an ETag.
+    """
+    jobs = {kind: coordinator.active_job(kind) for kind in ('speedtest', 'scan')}
+    etag, not_modified = _conditional(
+        request, db.VERSIONED_TABLES, sliding=(range, history_range) != ('all', 'all'),
+        extra=','.join(job.id for job in jobs.values() if job),
+    )
+    if not_modified:
+        return not_modified
+
+    data = db.get_dashboard(range_filter=range, history_range=history_range,
+                            test_type=test_type, limit=limit)
+    data['jobs'] = {
+        kind: {"in_progress": job is not None, "job_id": job.id if job else None}
+        for kind, job in jobs.items()
+    }
+    return _etag_json(data, etag)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ==========================================
+#  JOB ENDPOINTS
+# ==========================================
+
+# 409 messages for job types that never queue (one at a time)
+JOB_BUSY_MESSAGES = {
+    'speedtest': "Ya hay un test en curso",
+    'scan': "Ya hay un escaneo en curso",
+    'portscan': "Ya hay un escaneo de puertos en curso",
+}
+
+
+class JobSubmitRequest(BaseModel):
+    type: str
+    params: dict = {}
+
+
+def _submit_job(kind: str, params: dict = None) -> Job:
+    """Submit a job, mapping coordinator errors to HTTP errors."""
+    try:
+        return coordinator.submit(kind, params)
+    except UnknownJobType as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull:
+        if kind in JOB_BUSY_MESSAGES:
+            raise HTTPException(status_code=409, detail=JOB_BUSY_MESSAGES[kind])
+        raise HTTPException(status_code=429, detail="Demasiadas tareas en cola, inténtalo más tarde")
+
+
+def _accepted(job: Job) -> JSONResponse:
+    return JSONResponse(status_code=202, content=job.to_dict(),
+                        headers={'Location': f"/api/jobs/{job.id}"})
+
+
+async def _job_result(job: Job, request: Request = None):
+    """
+    Wait for a job and return its result (or raise the matching HTTP error).
+    With a request, the job is cancelled if the client disconnects first.
+    """
+    if request is None:
+        await job.wait()
+    else:
+        await _await_or_cancel(request, job.wait(), lambda: coordinator.cancel(job.id))
+    if job.status == SUCCEEDED:
+        return job.result
+    if job.status == CANCELLED:
+        raise HTTPException(status_code=409, detail="Tarea cancelada")
+    if isinstance(job.exception, ValueError):
+        raise HTTPException(status_code=400, detail=job.error)
+    raise HTTPException(status_code=500, detail=job.error)
+
+
+def _get_job_or_404(job_id: str) -> Job:
+    job = coordinator.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
+    return job
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(data: JobSubmitRequest):
+    """
+    Start a background job and return it immediately.
+    Types: speedtest {server_id?, bufferbloat?}, scan {}, portscan {device_ids?, ports?, banners?},
+    traceroute {target, max_hops?}.
+    """
+    param_models = {
+        'speedtest': SpeedTestRunRequest,
+        'scan': None,
+        'portscan': PortScanRequest,
+        'traceroute': TracerouteRequest,
+    }
+    if data.type not in param_models:
+        raise HTTPException(status_code=400, detail=f"Tipo de tarea desconocido: {data.type}")
+
+    model = param_models[data.type]
+    try:
+        params = model(**data.params).model_dump(exclude_none=True) if model else {}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if data.type == 'portscan':
+        return _accepted(_submit_port_scan(params))
+    return _accepted(_submit_job(data.type, params))
+
+
+@app.get("/api/jobs")
+async def list_jobs():
+    """List running, queued and recently finished jobs (newest first)."""
+    return coordinator.list()
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    return _get_job_or_404(job_id).to_dict()
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job.
+    Events: 'status' (job snapshot, sent first and on state changes),
+    'progress' (job-specific), then 'done' (final job snapshot).
+    """
+    job = _get_job_or_404(job_id)
+    queue = job.events.subscribe()
+    # Snapshot after subscribing so no state change is missed
+    snapshot = format_sse('done' if job.finished else 'status', job.to_dict())
+    return StreamingResponse(
+        sse_stream(job.events, request, queue=queue, until=('done',), initial=snapshot),
+        media_type='text/event-stream',
+        headers=SSE_HEADERS,
+    )
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or ask a running one to stop."""
+    _get_job_or_404(job_id)
+    return coordinator.cancel(job_id).to_dict()
 
 
 # ==========================================
@@ -79,30 +365,53 @@ async def health_check():
 
 class SpeedTestRunRequest(BaseModel):
     server_id: Optional[str] = None
+    bufferbloat: Optional[bool] = None  # None = use the 'bufferbloat_test' setting
 
 
 @app.post("/api/speedtest/run")
-async def run_speedtest(data: SpeedTestRunRequest = SpeedTestRunRequest()):
+async def run_speedtest(data: SpeedTestRunRequest = SpeedTestRunRequest(),
+                        wait: bool = Query(True, description="false = return the job immediately (202)")):
     """Run a new speed test, optionally against a specific server."""
-    if is_test_in_progress():
-        raise HTTPException(status_code=409, detail="Ya hay un test en curso")
-
-    loop = asyncio.get_event_loop()
-    try:
-        server_id = data.server_id
-        result = await loop.run_in_executor(executor, run_speed_test, server_id)
-        saved = db.save_speed_test(result)
-        return saved
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    job = _submit_job('speedtest', data.model_dump(exclude_none=True))
+    if not wait:
+        return _accepted(job)
+    return await _job_result(job)
+
+
+@app.get("/api/speedtest/stream")
+async def stream_speedtest(request: Request, server_id: Optional[str] = None,
+                           bufferbloat: Optional[bool] = None):
+    """
+    Server-Sent Events stream of speed test progress.
+    Starts a new test unless one is already running (manual or scheduled),
+    in which case the client is attached to the running test.
+    Events: 'progress' (phase/progress/speed), then 'result' (saved row) or 'error'.
+    """
+    running = coordinator.is_active('speedtest')
+    queue = speedtest_events.subscribe(replay_last=running)
+    if not running:
+        try:
+            _submit_job('speedtest', SpeedTestRunRequest(
+                server_id=server_id, bufferbloat=bufferbloat).model_dump(exclude_none=True))
+        except HTTPException:
+            speedtest_events.unsubscribe(queue)
+            raise
+
+    return StreamingResponse(
+        sse_stream(speedtest_events, request, queue=queue, until=('result', 'error')),
+        media_type='text/event-stream',
+        headers=SSE_HEADERS,
+    )
 
 
 @app.get("/api/speedtest/servers")
-async def get_speedtest_servers():
-    """Get list of available speedtest servers sorted by distance."""
+async def get_speedtest_servers(
+    probe: bool = Query(False, description="Measure latency and sort by it instead of distance"),
+):
+    """Get list of available speedtest servers sorted by distance (or measured latency)."""
     loop = asyncio.get_event_loop()
     try:
-        servers = await loop.run_in_executor(executor, get_servers)
+        servers = await loop.run_in_executor(pools.probe, get_servers, probe)
         return servers
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -110,32 +419,62 @@ async def get_speedtest_servers():
 
 @app.get("/api/speedtest/results")
 async def get_speedtest_results(
+    request: Request,
     range: str = Query('24h', description="Time range: 1h, 6h, 24h, 7d, 30d, 90d, 365d, all"),
     limit: int = Query(500, ge=1, le=10000),
+    test_type: str = Query('wan', description="Test type: wan (Ookla) or lan (built-in LAN test)"),
+    format: str = Query('rows', pattern='^(rows|columnar)$',
+                        description="rows (list of objects) or columnar (parallel arrays of chart columns)"),
 ):
     """Get speed test history."""
-    return db.get_speed_tests(range_filter=range, limit=limit)
+    etag, not_modified = _conditional(request, ('speed_tests',), sliding=range != 'all')
+    if not_modified:
+        return not_modified
+    return _etag_json(db.get_speed_tests(range_filter=range, limit=limit, test_type=test_type,
+                                         columnar=format == 'columnar'), etag)
 
 
 @app.get("/api/speedtest/latest")
-async def get_latest_speedtest():
+async def get_latest_speedtest(request: Request, test_type: str = Query('wan')):
     """Get the most recent speed test result."""
-    result = db.get_latest_speed_test()
+    etag, not_modified = _conditional(request, ('speed_tests',))
+    if not_modified:
+        return not_modified
+    result = db.get_latest_speed_test(test_type=test_type)
     if not result:
         raise HTTPException(status_code=404, detail="No hay tests registrados")
-    return result
+    return _etag_json(result, etag)
 
 
 @app.get("/api/speedtest/stats")
-async def get_speedtest_stats():
+async def get_speedtest_stats(request: Request, test_type: str = Query('wan')):
     """Get speed test statistics."""
-    return db.get_speed_test_stats()
+    etag, not_modified = _conditional(request, ('speed_tests',))
+    if not_modified:
+        return not_modified
+    return _etag_json(db.get_speed_test_stats(test_type=test_type), etag)
+
+
+@app.get("/api/speedtest/analytics")
+async def get_speedtest_analytics(
+    range: str = Query('30d', description="Time range: 1h, 6h, 24h, 7d, 30d, 90d, 365d, all"),
+    test_type: str = Query('wan'),
+    window: int = Query(12, ge=1, le=1000, description="Rolling window (number of tests)"),
+    z: float = Query(3.0, gt=0, description="Z-score threshold for anomaly flags"),
+):
+    """Percentiles, rolling mean/median, hourly/weekday profiles and anomalies."""
+    if get_speed_test_analytics is None:
+        raise HTTPException(status_code=500, detail="Modulo de analitica no disponible (numpy). Reconstruye la imagen Docker.")
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(pools.interactive, get_speed_test_analytics, range, test_type, window, z)
 
 
 @app.get("/api/speedtest/status")
 async def get_speedtest_status():
     """Check if a speed test is currently running."""
-    return {"in_progress": is_test_in_progress()}
+    job = coordinator.active_job('speedtest')
+    return {"in_progress": job is not None, "job_id": job.id if job else None}
 
 
 @app.delete("/api/speedtest/results/{test_id}")
@@ -146,6 +485,7 @@ async def delete_speedtest(test_id: int):
     conn.execute("DELETE FROM speed_tests WHERE id = ?", (test_id,))
     conn.commit()
     conn.close()
+    app_events.publish('speedtest_deleted', {'id': test_id})
     return {"status": "deleted"}
 
 
@@ -153,34 +493,103 @@ async def delete_speedtest(test_id: int):
 async def clear_all_speedtests():
     """Delete all speed test results."""
     db.clear_speed_tests()
+    app_events.publish('speedtest_cleared', {})
     return {"status": "cleared"}
 
 
+# ==========================================
+#  LAN THROUGHPUT TEST ENDPOINTS
+# ==========================================
+
+class LanTestResult(BaseModel):
+    download_bytes: int = Field(ge=0)
+    download_elapsed: float = Field(gt=0)
+    upload_bytes: int = Field(ge=0)
+    upload_elapsed: float = Field(gt=0)
+    streams: int = Field(1, ge=1)
+
+
+@app.get("/api/lan/download")
+async def lan_download(size: int = Query(DEFAULT_DOWNLOAD_SIZE, ge=1, le=MAX_DOWNLOAD_SIZE)):
+    """Stream `size` bytes of incompressible payload for LAN download measurement."""
+    return StreamingResponse(
+        iter_download(size),
+        media_type='application/octet-stream',
+        headers={
+            'Content-Length': str(size),
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+@app.post("/api/lan/upload")
+async def lan_upload(request: Request):
+    """Receive and discard an upload body, returning the measured throughput."""
+    return await measure_upload(request.stream())
+
+
+@app.post("/api/lan/results")
+async def save_lan_result(data: LanTestResult, request: Request):
+    """Store the aggregate result of a client-side multi-stream LAN test."""
+    if data.download_elapsed <= 0 or data.upload_elapsed <= 0:
+        raise HTTPException(status_code=400, detail="Duracion de test no valida")
+    result = build_result(
+        data.download_bytes, data.download_elapsed,
+        data.upload_bytes, data.upload_elapsed,
+        streams=max(1, min(data.streams, MAX_STREAMS)),
+        client=request.client.host if request.client else '',
+    )
+    saved = db.save_speed_test(result)
+    app_events.publish('speedtest_saved', saved)
+    return saved
+
+
 # ==========================================
 #  DEVICE ENDPOINTS
 # ==========================================
 
+def _parse_device_fields(fields: Optional[str]) -> Optional[tuple]:
+    """Validate a ?fields=a,b,c projection (id is always included)."""
+    if not fields:
+        return None
+    names = ['id'] + [f.strip() for f in fields.split(',') if f.strip() and f.strip() != 'id']
+    unknown = [name for name in names if name not in db.DEVICE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos no validos: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(names))
+
+
 @app.get("/api/devices")
 async def get_devices(
+    request: Request,
     status: Optional[str] = Query(None, description="Filter by status: new, saved, manual"),
+    since: Optional[int] = Query(None, ge=0, description="Change version from a previous sync: only changes since then"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (id always included)"),
 ):
-    """Get all network devices."""
-    return db.get_devices(status_filter=status)
-
-
-@app.get("/api/devices/{device_id}")
-async def get_device(device_id: int):
-    """Get a specific device."""
-    device = db.get_device(device_id)
-    if not device:
-        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
-    return device
+    """
+    Get all network devices.
+    With `since`, returns {version, full, devices, deleted}: devices changed
+    after that version plus deleted ids (since=0, or a version older than
+    the pruned tombstones, returns everything with full=true).
+    """
+    columns = _parse_device_fields(fields)
+    if since is not None and status:
+        raise HTTPException(status_code=400, detail="El filtro status no se puede combinar con since")
+    etag, not_modified = _conditional(request, ('devices', 'device_tombstones'))
+    if not_modified:
+        return not_modified
+    if since is None:
+        return _etag_json(db.get_devices(status_filter=status, fields=columns), etag)
+    return _etag_json(db.get_device_changes(since, fields=columns), etag)
 
 
 @app.post("/api/devices")
 async def create_device(data: DeviceCreate):
     """Create a new device manually."""
-    return db.create_device(data.model_dump(exclude_none=True))
+    device = db.create_device(data.model_dump(exclude_none=True))
+    app_events.publish('device_new', device)
+    return device
 
 
 @app.put("/api/devices/{device_id}")
@@ -195,13 +604,16 @@ async def update_device(device_id: int, data: DeviceUpdate):
     if existing['status'] == 'new' and 'status' not in update_data:
         update_data['status'] = 'saved'
 
-    return db.update_device(device_id, update_data)
+    device = db.update_device(device_id, update_data)
+    app_events.publish('device_updated', device)
+    return device
 
 
 @app.delete("/api/devices/{device_id}")
 async def delete_device(device_id: int):
     """Delete a device."""
     db.delete_device(device_id)
+    app_events.publish('device_deleted', {'id': device_id})
     return {"status": "deleted"}
 
 
@@ -209,71 +621,105 @@ async def delete_device(device_id: int):
 async def clear_all_devices():
     """Delete all devices."""
     db.clear_devices()
+    app_events.publish('devices_cleared', {})
     return {"status": "cleared"}
 
 
 @app.post("/api/devices/scan")
-async def scan_devices():
+async def scan_devices(wait: bool = Query(True, description="false = return the job immediately (202)")):
     """Trigger a network scan."""
-    if is_scan_in_progress():
-        raise HTTPException(status_code=409, detail="Ya hay un escaneo en curso")
+    job = _submit_job('scan')
+    if not wait:
+        return _accepted(job)
+    return await _job_result(job)
 
-    settings = db.get_settings()
-    network_range = settings.get('network_range', '192.168.1.0/24')
 
-    loop = asyncio.get_event_loop()
+@app.get("/api/devices/scan/status")
+async def scan_status():
+    """Check if a network scan is in progress."""
+    job = coordinator.active_job('scan')
+    return {"in_progress": job is not None, "job_id": job.id if job else None}
+
 
-    def do_scan():
-        db.mark_all_offline()
-        devices = scan_network(network_range)
-        new_count = 0
-        updated_count = 0
-
-        for device_data in devices:
-            existing = None
-            if device_data.get('mac_address'):
-                conn = db.get_db()
-                existing = conn.execute(
-                    "SELECT id FROM devices WHERE mac_address = ?",
-                    (device_data['mac_address'],)
-                ).fetchone()
-                conn.close()
-
-            result = db.upsert_device_by_mac(device_data)
-            if existing:
-                updated_count += 1
-            else:
-                new_count += 1
-
-        # Save historical snapshot
-        db.save_device_snapshot()
-
-        return {
-            'found': len(devices),
-            'new_devices': new_count,
-            'updated_devices': updated_count,
-        }
+class PortScanRequest(BaseModel):
+    device_ids: Optional[List[int]] = None  # None = every online device
+    ports: Optional[str] = None             # set name (quick, common, well-known, all) or '22,80,8000-8100'
+    banners: Optional[bool] = None
 
+
+def _submit_port_scan(params: dict) -> Job:
     try:
-        result = await loop.run_in_executor(executor, do_scan)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        parse_ports(params.get('ports'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _submit_job('portscan', params)
 
 
-@app.get("/api/devices/scan/status")
-async def scan_status():
-    """Check if a network scan is in progress."""
-    return {"in_progress": is_scan_in_progress()}
+@app.post("/api/devices/ports/scan")
+async def scan_devices_ports(data: PortScanRequest = PortScanRequest(),
+                             wait: bool = Query(True, description="false = return the job immediately (202)")):
+    """TCP port scan of several devices (device_ids, default every online device)."""
+    job = _submit_port_scan(data.model_dump(exclude_none=True))
+    if not wait:
+        return _accepted(job)
+    return await _job_result(job)
 
 
 @app.get("/api/devices/history")
 async def get_device_history(
+    request: Request,
     range: str = Query('24h', description="Time range: 1h, 6h, 24h, 7d, 30d, 90d, 365d, all"),
     limit: int = Query(500, ge=1, le=10000),
+    format: str = Query('rows', pattern='^(rows|columnar)$', description="rows or columnar (parallel arrays)"),
 ):
     """Get device count history (snapshots over time)."""
-    return db.get_device_snapshots(range_filter=range, limit=limit)
+    etag, not_modified = _conditional(request, ('device_snapshots',), sliding=range != 'all')
+    if not_modified:
+        return not_modified
+    return _etag_json(db.get_device_snapshots(range_filter=range, limit=limit,
+                                              columnar=format == 'columnar'), etag)
+
+
+# Declared after the static /api/devices/... paths so they are not captured as ids
+@app.get("/api/devices/{device_id}")
+async def get_device(device_id: int):
+    """Get a specific device."""
+    device = db.get_device(device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    return device
+
+
+@app.get("/api/devices/{device_id}/ports")
+async def get_device_ports(device_id: int, request: Request):
+    """Open ports found by the last port scan of a device (scanned_at null = never scanned)."""
+    etag, not_modified = _conditional(request, ('devices', 'device_ports'))
+    if not_modified:
+        return not_modified
+    device = db.get_device(device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    return _etag_json({
+        'device_id': device_id,
+        'ip_address': device['ip_address'],
+        'scanned_at': device['ports_scanned_at'],
+        'ports': db.get_device_ports(device_id),
+    }, etag)
+
+
+@app.post("/api/devices/{device_id}/ports/scan")
+async def scan_device_ports(device_id: int, data: PortScanRequest = PortScanRequest(),
+                            wait: bool = Query(True, description="false = return the job immediately (202)")):
+    """TCP port scan of one device."""
+    device = db.get_device(device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    if not device['ip_address']:
+        raise HTTPException(status_code=400, detail="El dispositivo no tiene IP")
+    job = _submit_port_scan({**data.model_dump(exclude_none=True), 'device_ids': [device_id]})
+    if not wait:
+        return _accepted(job)
+    return await _job_result(job)
 
 
 # ==========================================
@@ -281,10 +727,12 @@ async def get_device_history(
 # ==========================================
 
 @app.post("/api/ping")
-async def ping_single(data: PingRequest):
+async def ping_single(data: PingRequest, request: Request):
     """Ping a single IP address."""
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(executor, ping_host, data.ip)
+    try:
+        result = await _run_cancellable(request, pools.interactive, ping_host, data.ip)
+    except SubprocessCancelled:
+        raise HTTPException(status_code=499, detail="Cancelado por el cliente")
 
     # Try to find device name
     conn = db.get_db()
@@ -308,16 +756,19 @@ async def ping_single(data: PingRequest):
 
 
 @app.post("/api/ping/batch")
-async def ping_batch(data: PingBatchRequest):
-    """Ping multiple IP addresses."""
+async def ping_batch(data: PingBatchRequest, request: Request):
+    """Ping multiple IP addresses (pending pings are dropped if the client disconnects)."""
     loop = asyncio.get_event_loop()
+    cancel_event = threading.Event()
 
-    async def ping_one(ip):
-        return await loop.run_in_executor(executor, ping_host, ip)
-
-    tasks = [ping_one(ip) for ip in data.ips]
-    results = await asyncio.gather(*tasks)
-    return results
+    tasks = [
+        loop.run_in_executor(pools.probe, functools.partial(ping_host, ip, cancel_event=cancel_event))
+        for ip in data.ips
+    ]
+    try:
+        return await _await_or_cancel(request, asyncio.gather(*tasks), cancel_event.set)
+    except SubprocessCancelled:
+        raise HTTPException(status_code=499, detail="Cancelado por el cliente")
 
 
 # ==========================================
@@ -330,19 +781,13 @@ class TracerouteRequest(BaseModel):
 
 
 @app.post("/api/traceroute")
-async def traceroute(data: TracerouteRequest):
-    """Run a traceroute to the specified target."""
-    loop = asyncio.get_event_loop()
-    try:
-        result = await loop.run_in_executor(
-            executor,
-            lambda: run_traceroute(data.target, max_hops=data.max_hops or 30)
-        )
-        return result
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def traceroute(data: TracerouteRequest, request: Request,
+                     wait: bool = Query(True, description="false = return the job immediately (202)")):
+    """Run a traceroute to the specified target (cancelled if the client disconnects)."""
+    job = _submit_job('traceroute', data.model_dump(exclude_none=True))
+    if not wait:
+        return _accepted(job)
+    return await _job_result(job, request)
 
 
 # ==========================================
@@ -360,19 +805,20 @@ class ReverseLookupRequest(BaseModel):
 
 
 @app.post("/api/nslookup")
-async def nslookup(data: NSLookupRequest):
+async def nslookup(data: NSLookupRequest, request: Request):
     """Run a DNS lookup for the specified domain."""
-    loop = asyncio.get_event_loop()
     try:
-        result = await loop.run_in_executor(
-            executor,
-            lambda: run_nslookup(
-                data.domain,
-                dns_server=data.dns_server,
-                record_type=data.record_type or "A"
-            )
+        result = await _run_cancellable(
+            request,
+            pools.interactive,
+            run_nslookup,
+            data.domain,
+            dns_server=data.dns_server,
+            record_type=data.record_type or "A",
         )
         return result
+    except SubprocessCancelled:
+        raise HTTPException(status_code=499, detail="Cancelado por el cliente")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -385,7 +831,7 @@ async def nslookup_reverse(data: ReverseLookupRequest):
     loop = asyncio.get_event_loop()
     try:
         result = await loop.run_in_executor(
-            executor,
+            pools.interactive,
             lambda: reverse_lookup(data.ip)
         )
         return result
@@ -400,9 +846,12 @@ async def nslookup_reverse(data: ReverseLookupRequest):
 # ==========================================
 
 @app.get("/api/settings")
-async def get_settings():
+async def get_settings(request: Request):
     """Get all settings."""
-    return db.get_settings()
+    etag, not_modified = _conditional(request, ('settings',))
+    if not_modified:
+        return not_modified
+    return _etag_json(db.get_settings(), etag)
 
 
 @app.put("/api/settings")
@@ -413,6 +862,7 @@ async def update_settings(data: SettingsUpdate):
 
     # Update scheduler with new settings
     update_schedule()
+    app_events.publish('settings_updated', {'keys': sorted(settings_data)})
 
     return db.get_settings()
 
@@ -431,7 +881,7 @@ async def test_telegram():
         raise HTTPException(status_code=400, detail="Bot Token y Chat ID son obligatorios. Guarda la configuracion primero.")
 
     loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(executor, telegram_test_connection, bot_token, chat_id)
+    result = await loop.run_in_executor(pools.interactive, telegram_test_connection, bot_token, chat_id)
 
     if result['success']:
         return result
@@ -446,7 +896,7 @@ async def test_telegram():
 @app.get("/api/export")
 async def export_data():
     """Export all data as JSON."""
-    return db.get_all_data()
+    return FastJSONResponse(db.get_all_data())
 
 
 # ==========================================
@@ -0,0 +1,296 @@
+"""
+NetTools - Prometheus Metrics
+Minimal in-process collectors rendered in the Prometheus text format
+(version 0.0.4) at GET /metrics. No external dependency.
+
+Hot path cost: label children are created once and cached, so an observation
+is a dict lookup, a bisect over a tuple and a few integer/float additions
+under a per-child lock (no global lock). Hot callers keep child references
+(e.g. database.py) and skip even the lookup.
+Values are per process: with several uvicorn workers, scrape each worker or
+accept that /metrics reflects whichever worker served the scrape.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds: 1 ms .. 2 min (covers API calls, pings and full speed tests)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()  # unlabelled metrics are exported from the start
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values):
+        """Return the child for these label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class GaugeFunc(_Metric):
+    """Gauge whose samples are computed at scrape time: func() -> {label values tuple: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, func):
+        super().__init__(name, documentation, labelnames)
+        self._func = func
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, value in sorted(self._func().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}')
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        with child.lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ==========================================
+#  NetTools metrics
+# ==========================================
+
+http_request_duration = Histogram(
+    'nettools_http_request_duration_seconds', 'HTTP request duration by route',
+    ('method', 'route'),
+)
+http_requests = Counter(
+    'nettools_http_requests_total', 'HTTP requests by route and status code',
+    ('method', 'route', 'status'),
+)
+
+subprocess_duration = Histogram(
+    'nettools_subprocess_duration_seconds', 'Duration of CLI tool runs',
+    ('tool',),
+)
+subprocess_failures = Counter(
+    'nettools_subprocess_failures_total', 'CLI tool runs that failed (exit code, timeout, cancel, missing)',
+    ('tool', 'reason'),
+)
+
+db_query_duration = Histogram(
+    'nettools_db_query_duration_seconds', 'SQLite statement execution time by statement type',
+    ('operation',),
+)
+db_commit_duration = Histogram(
+    'nettools_db_commit_duration_seconds', 'SQLite commit time',
+)
+
+pool_wait_duration = Histogram(
+    'nettools_pool_wait_seconds', 'Time tasks spent queued before a worker thread picked them up',
+    ('pool',),
+)
+
+job_duration = Histogram(
+    'nettools_job_duration_seconds', 'Background job run time (manual and scheduled)',
+    ('type', 'source', 'status'),
+)
+
+scan_devices = Gauge(
+    'nettools_scan_devices_found', 'Devices found by the last network scan',
+)
+
+
+# ==========================================
+#  ASGI middleware
+# ==========================================
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request (streaming responses
+    included, until their last chunk; Server-Sent Events streams stay open
+    for minutes, so they are counted but not timed). Requests are labelled
+    with the route template (e.g. /api/devices/{device_id}) to keep
+    cardinality bounded; paths that match no route are grouped as
+    'unmatched'.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_label(self, scope) -> str:
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope['app'].routes
+                if hasattr(route, 'endpoint') and hasattr(route, 'path')
+            }
+        return self._routes.get(scope.get('endpoint'), 'unmatched')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                streaming = any(name == b'content-type' and value.startswith(b'text/event-stream')
+                                for name, value in message.get('headers', ()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route_label(scope)
+            method = scope['method']
+            if not streaming:
+                http_request_duration.labels(method, route).observe(time.perf_counter() - started)
+            http_requests.labels(method, route, status).inc()
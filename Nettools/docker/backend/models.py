@@ -20,6 +20,15 @@ class SpeedTestResult(BaseModel):
     server_location: Optional[str] = None
     isp: Optional[str] = None
     external_ip: Optional[str] = None
+    test_type: Optional[str] = 'wan'
+    idle_latency: Optional[float] = None
+    download_latency_p50: Optional[float] = None
+    download_latency_p90: Optional[float] = None
+    download_latency_p99: Optional[float] = None
+    upload_latency_p50: Optional[float] = None
+    upload_latency_p90: Optional[float] = None
+    upload_latency_p99: Optional[float] = None
+    bufferbloat_grade: Optional[str] = None
 
 
 class SpeedTestStats(BaseModel):
@@ -99,12 +108,16 @@ class SettingsUpdate(BaseModel):
     speed_test_retention: Optional[str] = None
     auto_network_scan: Optional[bool] = None
     network_scan_frequency: Optional[str] = None
+    presence_check_frequency: Optional[str] = None
+    offline_after_misses: Optional[str] = None
     network_range: Optional[str] = None
     notify_new_devices: Optional[bool] = None
     telegram_enabled: Optional[bool] = None
     telegram_bot_token: Optional[str] = None
     telegram_chat_id: Optional[str] = None
     timezone: Optional[str] = None
+    bufferbloat_test: Optional[bool] = None
+    bufferbloat_target: Optional[str] = None
 
 
 # --- Scan ---
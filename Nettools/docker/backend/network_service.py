@@ -2,66 +2,527 @@
 NetTools - Network Scanning Service
 """
 
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
 import subprocess
 import re
 import logging
+import math
 import platform
-from typing import Optional
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+import arp_sweep
+import pools
+import presence
+from device_classifier import infer_device_type
+from nmap_xml import NmapXmlParser
+from oui_db import lookup_vendor
+from subprocess_runner import call_sync, run, run_sync, SubprocessCancelled
 
 logger = logging.getLogger(__name__)
 
+ROUTE_TABLE = '/proc/net/route'
+# Interfaces skipped by auto-detection: loopback, container/VM plumbing and VPNs
+IGNORED_INTERFACE_PREFIXES = ('lo', 'docker', 'veth', 'br-', 'virbr', 'cni', 'flannel',
+                              'cali', 'tun', 'tap', 'wg', 'tailscale', 'zt')
+# Auto-detected subnets larger than this are skipped (configure them explicitly)
+MIN_AUTO_PREFIX = 16
+_RTF_UP = 0x1
 
-def scan_network(network_range: str = '192.168.1.0/24') -> list:
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name, '')
+    try:
+        return max(1, int(value)) if value else default
+    except ValueError:
+        logger.warning(f"Invalid {name}={value!r}, using {default}")
+        return default
+
+
+# Large ranges are split into shards of this prefix, scanned SCAN_CONCURRENCY
+# at a time; SCAN_RATE (packets/s) is shared by all running shards
+SHARD_PREFIX = min(30, _env_int('NETTOOLS_SCAN_SHARD_PREFIX', 24))
+SCAN_CONCURRENCY = _env_int('NETTOOLS_SCAN_CONCURRENCY', 4)
+SCAN_RATE = _env_int('NETTOOLS_SCAN_RATE', 1000)
+# Ranges above this many addresses (a /16) are not scanned
+MAX_SCAN_HOSTS = _env_int('NETTOOLS_SCAN_MAX_HOSTS', 65536)
+# Seconds budget to re-verify devices a scan missed (targeted ARP + ICMP)
+VERIFY_TIMEOUT = _env_int('NETTOOLS_VERIFY_TIMEOUT', 2)
+# Re-verification pings running at once: well below NETTOOLS_MAX_SUBPROCESSES,
+# so interactive pings and traceroutes still get process slots
+VERIFY_CONCURRENCY = 8
+# Packets sent per address by arp-scan (--retry=2) and the native sweep
+_ARP_TRIES = 2
+# 'native' (in-process ARP sweep, falls back to arp-scan) or 'arp-scan'
+SCAN_ENGINE = os.environ.get('NETTOOLS_SCAN_ENGINE', 'native').lower()
+
+
+def scan_network(network_range: str = 'auto', cancel_event=None,
+                 on_progress: Optional[Callable[[dict], None]] = None) -> list:
     """
-    Scan the local network for devices using arp-scan or nmap.
+    Scan the local network(s) for devices using arp-scan or nmap.
+
+    network_range is a comma/space separated list of CIDRs and/or interface
+    names; 'auto' (or empty) means every directly connected subnet found in
+    the routing table. Ranges larger than SHARD_PREFIX are split into shards;
+    shards of all targets are scanned in parallel on the scan pool
+    (SCAN_CONCURRENCY at a time, sharing the SCAN_RATE packet budget) and the
+    results merged by MAC address.
+
+    on_progress (called from this thread) receives one event per finished
+    shard with its devices, so callers can use partial results:
+    {'phase': 'scanning', 'shard', 'found', 'devices', 'shards_done',
+     'shards_total', 'hosts_probed', 'hosts_total', 'devices_found'}.
+    Tools that report hosts as they go (nmap) also send one event per host
+    ({'phase': 'host', ...} with that single device) before their shard's.
+    Setting cancel_event (threading.Event) stops scheduling shards, kills the
+    running tools and raises SubprocessCancelled.
     Returns list of discovered devices.
     """
-    devices = []
+    targets = resolve_scan_targets(network_range)
+    if not targets:
+        logger.warning(f"No scan targets for '{network_range}', scanning the local network")
+        targets = [(None, None)]
+
+    shards = []
+    for cidr, iface in targets:
+        shards.extend(_shard(cidr, iface))
+    if not shards:
+        return []
+    hosts_total = sum(_host_count(cidr) for cidr, _ in shards)
+    concurrency = min(SCAN_CONCURRENCY, len(shards))
+    rate = max(1, SCAN_RATE // concurrency)
+    if len(shards) > 1:
+        logger.info(f"Scanning {len(shards)} shards ({hosts_total} addresses) of "
+                    f"{', '.join(cidr for cidr, _ in targets)}, {concurrency} at a time, {rate} pkt/s each")
+
+    merged = {}
+    progress = {'shards_done': 0, 'hosts_probed': 0}
+
+    def report(phase: str, cidr: Optional[str], devices: list):
+        if on_progress:
+            on_progress({
+                'phase': phase,
+                'shard': cidr or 'localnet',
+                'found': len(devices),
+                'devices': devices,
+                'shards_done': progress['shards_done'],
+                'shards_total': len(shards),
+                'hosts_probed': progress['hosts_probed'],
+                'hosts_total': hosts_total,
+                'devices_found': len(merged),
+            })
 
-    # Try arp-scan first (faster, more reliable for local network)
+    def host_found(cidr: Optional[str], device: dict):
+        _merge_into(merged, [device])
+        report('host', cidr, [device])
+
+    def shard_done(cidr: Optional[str], devices: list):
+        _merge_into(merged, devices)
+        progress['shards_done'] += 1
+        progress['hosts_probed'] += _host_count(cidr)
+        report('scanning', cidr, devices)
+
+    if len(shards) == 1:
+        cidr, iface = shards[0]
+        shard_done(cidr, _scan_target(cidr, iface, cancel_event, rate,
+                                      on_device=lambda device: host_found(cidr, device)))
+        return list(merged.values())
+
+    # Shards run in pool threads: their hosts are handed to this thread
+    found = queue.SimpleQueue()
+
+    def drain():
+        while not found.empty():
+            host_found(*found.get())
+
+    pending = iter(shards)
+    running = {}
     try:
-        devices = _scan_with_arp(network_range)
-        if devices:
-            logger.info(f"arp-scan found {len(devices)} devices")
-            return devices
-    except Exception as e:
-        logger.warning(f"arp-scan failed: {e}")
+        while True:
+            while len(running) < concurrency and not (cancel_event and cancel_event.is_set()):
+                shard = next(pending, None)
+                if shard is None:
+                    break
+                on_device = lambda device, cidr=shard[0]: found.put((cidr, device))  # noqa: E731
+                running[pools.scan.submit(_scan_target, *shard, cancel_event, rate, on_device)] = shard[0]
+            if not running:
+                break
+            finished, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            # Hosts first: a shard's own hosts are queued before it finishes
+            drain()
+            for future in finished:
+                shard_done(running.pop(future), future.result())
+    finally:
+        # Aborting: running shards see cancel_event (their tools are killed)
+        for future in running:
+            future.cancel()
+
+    if cancel_event and cancel_event.is_set():
+        raise SubprocessCancelled('Network scan cancelled')
+    return list(merged.values())
+
+
+def _shard(cidr: Optional[str], interface: Optional[str]) -> list:
+    """Split a target into SHARD_PREFIX-sized (cidr, interface) shards."""
+    if cidr is None:
+        return [(None, interface)]
+    network = ipaddress.IPv4Network(cidr)
+    if network.num_addresses > MAX_SCAN_HOSTS:
+        logger.warning(f"Skipping {cidr}: larger than {MAX_SCAN_HOSTS} addresses (NETTOOLS_SCAN_MAX_HOSTS)")
+        return []
+    if network.prefixlen >= SHARD_PREFIX:
+        return [(cidr, interface)]
+    return [(str(subnet), interface) for subnet in network.subnets(new_prefix=SHARD_PREFIX)]
+
+
+def _host_count(target) -> int:
+    """Addresses in a CIDR or a list of addresses."""
+    if isinstance(target, (list, tuple)):
+        return len(target)
+    return ipaddress.IPv4Network(target).num_addresses if target else 0
+
+
+def check_hosts(addresses, cancel_event=None) -> tuple:
+    """
+    Targeted ARP re-check of known addresses (no discovery sweep). Addresses
+    are grouped by the connected subnet they belong to and each interface is
+    checked in parallel; addresses outside every connected subnet cannot be
+    checked by ARP. Returns (devices that answered, set of addresses that
+    were actually checked), so callers do not count unchecked ones as missed.
+    """
+    connected = get_connected_networks()
+    groups = {}
+    for address in addresses:
+        try:
+            ip = ipaddress.IPv4Address(address)
+        except ValueError:
+            continue
+        iface = next((i for i, n in connected if ip in n), None)
+        if iface:
+            groups.setdefault(iface, []).append(address)
+    if not groups:
+        return [], set()
+
+    rate = max(1, SCAN_RATE // len(groups))
+    if len(groups) == 1:
+        results = [_check_on_interface(*next(iter(groups.items())), cancel_event, rate)]
+    else:
+        # Threads of our own: callers may be probe pool workers, and blocking
+        # a worker on tasks queued to its own pool can deadlock it
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            results = list(executor.map(lambda item: _check_on_interface(*item, cancel_event, rate),
+                                        groups.items()))
+
+    devices, checked = [], set()
+    for (iface, group), found in zip(groups.items(), results):
+        if found is not None:
+            devices.extend(found)
+            checked.update(group)
+    return devices, checked
+
+
+def verify_hosts(hosts: list, cancel_event=None, timeout: int = VERIFY_TIMEOUT) -> set:
+    """
+    Re-verify devices a scan did not see, before they are counted as missed:
+    a targeted ARP check and an ICMP ping (probing for up to timeout seconds)
+    run at the same time for every host. hosts are {'ip_address',
+    'mac_address'} dicts; returns the IPs confirmed present. A ping reply
+    only counts if the kernel ARP table does not show another MAC on that IP.
+    """
+    if not hosts:
+        return set()
+    ips = [host['ip_address'] for host in hosts]
+    answered, pinged = call_sync(_verify_all(ips, timeout, cancel_event))
+
+    arp_macs = {d['ip_address']: d['mac_address'] for d in answered}
+    if pinged and os.path.exists(presence.ARP_TABLE):
+        arp_macs = {**{e['ip_address']: e['mac_address'] for e in presence.read_arp_table()}, **arp_macs}
+    confirmed = set()
+    for host in hosts:
+        ip = host['ip_address']
+        mac = arp_macs.get(ip)
+        if mac == host['mac_address'] or (ip in pinged and mac is None):
+            confirmed.add(ip)
+    return confirmed
+
+
+async def _verify_all(ips: list, timeout: int, cancel_event=None) -> tuple:
+    """(devices answering the ARP check, IPs answering a ping), both within timeout seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # The ARP check blocks, so it gets a thread of its own rather than a pool
+    # worker (the caller may already be one). arp_cancel stops it once its
+    # result is no longer wanted.
+    arp_cancel = threading.Event()
+    arp_check = asyncio.ensure_future(asyncio.to_thread(check_hosts, ips, arp_cancel))
+    try:
+        pinged = await _ping_all(ips, timeout, cancel_event)
+        try:
+            answered, _ = await asyncio.wait_for(arp_check, max(0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            logger.warning(f"ARP re-verification of {len(ips)} hosts exceeded {timeout}s, using pings only")
+            answered = []
+        except SubprocessCancelled:
+            answered = []
+    finally:
+        arp_cancel.set()
+        arp_check.cancel()
+    if cancel_event and cancel_event.is_set():
+        raise SubprocessCancelled('verify')
+    return answered, pinged
+
+
+async def _ping_all(ips: list, timeout: int, cancel_event=None) -> set:
+    """
+    IPs answering an ICMP echo within timeout seconds overall (one ping
+    process each, VERIFY_CONCURRENCY at a time; pings still waiting for a
+    slot only get the time left, and the stage stops at the deadline).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    slots = asyncio.Semaphore(VERIFY_CONCURRENCY)
+    answered = set()
+
+    async def ping(ip):
+        async with slots:
+            left = math.ceil(deadline - loop.time())
+            if left < 1:
+                return
+            # -w: keep probing (every 0.5 s) until the first reply or the deadline
+            result = await run(['ping', '-c', '1', '-i', '0.5', '-w', str(left), ip],
+                               timeout=left + 1, cancel_event=cancel_event)
+            if result.returncode == 0:
+                answered.add(ip)
 
-    # Fallback to nmap
     try:
-        devices = _scan_with_nmap(network_range)
-        logger.info(f"nmap found {len(devices)} devices")
-        return devices
+        # Margin for process start-up; past it the remaining pings are killed
+        await asyncio.wait_for(asyncio.gather(*(ping(ip) for ip in ips), return_exceptions=True),
+                               timeout + 1)
+    except asyncio.TimeoutError:
+        logger.warning(f"Re-verification pings of {len(ips)} hosts exceeded {timeout}s")
+    if cancel_event and cancel_event.is_set():
+        raise SubprocessCancelled('ping')
+    return answered
+
+
+def _check_on_interface(interface: str, addresses: list, cancel_event=None, rate: Optional[int] = None):
+    """Devices answering among addresses on interface; None if no method worked."""
+    if SCAN_ENGINE == 'native':
+        try:
+            return _scan_native(addresses, interface, cancel_event, rate)
+        except SubprocessCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"ARP check failed on {interface}, using arp-scan: {e}")
+    try:
+        return _scan_with_arp(addresses, interface, cancel_event, rate)
+    except SubprocessCancelled:
+        raise
     except Exception as e:
-        logger.warning(f"nmap failed: {e}")
+        logger.warning(f"arp-scan check failed on {interface}: {e}")
+        return None
+
+
+def _scan_target(network_range: Optional[str], interface: Optional[str], cancel_event=None,
+                 rate: Optional[int] = None, on_device: Optional[Callable[[dict], None]] = None) -> list:
+    """
+    Scan one subnet (None = arp-scan --localnet): native ARP sweep (needs the
+    interface) or arp-scan, then nmap, then the ARP table. on_device gets
+    each host nmap reports, as soon as it completes.
+    """
+    devices = []
+    label = network_range or 'localnet'
+    native_done = False
+
+    if SCAN_ENGINE == 'native' and network_range and interface:
+        try:
+            devices = _scan_native(network_range, interface, cancel_event, rate)
+            native_done = True
+            if devices:
+                logger.info(f"ARP sweep found {len(devices)} devices on {label}")
+                return devices
+        except SubprocessCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"ARP sweep failed on {label} ({interface}), using arp-scan: {e}")
+
+    # Try arp-scan first (faster, more reliable for local network)
+    if not native_done:
+        try:
+            devices = _scan_with_arp(network_range, interface, cancel_event, rate)
+            if devices:
+                logger.info(f"arp-scan found {len(devices)} devices on {label}")
+                return devices
+        except SubprocessCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"arp-scan failed on {label}: {e}")
+
+    # Fallback to nmap
+    if network_range:
+        try:
+            devices = _scan_with_nmap(network_range, cancel_event, rate, on_device)
+            logger.info(f"nmap found {len(devices)} devices on {label}")
+            return devices
+        except SubprocessCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"nmap failed on {label}: {e}")
 
     # Fallback to arp table
     try:
-        devices = _scan_arp_table()
-        logger.info(f"ARP table has {len(devices)} entries")
+        devices = _scan_arp_table(network_range, cancel_event)
+        logger.info(f"ARP table has {len(devices)} entries for {label}")
         return devices
+    except SubprocessCancelled:
+        raise
     except Exception as e:
         logger.warning(f"ARP table scan failed: {e}")
 
     return devices
 
 
-def _scan_with_arp(network_range: str) -> list:
-    """Scan using arp-scan."""
-    result = subprocess.run(
-        ['arp-scan', '--localnet', '--retry=2', '--timeout=1000', f'--interface=eth0'],
-        capture_output=True,
-        text=True,
-        timeout=60
-    )
+def get_connected_networks() -> list:
+    """
+    Directly connected IPv4 subnets as (interface, IPv4Network) pairs, read
+    from the kernel routing table (routes without gateway). Empty if the
+    table is not available (non-Linux).
+    """
+    try:
+        with open(ROUTE_TABLE) as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return []
+
+    networks = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        iface, destination, gateway, flags, mask = fields[0], fields[1], fields[2], int(fields[3], 16), fields[7]
+        if not flags & _RTF_UP or gateway != '00000000' or destination == '00000000':
+            continue
+        try:
+            network = ipaddress.IPv4Network((
+                socket.inet_ntoa(struct.pack('<I', int(destination, 16))),
+                socket.inet_ntoa(struct.pack('<I', int(mask, 16))),
+            ))
+        except ValueError:
+            continue
+        if network.prefixlen < 32 and (iface, network) not in networks:
+            networks.append((iface, network))
+    return networks
+
+
+def resolve_scan_targets(spec: str) -> list:
+    """
+    Turn the network_range setting into [(cidr, interface or None), ...].
+    Tokens: CIDR or IP ('10.0.20.0/24'), interface name ('eth0.20') or 'auto'.
+    """
+    connected = get_connected_networks()
+    tokens = [t for t in re.split(r'[,\s]+', (spec or '').strip()) if t] or ['auto']
+    targets = []
+
+    for token in tokens:
+        if token.lower() == 'auto':
+            for iface, network in connected:
+                if iface.startswith(IGNORED_INTERFACE_PREFIXES):
+                    continue
+                if network.prefixlen < MIN_AUTO_PREFIX:
+                    logger.warning(f"Skipping {network} on {iface}: too large for auto-detection")
+                    continue
+                targets.append((str(network), iface))
+        elif re.match(r'^[\d.]+(/\d+)?$', token):
+            try:
+                network = ipaddress.IPv4Network(token, strict=False)
+            except ValueError:
+                logger.warning(f"Invalid network range '{token}', skipping")
+                continue
+            iface = next((i for i, n in connected if network.subnet_of(n)), None)
+            targets.append((str(network), iface))
+        else:
+            matches = [(str(n), i) for i, n in connected if i == token]
+            if not matches:
+                logger.warning(f"Interface '{token}' has no connected IPv4 subnet, skipping")
+            targets.extend(matches)
+
+    # Drop duplicates and subnets already covered by a larger target
+    # (e.g. 'auto' plus one of its CIDRs)
+    unique = []
+    for cidr, iface in targets:
+        network = ipaddress.IPv4Network(cidr)
+        if any(network.subnet_of(ipaddress.IPv4Network(other)) for other, _ in unique):
+            continue
+        unique = [(o, i) for o, i in unique if not ipaddress.IPv4Network(o).subnet_of(network)]
+        unique.append((cidr, iface))
+    return unique
+
+
+def _merge_into(merged: dict, devices: list):
+    """Merge a device list into merged (keyed by MAC, IP for devices without MAC)."""
+    for device in devices:
+        key = device.get('mac_address') or device.get('ip_address')
+        current = merged.get(key)
+        if current is None:
+            merged[key] = device
+            continue
+        for field, value in device.items():
+            if value and (not current.get(field) or current.get(field) == 'other'):
+                current[field] = value
+
+
+def _scan_native(network_range, interface: str, cancel_event=None,
+                 rate: Optional[int] = None) -> list:
+    """In-process ARP sweep (CIDR or list of addresses) on an AF_PACKET socket (see arp_sweep)."""
+    devices = []
+    with arp_sweep.RawSocketBackend(interface) as backend:
+        for found in arp_sweep.arp_sweep(network_range, backend, rate=rate or SCAN_RATE,
+                                         retries=_ARP_TRIES - 1, cancel_event=cancel_event):
+            mac = found['mac_address']
+            brand = lookup_vendor(mac)
+            devices.append({
+                **found,
+                'hostname': '',
+                'brand': brand,
+                'device_type': infer_device_type(brand=brand, mac=mac),
+            })
+    if cancel_event and cancel_event.is_set():
+        raise SubprocessCancelled('arp sweep')
+    return devices
+
+
+def _scan_with_arp(network_range, interface: Optional[str] = None, cancel_event=None,
+                   rate: Optional[int] = None) -> list:
+    """Scan a CIDR or list of addresses using arp-scan (at most rate packets/s if given)."""
+    cmd = ['arp-scan', f'--retry={_ARP_TRIES}', '--timeout=1000']
+    timeout = 60
+    if rate:
+        cmd.append(f'--interval={max(1, 1_000_000 // rate)}u')
+        timeout = max(timeout, _host_count(network_range) * _ARP_TRIES // rate + 30)
+    if interface:
+        cmd.append(f'--interface={interface}')
+    if isinstance(network_range, (list, tuple)):
+        cmd.extend(network_range)
+    else:
+        cmd.append(network_range or '--localnet')
+    result = run_sync(cmd, timeout=timeout, cancel_event=cancel_event)
 
     devices = []
     for line in result.stdout.split('\n'):
         # Match lines with IP, MAC, and vendor
         match = re.match(r'^(\d+\.\d+\.\d+\.\d+)\s+((?:[0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})\s+(.*)$', line.strip())
         if match:
-            brand = match.group(3).strip() if match.group(3).strip() != '(Unknown)' else ''
             mac = match.group(2).upper()
+            vendor = match.group(3).strip()
+            # '(Unknown)' / '(Unknown: locally administered)': not in arp-scan's list
+            brand = vendor if vendor and not vendor.startswith('(Unknown') else lookup_vendor(mac)
             devices.append({
                 'ip_address': match.group(1),
                 'mac_address': mac,
@@ -73,185 +534,100 @@ def _scan_with_arp(network_range: str) -> list:
     return devices
 
 
-def _scan_with_nmap(network_range: str) -> list:
-    """Scan using nmap."""
-    result = subprocess.run(
-        ['nmap', '-sn', '-PR', network_range, '--max-retries', '1', '--host-timeout', '5s'],
-        capture_output=True,
-        text=True,
-        timeout=120
-    )
-
+def _scan_with_nmap(network_range: str, cancel_event=None, rate: Optional[int] = None,
+                    on_device: Optional[Callable[[dict], None]] = None) -> list:
+    """
+    Scan using nmap (at most rate packets/s if given). The XML output is
+    parsed as nmap writes it; each host is passed to on_device as soon as it
+    completes, and all of them are returned when nmap exits.
+    """
+    cmd = ['nmap', '-sn', '-PR', network_range, '--max-retries', '1', '--host-timeout', '5s',
+           '-oX', '-']
+    timeout = 120
+    if rate:
+        cmd += ['--max-rate', str(rate)]
+        timeout = max(timeout, _host_count(network_range) * 2 // rate + 60)
+
+    parser = NmapXmlParser()
     devices = []
-    current = {}
 
-    for line in result.stdout.split('\n'):
-        # Match host line
-        host_match = re.search(r'Nmap scan report for (?:(\S+) \()?(\d+\.\d+\.\d+\.\d+)\)?', line)
-        if host_match:
-            if current.get('ip_address'):
-                devices.append(current)
-            hostname = host_match.group(1) or ''
-            current = {
-                'ip_address': host_match.group(2),
-                'mac_address': '',
-                'hostname': hostname,
-                'brand': '',
-                'device_type': 'other',
+    def collect(hosts: list):
+        for host in hosts:
+            if host['state'] != 'up' or not host['ip_address']:
+                continue
+            mac = host['mac_address']
+            vendor = host['vendor']
+            brand = vendor if vendor and vendor != 'Unknown' else (lookup_vendor(mac) if mac else '')
+            device = {
+                'ip_address': host['ip_address'],
+                'mac_address': mac,
+                'hostname': host['hostname'],
+                'brand': brand,
+                'device_type': infer_device_type(brand=brand, hostname=host['hostname'], mac=mac),
             }
-
-        # Match MAC line
-        mac_match = re.search(r'MAC Address: ((?:[0-9A-F]{2}:){5}[0-9A-F]{2})\s*\(?(.*?)\)?$', line)
-        if mac_match and current:
-            current['mac_address'] = mac_match.group(1)
-            current['brand'] = mac_match.group(2).strip() if mac_match.group(2) else ''
-            current['device_type'] = infer_device_type(
-                brand=current['brand'],
-                hostname=current.get('hostname', ''),
-                mac=current['mac_address']
-            )
-
-    if current.get('ip_address'):
-        devices.append(current)
-
+            devices.append(device)
+            logger.debug(f"nmap: {host['ip_address']} up ({host['reason']})")
+            if on_device is not None:
+                on_device(dict(device))
+
+    run_sync(cmd, timeout=timeout, cancel_event=cancel_event,
+             on_line=lambda line: collect(parser.feed(line + '\n')), keep_stdout=False)
+    collect(parser.close())
     return devices
 
 
-def _scan_arp_table() -> list:
-    """Read the system ARP table as a fallback."""
-    result = subprocess.run(
-        ['arp', '-a'],
-        capture_output=True,
-        text=True,
-        timeout=10
-    )
+def _scan_arp_table(network_range: Optional[str] = None, cancel_event=None) -> list:
+    """Read the system ARP table as a fallback (only entries inside network_range if given)."""
+    network = ipaddress.IPv4Network(network_range, strict=False) if network_range else None
+    if os.path.exists(presence.ARP_TABLE):
+        # Linux: read the kernel table directly instead of forking arp -a
+        devices = []
+        for entry in presence.read_arp_table():
+            if network is not None and ipaddress.IPv4Address(entry['ip_address']) not in network:
+                continue
+            mac = entry['mac_address']
+            brand = lookup_vendor(mac)
+            devices.append({
+                'ip_address': entry['ip_address'],
+                'mac_address': mac,
+                'hostname': '',
+                'brand': brand,
+                'device_type': infer_device_type(brand=brand, mac=mac),
+            })
+        return devices
+
+    result = run_sync(['arp', '-a'], timeout=10, cancel_event=cancel_event)
 
     devices = []
     for line in result.stdout.split('\n'):
         # Linux format: hostname (IP) at MAC [ether] on interface
         match = re.search(r'(\S+)\s+\((\d+\.\d+\.\d+\.\d+)\)\s+at\s+((?:[0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})', line)
-        if match:
+        if match and (network is None or ipaddress.IPv4Address(match.group(2)) in network):
             hostname = match.group(1) if match.group(1) != '?' else ''
             mac = match.group(3).upper()
+            brand = lookup_vendor(mac)
             devices.append({
                 'ip_address': match.group(2),
                 'mac_address': mac,
                 'hostname': hostname,
-                'brand': '',
-                'device_type': infer_device_type(hostname=hostname, mac=mac),
+                'brand': brand,
+                'device_type': infer_device_type(brand=brand, hostname=hostname, mac=mac),
             })
 
     return devices
 
 
-def infer_device_type(brand: str = '', hostname: str = '', mac: str = '') -> str:
-    """
-    Infer the device type from brand/vendor name, hostname, and MAC prefix.
-    Returns one of: router, switch, ap, printer, phone, tablet, tv, camera,
-    iot, server, desktop, laptop, nas, gaming, other
-    """
-    brand_lower = (brand or '').lower()
-    hostname_lower = (hostname or '').lower()
-    combined = f"{brand_lower} {hostname_lower}"
-
-    # Router / Gateway
-    router_keywords = ['router', 'gateway', 'mikrotik', 'ubiquiti', 'netgear',
-                       'tp-link', 'tplink', 'asus', 'linksys', 'dlink', 'd-link',
-                       'cisco', 'zyxel', 'huawei', 'openwrt', 'pfsense', 'fritz']
-    if any(k in combined for k in router_keywords):
-        # Distinguish APs and switches from routers
-        if any(k in combined for k in ['unifi', 'ap', 'access point', 'uap']):
-            return 'ap'
-        if any(k in combined for k in ['switch', 'gs3', 'gs1']):
-            return 'switch'
-        return 'router'
-
-    # Access Points
-    if any(k in combined for k in ['access point', 'unifi', 'aruba', 'ruckus', 'meraki']):
-        return 'ap'
-
-    # Switches
-    if any(k in combined for k in ['switch', 'netgear gs', 'prosafe']):
-        return 'switch'
-
-    # Printers
-    if any(k in combined for k in ['printer', 'print', 'epson', 'canon', 'brother',
-                                    'hp inc', 'hewlett', 'lexmark', 'xerox', 'kyocera',
-                                    'ricoh', 'sharp', 'konica']):
-        return 'printer'
-
-    # Phones (mobile)
-    if any(k in combined for k in ['iphone', 'samsung galaxy', 'xiaomi', 'huawei',
-                                    'oneplus', 'pixel', 'android', 'oppo', 'vivo',
-                                    'realme', 'motorola', 'phone']):
-        return 'phone'
-
-    # Tablets
-    if any(k in combined for k in ['ipad', 'tablet', 'galaxy tab', 'fire hd',
-                                    'surface']):
-        return 'tablet'
-
-    # Smart TVs / Streaming
-    if any(k in combined for k in ['samsung elec', 'lg elec', 'sony', 'roku',
-                                    'fire tv', 'chromecast', 'apple tv', 'nvidia shield',
-                                    'tv', 'vizio', 'hisense', 'tcl']):
-        return 'tv'
-
-    # Cameras / Security
-    if any(k in combined for k in ['camera', 'cam', 'hikvision', 'dahua', 'reolink',
-                                    'ring', 'nest', 'arlo', 'wyze', 'ezviz', 'axis']):
-        return 'camera'
-
-    # IoT / Smart Home
-    if any(k in combined for k in ['espressif', 'esp32', 'esp8266', 'tuya', 'sonoff',
-                                    'shelly', 'tasmota', 'zigbee', 'alexa', 'echo',
-                                    'google home', 'homepod', 'smartthings', 'hue',
-                                    'nest', 'ring', 'iot']):
-        return 'iot'
-
-    # NAS / Storage
-    if any(k in combined for k in ['synology', 'qnap', 'nas', 'drobo', 'buffalo',
-                                    'western digital', 'wd my']):
-        return 'nas'
-
-    # Gaming
-    if any(k in combined for k in ['playstation', 'xbox', 'nintendo', 'steam deck',
-                                    'gaming']):
-        return 'gaming'
-
-    # Servers
-    if any(k in combined for k in ['server', 'proxmox', 'vmware', 'dell emc',
-                                    'supermicro', 'lenovo server']):
-        return 'server'
-
-    # Desktops / Laptops
-    if any(k in combined for k in ['intel', 'amd', 'dell', 'lenovo', 'hp ',
-                                    'acer', 'msi']):
-        return 'desktop'
-
-    # Apple devices (when we can't distinguish type)
-    if any(k in combined for k in ['apple', 'macbook', 'imac', 'mac mini']):
-        return 'desktop'
-
-    # Raspberry Pi / SBCs
-    if any(k in combined for k in ['raspberry', 'raspberrypi']):
-        return 'server'
-
-    return 'other'
-
-
-def ping_host(ip: str, timeout: int = 3) -> dict:
+def ping_host(ip: str, timeout: int = 3, cancel_event=None) -> dict:
     """
     Ping a single host and return result.
     """
     try:
         # Use system ping for reliability
         param = '-c' if platform.system().lower() != 'windows' else '-n'
-        result = subprocess.run(
+        result = run_sync(
             ['ping', param, '1', '-W', str(timeout), ip],
-            capture_output=True,
-            text=True,
-            timeout=timeout + 2
+            timeout=timeout + 2,
+            cancel_event=cancel_event,
         )
 
         if result.returncode == 0:
@@ -274,6 +650,8 @@ def ping_host(ip: str, timeout: int = 3) -> dict:
             'is_reachable': False,
             'latency': None,
         }
+    except SubprocessCancelled:
+        raise
     except Exception as e:
         logger.error(f"Ping error for {ip}: {e}")
         return {
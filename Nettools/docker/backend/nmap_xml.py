@@ -0,0 +1,110 @@
+"""
+NetTools - nmap XML Parser
+Incremental parser for nmap's XML output (-oX -), fed as the process writes it.
+
+The expat parser behind ElementTree's iterparse is driven directly with a
+callback target: host records are built from the start/end tags and handed
+out as soon as </host> arrives. No element tree is kept, so memory stays
+bounded by one host no matter how large the scan is.
+"""
+
+import logging
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Preferred hostname sources, best first
+_HOSTNAME_TYPES = ('user', 'PTR')
+
+
+class _HostTarget:
+    """ElementTree parser target collecting <host> records (hosthints etc. are skipped)."""
+
+    def __init__(self):
+        self.completed = []
+        self._host = None
+        self._names = []
+
+    def start(self, tag, attrib):
+        host = self._host
+        if tag == 'host':
+            self._host = {'ip_address': '', 'mac_address': '', 'vendor': '', 'hostname': '',
+                          'hostnames': [], 'state': '', 'reason': ''}
+            self._names = []
+        elif host is None:
+            return
+        elif tag == 'address':
+            kind = attrib.get('addrtype')
+            if kind == 'ipv4' and not host['ip_address']:
+                host['ip_address'] = attrib.get('addr', '')
+            elif kind == 'mac':
+                host['mac_address'] = attrib.get('addr', '').upper()
+                host['vendor'] = attrib.get('vendor', '')
+        elif tag == 'hostname':
+            name = attrib.get('name', '')
+            if name:
+                self._names.append((attrib.get('type', ''), name))
+        elif tag == 'status':
+            host['state'] = attrib.get('state', '')
+            host['reason'] = attrib.get('reason', '')
+
+    def end(self, tag):
+        if tag != 'host' or self._host is None:
+            return
+        host, names = self._host, self._names
+        host['hostnames'] = [name for _, name in names]
+        host['hostname'] = next((name for preferred in _HOSTNAME_TYPES for kind, name in names
+                                 if kind == preferred), host['hostnames'][0] if names else '')
+        self.completed.append(host)
+        self._host = None
+
+    def close(self):
+        return None
+
+
+class NmapXmlParser:
+    """Feed chunks of nmap -oX output; feed() returns the hosts completed by that chunk."""
+
+    def __init__(self):
+        self._target = _HostTarget()
+        self._parser = ET.XMLParser(target=self._target)
+        self.failed = False
+
+    def feed(self, data: str) -> list:
+        if self.failed:
+            return []
+        try:
+            self._parser.feed(data)
+        except ET.ParseError as e:
+            # Truncated or garbled output (nmap killed, error message): keep what we have
+            self.failed = True
+            logger.warning(f"Invalid nmap XML output: {e}")
+        return self._take()
+
+    def close(self) -> list:
+        """Flush the parser; incomplete trailing output is ignored."""
+        if not self.failed:
+            try:
+                self._parser.close()
+            except ET.ParseError:
+                pass
+        return self._take()
+
+    def _take(self) -> list:
+        if not self._target.completed:
+            return []
+        completed, self._target.completed = self._target.completed, []
+        return completed
+
+
+def parse_nmap_xml(chunks: Iterable[str]) -> Iterator[dict]:
+    """
+    Host records of recorded nmap XML output (a file object or any iterable
+    of text chunks): {ip_address, mac_address, vendor, hostname, hostnames,
+    state, reason}.
+    """
+    parser = NmapXmlParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
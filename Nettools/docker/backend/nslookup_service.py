@@ -3,15 +3,17 @@ NetTools - NSLookup / DNS Lookup Service
 Provides DNS resolution and record querying
 """
 
-import subprocess
 import re
 import socket
 import logging
 
+from subprocess_runner import run_sync
+
 logger = logging.getLogger(__name__)
 
 
-def run_nslookup(domain: str, dns_server: str = None, record_type: str = "A") -> dict:
+def run_nslookup(domain: str, dns_server: str = None, record_type: str = "A",
+                 cancel_event=None) -> dict:
     """
     Run a DNS lookup for the specified domain.
 
@@ -19,6 +21,7 @@ def run_nslookup(domain: str, dns_server: str = None, record_type: str = "A") ->
         domain: Domain name or IP address to look up
         dns_server: Optional DNS server to query (e.g., 8.8.8.8)
         record_type: DNS record type (A, AAAA, MX, NS, TXT, CNAME, SOA, PTR, SRV, ANY)
+        cancel_event: optional threading.Event that kills the lookup when set
 
     Returns:
         dict with keys:
@@ -53,10 +56,10 @@ def run_nslookup(domain: str, dns_server: str = None, record_type: str = "A") ->
 
         # Try using 'dig' first (more detailed), fall back to 'nslookup'
         try:
-            return _run_dig(domain, dns_server, record_type)
+            return _run_dig(domain, dns_server, record_type, cancel_event)
         except FileNotFoundError:
             logger.warning("dig not found, trying nslookup...")
-            return _run_nslookup_cmd(domain, dns_server, record_type)
+            return _run_nslookup_cmd(domain, dns_server, record_type, cancel_event)
 
     except ValueError as e:
         logger.error(f"NSLookup validation error: {e}")
@@ -66,7 +69,8 @@ def run_nslookup(domain: str, dns_server: str = None, record_type: str = "A") ->
         raise
 
 
-def _run_dig(domain: str, dns_server: str = None, record_type: str = "A") -> dict:
+def _run_dig(domain: str, dns_server: str = None, record_type: str = "A",
+             cancel_event=None) -> dict:
     """Run DNS lookup using dig command."""
     cmd = ['dig']
 
@@ -75,12 +79,7 @@ def _run_dig(domain: str, dns_server: str = None, record_type: str = "A") -> dic
 
     cmd.extend([domain, record_type, '+noall', '+answer', '+authority', '+stats', '+question'])
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=15
-    )
+    result = run_sync(cmd, timeout=15, cancel_event=cancel_event)
 
     output = result.stdout
     records = []
@@ -176,7 +175,8 @@ def _run_dig(domain: str, dns_server: str = None, record_type: str = "A") -> dic
     }
 
 
-def _run_nslookup_cmd(domain: str, dns_server: str = None, record_type: str = "A") -> dict:
+def _run_nslookup_cmd(domain: str, dns_server: str = None, record_type: str = "A",
+                     cancel_event=None) -> dict:
     """Fallback using nslookup command."""
     cmd = ['nslookup']
 
@@ -188,12 +188,7 @@ def _run_nslookup_cmd(domain: str, dns_server: str = None, record_type: str = "A
     if dns_server:
         cmd.append(dns_server)
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=15
-    )
+    result = run_sync(cmd, timeout=15, cancel_event=cancel_event)
 
     output = result.stdout + '\n' + result.stderr
     records = []
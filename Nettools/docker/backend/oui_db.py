@@ -0,0 +1,230 @@
+"""
+NetTools - OUI Vendor Database
+MAC prefix -> vendor lookups from a compact binary index, with no network
+access at lookup time.
+
+The index is built once (at image build time) from the IEEE registries
+(MA-L oui.csv, MA-M mam.csv, MA-S oui36.csv) and/or arp-scan's ieee-oui.txt:
+
+    python oui_db.py -o oui.bin <file or URL> [<file or URL> ...]
+
+File layout (little endian):
+    header   magic, then (prefix bits, count, prefixes offset, vendors
+             offset) for the 36, 28 and 24-bit tables, then the offset of
+             the vendor strings
+    prefixes per table, the sorted prefixes (u64 array)
+    vendors  per table, offset of each prefix's vendor name (u32 array)
+    strings  NUL-terminated UTF-8 vendor names, each stored once
+
+Lookups memory-map the file and bisect the prefix arrays in place (no
+parsing, no copy), most specific table first (MA-S, then MA-M, then
+MA-L), so only the touched pages are loaded.
+"""
+
+import bisect
+import csv
+import io
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import urllib.request
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('NETTOOLS_OUI_DB',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oui.bin'))
+
+MAGIC = b'NTOUI\x00\x01\x00'
+PREFIX_BITS = (36, 28, 24)  # most specific first
+_HEADER = struct.Struct('<8s' + 'BxxxIII' * len(PREFIX_BITS) + 'I4x')
+# IEEE CSV 'Registry' column -> prefix bits
+_REGISTRIES = {'MA-L': 24, 'MA-M': 28, 'MA-S': 36}
+
+
+def mac_to_int(mac: str) -> Optional[int]:
+    digits = mac.replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+class OuiDatabase:
+    """Read-only, memory-mapped OUI index."""
+
+    def __init__(self, path: str):
+        if sys.byteorder != 'little':
+            # The arrays are read in place with the native byte order
+            raise ValueError("OUI database requires a little-endian host")
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = _HEADER.unpack_from(self._mm)
+        if fields[0] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a NetTools OUI database")
+        self._view = memoryview(self._mm)
+        # (bits, prefixes, vendor offsets) per table, most specific first
+        self._tables = []
+        for i in range(len(PREFIX_BITS)):
+            bits, count, prefixes, vendors = fields[1 + 4 * i:5 + 4 * i]
+            self._tables.append((bits, self._view[prefixes:prefixes + count * 8].cast('Q'),
+                                 self._view[vendors:vendors + count * 4].cast('I')))
+        self._strings = fields[-1]
+        # MA-L blocks split into MA-M/MA-S prefixes (a few hundred): other
+        # MACs go straight to the 24-bit table
+        self._split_blocks = {prefix >> (bits - 24) for bits, prefixes, _ in self._tables if bits > 24
+                              for prefix in prefixes}
+
+    def __len__(self):
+        return sum(len(prefixes) for _, prefixes, _ in self._tables)
+
+    def lookup(self, mac: str) -> str:
+        """Vendor of the most specific registered prefix of mac ('' if unknown)."""
+        value = mac_to_int(mac)
+        if value is None:
+            return ''
+        tables = self._tables if value >> 24 in self._split_blocks else self._tables[-1:]
+        for bits, prefixes, vendors in tables:
+            key = value >> (48 - bits)
+            index = bisect.bisect_left(prefixes, key)
+            if index < len(prefixes) and prefixes[index] == key:
+                start = self._strings + vendors[index]
+                return self._mm[start:self._mm.find(b'\x00', start)].decode('utf-8', 'replace')
+        return ''
+
+    def close(self):
+        for _, prefixes, vendors in self._tables:
+            prefixes.release()
+            vendors.release()
+        self._tables = []
+        self._view.release()
+        self._mm.close()
+
+
+_db = None
+_db_lock = threading.Lock()
+_db_missing = False
+
+
+def lookup_vendor(mac: str) -> str:
+    """Vendor for mac from the default database (DB_PATH); '' if unknown or no database."""
+    global _db, _db_missing
+    if _db is None:
+        if _db_missing:
+            return ''
+        with _db_lock:
+            if _db is None and not _db_missing:
+                try:
+                    _db = OuiDatabase(DB_PATH)
+                    logger.info(f"OUI database loaded: {len(_db)} prefixes")
+                except (OSError, ValueError) as e:
+                    _db_missing = True
+                    logger.warning(f"OUI database not available ({e}), vendors will only come from scan tools")
+                    return ''
+    return _db.lookup(mac)
+
+
+# --- Build ---
+def _read_source(source: str) -> str:
+    if source.startswith(('http://', 'https://')):
+        request = urllib.request.Request(source, headers={'User-Agent': 'Mozilla/5.0 (NetTools OUI build)'})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.read().decode('utf-8', 'replace')
+    with open(source, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def parse_registry(text: str):
+    """(bits, prefix, vendor) entries of an IEEE CSV registry or an arp-scan ieee-oui.txt."""
+    if text.startswith('Registry,'):
+        for row in csv.DictReader(io.StringIO(text)):
+            bits = _REGISTRIES.get(row.get('Registry', ''))
+            assignment = row.get('Assignment', '')
+            vendor = (row.get('Organization Name') or '').strip()
+            if bits and vendor and len(assignment) * 4 == bits:
+                yield bits, int(assignment, 16), vendor
+        return
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        prefix, _, vendor = line.partition('\t')
+        vendor = vendor.strip()
+        if len(prefix) in (6, 7, 9) and vendor:
+            try:
+                yield len(prefix) * 4, int(prefix, 16), vendor
+            except ValueError:
+                continue
+
+
+def build(sources: list, output: str) -> int:
+    """Compile sources (files or URLs; earlier ones win on duplicates) into output. Returns the entry count."""
+    tables = {bits: {} for bits in PREFIX_BITS}
+    for source in sources:
+        try:
+            entries = list(parse_registry(_read_source(source)))
+        except Exception as e:
+            logger.warning(f"Skipping OUI source {source}: {e}")
+            continue
+        for bits, prefix, vendor in entries:
+            tables[bits].setdefault(prefix, vendor)
+        logger.info(f"{source}: {len(entries)} entries")
+    total = sum(len(table) for table in tables.values())
+    if not total:
+        raise RuntimeError("No OUI entries found in any source")
+
+    strings, string_offsets = bytearray(), {}
+    prefixes, vendors = {}, {}
+    for bits in PREFIX_BITS:
+        keys = sorted(tables[bits])
+        offsets = []
+        for prefix in keys:
+            vendor = tables[bits][prefix]
+            if vendor not in string_offsets:
+                string_offsets[vendor] = len(strings)
+                strings += vendor.encode('utf-8') + b'\x00'
+            offsets.append(string_offsets[vendor])
+        prefixes[bits] = struct.pack(f'<{len(keys)}Q', *keys)
+        vendors[bits] = struct.pack(f'<{len(offsets)}I', *offsets)
+
+    # u64 arrays first so they stay 8-byte aligned (the header is 64 bytes)
+    header_fields = [MAGIC]
+    prefixes_offset = _HEADER.size
+    vendors_offset = prefixes_offset + sum(len(prefixes[bits]) for bits in PREFIX_BITS)
+    for bits in PREFIX_BITS:
+        header_fields += [bits, len(tables[bits]), prefixes_offset, vendors_offset]
+        prefixes_offset += len(prefixes[bits])
+        vendors_offset += len(vendors[bits])
+    header_fields.append(vendors_offset)
+
+    tmp = output + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(*header_fields))
+        for bits in PREFIX_BITS:
+            f.write(prefixes[bits])
+        for bits in PREFIX_BITS:
+            f.write(vendors[bits])
+        f.write(strings)
+    os.replace(tmp, output)
+    return total
+
+
+def main(argv: list) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description='Build the NetTools OUI vendor database')
+    parser.add_argument('sources', nargs='+', help='IEEE CSV registries or arp-scan ieee-oui.txt (files or URLs)')
+    parser.add_argument('-o', '--output', default=DB_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    total = build(args.sources, args.output)
+    print(f"{args.output}: {total} prefixes, {os.path.getsize(args.output)} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,159 @@
+"""
+NetTools - Worker Pools
+Named thread pools per workload class (bulkheads), so quick interactive
+operations never wait behind long scans or speed tests.
+
+Pools (size configurable with NETTOOLS_POOL_<NAME>_WORKERS):
+- interactive: fast lane for single pings, DNS lookups, Telegram tests, analytics
+- probe: fan-out network probes (batch pings, server ranking, traceroutes)
+- bulk: long jobs (speed tests, network scans)
+- scan: shards of a network scan (only the scan job waits on it)
+- portscan: TCP port scan jobs, so they never hold a bulk worker
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZES = {
+    'interactive': 4,
+    'probe': 8,
+    'bulk': 2,  # one per bulk job type (speedtest, scan), see jobs.py
+    'scan': 4,
+    'portscan': 1,
+}
+
+# Recent wait times kept per pool for the percentiles in stats()
+WAIT_SAMPLES = 256
+
+
+class WorkPool(Executor):
+    """
+    A thread pool that tracks queue depth and queueing (wait) time.
+    It is a regular Executor, so it works with loop.run_in_executor().
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'pool-{name}')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._started = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._wait_metric = metrics.pool_wait_duration.labels(name)
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit fn(*args, **kwargs); returns a concurrent.futures.Future."""
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+        try:
+            future = self._executor.submit(self._call, submitted, fn, args, kwargs)
+        except BaseException:
+            self._unqueue()
+            raise
+        # A task cancelled before it started never reaches _call
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        if future.cancelled():
+            self._unqueue()
+
+    def _unqueue(self):
+        with self._lock:
+            self._queued -= 1
+
+    def _call(self, submitted: float, fn, args, kwargs):
+        wait = time.perf_counter() - submitted
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._started += 1
+            self._wait_total += wait
+            self._waits.append(wait)
+        self._wait_metric.observe(wait)
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                if not ok:
+                    self._failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            started = self._started
+            stats = {
+                'workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'completed': self._completed,
+                'failed': self._failed,
+                'wait_avg_ms': round(self._wait_total / started * 1000, 2) if started else 0.0,
+            }
+        for p in (50, 95):
+            stats[f'wait_p{p}_ms'] = round(waits[int(p / 100 * (len(waits) - 1))] * 1000, 2) if waits else 0.0
+        stats['wait_max_ms'] = round(waits[-1] * 1000, 2) if waits else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = False, *, cancel_futures: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def _pool_size(name: str, default: int) -> int:
+    value = os.environ.get(f'NETTOOLS_POOL_{name.upper()}_WORKERS', '')
+    try:
+        return max(1, int(value)) if value else default
+    except ValueError:
+        logger.warning(f"Invalid NETTOOLS_POOL_{name.upper()}_WORKERS={value!r}, using {default}")
+        return default
+
+
+_pools = {name: WorkPool(name, _pool_size(name, size)) for name, size in DEFAULT_POOL_SIZES.items()}
+
+
+def get_pool(name: str) -> WorkPool:
+    return _pools[name]
+
+
+def get_stats() -> dict:
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def shutdown():
+    for pool in _pools.values():
+        pool.shutdown()
+
+
+def _stat_samples(key: str):
+    return lambda: {(name,): stats[key] for name, stats in get_stats().items()}
+
+
+metrics.GaugeFunc('nettools_pool_workers', 'Worker threads per pool', ('pool',), _stat_samples('workers'))
+metrics.GaugeFunc('nettools_pool_active', 'Tasks running per pool', ('pool',), _stat_samples('active'))
+metrics.GaugeFunc('nettools_pool_queued', 'Tasks waiting for a worker per pool', ('pool',), _stat_samples('queued'))
+
+
+interactive = _pools['interactive']
+probe = _pools['probe']
+bulk = _pools['bulk']
+scan = _pools['scan']
+portscan = _pools['portscan']
@@ -0,0 +1,239 @@
+"""
+NetTools - TCP Port Scanner
+Asyncio TCP-connect scanner for discovered devices (no raw sockets, no nmap).
+
+- Ports come from a named set (PORT_SETS) or a spec like '22,80,8000-8100'
+- All (host, port) pairs of a scan go through one queue consumed by a fixed
+  number of workers, so open connections never exceed the concurrency
+  whatever the number of hosts and ports; connection attempts are paced by
+  a shared rate limit (attempts per second)
+- Each connect has its own timeout and each host a total budget: ports not
+  tried when the budget runs out are skipped and the host is flagged
+- Optional banner grab: the first bytes the service sends (plain HTTP ports
+  get a HEAD request), reduced to one printable line
+
+Any host/port works, including listening sockets on 127.0.0.1.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import socket
+import time
+from typing import Callable, Iterable, Optional
+
+from subprocess_runner import SubprocessCancelled
+
+logger = logging.getLogger(__name__)
+
+
+def _env_number(name: str, default, cast=int):
+    value = os.environ.get(name, '')
+    try:
+        number = cast(value) if value else default
+    except ValueError:
+        number = 0
+    if number <= 0:
+        logger.warning(f"Invalid {name}={value!r}, using {default}")
+        return default
+    return number
+
+
+# Simultaneous connection attempts and attempts per second. Port scan jobs
+# run one at a time, so these are global limits.
+CONCURRENCY = _env_number('NETTOOLS_PORTSCAN_CONCURRENCY', 200)
+RATE = _env_number('NETTOOLS_PORTSCAN_RATE', 500)
+# Seconds per connection attempt, and total seconds per host
+CONNECT_TIMEOUT = _env_number('NETTOOLS_PORTSCAN_TIMEOUT', 1.0, float)
+HOST_TIMEOUT = _env_number('NETTOOLS_PORTSCAN_HOST_TIMEOUT', 60.0, float)
+BANNER_TIMEOUT = 1.5
+BANNER_BYTES = 512
+MAX_BANNER = 200
+
+# Service names of the ports we care about; the 'common' set scans all of them
+SERVICES = {
+    21: 'ftp', 22: 'ssh', 23: 'telnet', 25: 'smtp', 53: 'dns', 80: 'http', 110: 'pop3',
+    111: 'rpcbind', 135: 'msrpc', 139: 'netbios-ssn', 143: 'imap', 443: 'https',
+    445: 'smb', 515: 'lpd', 548: 'afp', 554: 'rtsp', 631: 'ipp', 993: 'imaps',
+    995: 'pop3s', 1400: 'sonos', 1883: 'mqtt', 1900: 'upnp', 2049: 'nfs', 3000: 'http-alt',
+    3306: 'mysql', 3389: 'rdp', 5000: 'upnp', 5001: 'synology', 5060: 'sip',
+    5432: 'postgresql', 5900: 'vnc', 6053: 'esphome', 6379: 'redis', 6668: 'tuya',
+    7000: 'airplay', 8000: 'http-alt', 8008: 'http', 8009: 'chromecast', 8080: 'http-proxy',
+    8081: 'http-alt', 8123: 'home-assistant', 8200: 'dlna', 8291: 'winbox', 8443: 'https-alt',
+    8883: 'mqtts', 8888: 'http-alt', 9000: 'http-alt', 9090: 'http-alt', 9100: 'jetdirect',
+    9443: 'https-alt', 10000: 'webmin', 32400: 'plex', 37777: 'dahua', 49152: 'upnp',
+    62078: 'iphone-sync',
+}
+PORT_SETS = {
+    'quick': (21, 22, 23, 53, 80, 139, 443, 445, 554, 631, 3389, 8080, 9100),
+    'common': tuple(sorted(SERVICES)),
+    'well-known': tuple(range(1, 1025)),
+    'all': tuple(range(1, 65536)),
+}
+DEFAULT_PORT_SET = 'common'
+# Plain HTTP ports: silent until they get a request
+HTTP_PORTS = {80, 3000, 5000, 8000, 8008, 8080, 8081, 8123, 8888, 9000, 9090, 32400}
+
+
+def parse_ports(spec) -> tuple:
+    """
+    Sorted unique ports of a spec: a set name ('common'), or ports and
+    ranges separated by commas/spaces ('22,80,8000-8100'), or a list of ints.
+    Raises ValueError on invalid entries.
+    """
+    if spec is None or spec == '':
+        return PORT_SETS[DEFAULT_PORT_SET]
+    if isinstance(spec, str):
+        items = [item for item in re.split(r'[\s,]+', spec.strip()) if item]
+    else:
+        items = list(spec)
+    ports = set()
+    for item in items:
+        if isinstance(item, str) and item in PORT_SETS:
+            ports.update(PORT_SETS[item])
+            continue
+        try:
+            if isinstance(item, str) and '-' in item:
+                low, high = (int(part) for part in item.split('-', 1))
+            else:
+                low = high = int(item)
+        except ValueError:
+            raise ValueError(f"Puerto no valido: {item}")
+        if not 1 <= low <= high <= 65535:
+            raise ValueError(f"Puerto fuera de rango: {item}")
+        ports.update(range(low, high + 1))
+    if not ports:
+        raise ValueError("No hay puertos que escanear")
+    return tuple(sorted(ports))
+
+
+def service_name(port: int) -> str:
+    if port in SERVICES:
+        return SERVICES[port]
+    try:
+        return socket.getservbyport(port, 'tcp')
+    except OSError:
+        return ''
+
+
+class RateLimiter:
+    """Spaces acquire() calls at least 1/rate seconds apart (one event loop)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / max(1, rate)
+        self._next = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def _clean_banner(data: bytes) -> str:
+    text = data.decode('utf-8', 'replace')
+    if text.startswith('HTTP/'):
+        # Status line and Server header are the useful part of an HTTP reply
+        lines = text.split('\r\n')
+        server = next((line for line in lines if line.lower().startswith('server:')), '')
+        text = f"{lines[0]} {server}".strip()
+    text = ' '.join(''.join(c if c.isprintable() else ' ' for c in text).split())
+    return text[:MAX_BANNER]
+
+
+async def probe(host: str, port: int, timeout: float = CONNECT_TIMEOUT,
+                banner: bool = False) -> Optional[dict]:
+    """{'port', 'protocol', 'service', 'banner'} if port accepts a TCP connection, else None."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    result = {'port': port, 'protocol': 'tcp', 'service': service_name(port), 'banner': ''}
+    try:
+        if banner:
+            result['banner'] = await _grab_banner(reader, writer, host, port)
+    finally:
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), 1)
+        except (OSError, asyncio.TimeoutError):
+            pass
+    return result
+
+
+async def _grab_banner(reader, writer, host: str, port: int) -> str:
+    try:
+        if port in HTTP_PORTS:
+            writer.write(f'HEAD / HTTP/1.0\r\nHost: {host}\r\n\r\n'.encode())
+            await writer.drain()
+        data = await asyncio.wait_for(reader.read(BANNER_BYTES), BANNER_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return ''
+    return _clean_banner(data)
+
+
+async def scan_ports(hosts: Iterable[str], ports=None, timeout: float = CONNECT_TIMEOUT,
+                     host_timeout: float = HOST_TIMEOUT, banners: bool = False,
+                     concurrency: int = CONCURRENCY, rate: int = RATE, cancel_event=None,
+                     on_host: Optional[Callable[[str, dict], None]] = None) -> dict:
+    """
+    TCP-connect scan of ports (see parse_ports) on every host.
+    Returns {host: {'ports': [open port dicts, by port], 'scanned': n, 'timed_out': bool}};
+    on_host(host, result) is called as each host finishes.
+    Raises SubprocessCancelled if cancel_event is set.
+    """
+    hosts = list(dict.fromkeys(hosts))
+    ports = parse_ports(ports)
+    results = {host: {'ports': [], 'scanned': 0, 'timed_out': False} for host in hosts}
+    remaining = {host: len(ports) for host in hosts}
+    deadlines = {}
+    limiter = RateLimiter(rate)
+    # Host-major order: each host finishes (and is reported) as early as possible
+    work = ((host, port) for host in hosts for port in ports)
+
+    def done(host: str):
+        remaining[host] -= 1
+        if remaining[host] == 0:
+            results[host]['ports'].sort(key=lambda p: p['port'])
+            if on_host is not None:
+                try:
+                    on_host(host, results[host])
+                except Exception as e:
+                    logger.warning(f"Port scan callback failed for {host}: {e}")
+
+    async def worker():
+        for host, port in work:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            result = results[host]
+            await limiter.acquire()
+            # The budget starts with the host's first connection attempt
+            deadline = deadlines.setdefault(host, time.monotonic() + host_timeout)
+            left = deadline - time.monotonic()
+            if left <= 0:
+                result['timed_out'] = True
+                done(host)
+                continue
+            found = await probe(host, port, min(timeout, left), banners)
+            result['scanned'] += 1
+            if found is not None:
+                result['ports'].append(found)
+            done(host)
+
+    workers = max(1, min(concurrency, len(hosts) * len(ports)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if cancel_event is not None and cancel_event.is_set():
+        raise SubprocessCancelled('port scan')
+    return results
+
+
+def scan_ports_sync(hosts: Iterable[str], ports=None, **kwargs) -> dict:
+    """
+    Blocking scan_ports() for worker threads. It runs on a private event loop
+    in the calling thread, so neither the connections nor on_host (which may
+    write to the database) load the app loop.
+    """
+    return asyncio.run(scan_ports(hosts, ports, **kwargs))
@@ -0,0 +1,290 @@
+"""
+NetTools - Passive Presence
+Keeps device is_online/last_seen up to date between scans from the kernel
+neighbor (ARP/NDP) table, without sending any packet:
+
+- read_arp_table(): snapshot of /proc/net/arp (no `arp -a` fork)
+- PresenceMonitor: thread following rtnetlink neighbor events
+  (RTM_NEWNEIGH/RTM_DELNEIGH). A neighbor confirmed REACHABLE marks its
+  device online; one the kernel gave up on (FAILED) counts as a missed
+  check (offline after offline_after_misses, like scans), at most once
+  per presence check interval so a flapping neighbor cannot go offline
+  on kernel events alone
+
+Messages come from a NeighborSource: NetlinkSource (real socket, Linux) or
+RecordedSource (captured messages, for tests without a kernel).
+"""
+
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Iterable, Optional
+
+import database as db
+from arp_sweep import format_mac
+from events import app_events
+
+logger = logging.getLogger(__name__)
+
+ARP_TABLE = '/proc/net/arp'
+ENABLED = os.environ.get('NETTOOLS_PASSIVE_PRESENCE', 'true').lower() not in ('0', 'false', 'no')
+# A device confirmed again within this many seconds is not even looked up;
+# set_device_presence only writes once last_seen is LAST_SEEN_RESOLUTION old
+TOUCH_INTERVAL = 60
+# Seconds between sweeps of the per-MAC state: entries older than the offline
+# window (presence interval x offline_after_misses) are dropped, so churn
+# (randomized MACs, guest Wi-Fi) cannot grow it without bound
+PRUNE_INTERVAL = 300
+
+# rtnetlink constants (linux/rtnetlink.h, linux/neighbour.h)
+NETLINK_ROUTE = 0
+RTMGRP_NEIGH = 0x4
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NDA_DST = 1
+NDA_LLADDR = 2
+NUD_REACHABLE = 0x02
+NUD_FAILED = 0x20
+NUD_NOARP = 0x40
+NUD_PERMANENT = 0x80
+ATF_COM = 0x2
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_NDMSG = struct.Struct('=BxxxiHBB')
+_RTATTR = struct.Struct('=HH')
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def read_arp_table(path: str = ARP_TABLE) -> list:
+    """Complete entries of the kernel ARP table: [{ip_address, mac_address, interface}]."""
+    entries = []
+    with open(path) as f:
+        next(f, None)  # header
+        for line in f:
+            fields = line.split()
+            if len(fields) < 6 or not int(fields[2], 16) & ATF_COM:
+                continue
+            mac = fields[3].upper()
+            if mac == '00:00:00:00:00:00':
+                continue
+            entries.append({'ip_address': fields[0], 'mac_address': mac, 'interface': fields[5]})
+    return entries
+
+
+def parse_neighbor_messages(data: bytes) -> list:
+    """
+    Neighbor events in a netlink datagram:
+    [{'type': 'new'|'del', 'family', 'ifindex', 'state', 'ip_address', 'mac_address'}].
+    Other message types are skipped; mac_address is '' when the kernel sends none.
+    """
+    events = []
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size or offset + length > len(data):
+            break
+        if msg_type in (RTM_NEWNEIGH, RTM_DELNEIGH) and length >= _NLMSGHDR.size + _NDMSG.size:
+            events.append(_parse_ndmsg(data[offset + _NLMSGHDR.size:offset + length],
+                                       'new' if msg_type == RTM_NEWNEIGH else 'del'))
+        offset += _align(length)
+    return events
+
+
+def _parse_ndmsg(payload: bytes, kind: str) -> dict:
+    family, ifindex, state, _, _ = _NDMSG.unpack_from(payload)
+    event = {'type': kind, 'family': family, 'ifindex': ifindex, 'state': state,
+             'ip_address': '', 'mac_address': ''}
+    offset = _NDMSG.size
+    while offset + _RTATTR.size <= len(payload):
+        attr_len, attr_type = _RTATTR.unpack_from(payload, offset)
+        if attr_len < _RTATTR.size:
+            break
+        value = payload[offset + _RTATTR.size:offset + attr_len]
+        if attr_type == NDA_DST:
+            event['ip_address'] = socket.inet_ntop(family, value)
+        elif attr_type == NDA_LLADDR and len(value) == 6:
+            event['mac_address'] = format_mac(value)
+        offset += _align(attr_len)
+    return event
+
+
+# --- Sources ---
+class NeighborSource:
+    """Stream of raw rtnetlink datagrams."""
+
+    def request_dump(self):
+        """Ask for the current neighbor table (answered as RTM_NEWNEIGH messages)."""
+
+    def recv(self, timeout: float) -> Optional[bytes]:
+        """Next datagram, or None if nothing arrives within timeout seconds."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NetlinkSource(NeighborSource):
+    """NETLINK_ROUTE socket subscribed to neighbor notifications."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            self.sock.bind((0, RTMGRP_NEIGH))
+        except OSError:
+            self.sock.close()
+            raise
+
+    def request_dump(self):
+        ndmsg = _NDMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        header = _NLMSGHDR.pack(_NLMSGHDR.size + len(ndmsg), RTM_GETNEIGH, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+        self.sock.send(header + ndmsg)
+
+    def recv(self, timeout: float) -> Optional[bytes]:
+        self.sock.settimeout(timeout)
+        try:
+            return self.sock.recv(65536)
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self.sock.close()
+
+
+class RecordedSource(NeighborSource):
+    """Replays recorded datagrams, then reports nothing."""
+
+    def __init__(self, datagrams: Iterable[bytes]):
+        self.datagrams = list(datagrams)
+
+    def recv(self, timeout: float) -> Optional[bytes]:
+        if self.datagrams:
+            return self.datagrams.pop(0)
+        time.sleep(min(timeout, 0.05))
+        return None
+
+
+# --- Monitor ---
+class PresenceMonitor:
+    """Background thread applying neighbor events to known devices."""
+
+    def __init__(self, source_factory=NetlinkSource):
+        self._source_factory = source_factory
+        self._stop = threading.Event()
+        self._thread = None
+        # MAC -> monotonic time it was last written as online
+        self._touched = {}
+        # Kernel FAILED events usually carry no MAC: remember it by IP
+        # (IP -> (MAC, monotonic time it was last seen))
+        self._mac_by_ip = {}
+        # MAC -> monotonic time a FAILED event last counted as a miss
+        self._missed = {}
+
+    def start(self):
+        if not ENABLED or (self._thread and self._thread.is_alive()):
+            return
+        try:
+            source = self._source_factory()
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Passive presence disabled, neighbor events not available: {e}")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(source,), name='presence', daemon=True)
+        self._thread.start()
+        logger.info("Passive presence monitor started")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self, source: NeighborSource):
+        try:
+            source.request_dump()
+            pruned = time.monotonic()
+            while not self._stop.is_set():
+                if time.monotonic() - pruned >= PRUNE_INTERVAL:
+                    pruned = time.monotonic()
+                    try:
+                        self.prune()
+                    except Exception as e:
+                        logger.error(f"Presence state cleanup failed: {e}")
+                data = source.recv(1.0)
+                if not data:
+                    continue
+                for event in parse_neighbor_messages(data):
+                    try:
+                        self.handle(event)
+                    except Exception as e:
+                        logger.error(f"Presence update failed for {event}: {e}")
+        except OSError as e:
+            logger.error(f"Passive presence monitor stopped: {e}")
+        finally:
+            source.close()
+
+    def handle(self, event: dict):
+        """Apply one neighbor event (see parse_neighbor_messages)."""
+        ipv4 = event['family'] == socket.AF_INET
+        mac = event['mac_address']
+        now = time.monotonic()
+        if ipv4 and mac:
+            self._mac_by_ip[event['ip_address']] = (mac, now)
+        if event['type'] != 'new' or event['state'] & (NUD_NOARP | NUD_PERMANENT):
+            return
+
+        if event['state'] & NUD_REACHABLE and mac:
+            online = True
+        elif event['state'] & NUD_FAILED and ipv4:
+            online = False
+            mac = mac or self._mac_by_ip.get(event['ip_address'], ('', 0))[0]
+        else:
+            return
+        if not mac:
+            return
+
+        if online:
+            if now - self._touched.get(mac, -TOUCH_INTERVAL) < TOUCH_INTERVAL:
+                return
+            self._touched[mac] = now
+            offline_after = 1
+        else:
+            settings = db.get_settings()
+            missed = self._missed.get(mac)
+            if missed is not None and now - missed < db.presence_interval(settings):
+                return
+            self._missed[mac] = now
+            self._touched.pop(mac, None)
+            offline_after = db.offline_after_misses(settings)
+
+        device = db.set_device_presence(mac, online, event['ip_address'] if ipv4 else None, offline_after)
+        if device is None:
+            return
+        if online:
+            app_events.publish('device_online', device)
+        else:
+            app_events.publish('device_offline', {'ids': [device['id']]})
+
+
+    def prune(self, max_age: float = None):
+        """Forget MACs/IPs without events for max_age seconds (default: the offline window)."""
+        if max_age is None:
+            settings = db.get_settings()
+            max_age = db.presence_interval(settings) * db.offline_after_misses(settings)
+        cutoff = time.monotonic() - max(max_age, TOUCH_INTERVAL)
+        for state in (self._touched, self._missed):
+            for mac in [mac for mac, at in state.items() if at < cutoff]:
+                del state[mac]
+        for ip in [ip for ip, (_, at) in self._mac_by_ip.items() if at < cutoff]:
+            del self._mac_by_ip[ip]
+
+
+monitor = PresenceMonitor()
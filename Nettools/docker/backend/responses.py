@@ -0,0 +1,25 @@
+"""
+NetTools - Fast JSON Responses
+JSONResponse rendered with orjson when it is installed (several times faster
+than the stdlib encoder on large lists of rows), with a transparent fallback.
+"""
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json fallback
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Drop-in JSONResponse. Returning it directly from an endpoint also skips
+    FastAPI's jsonable_encoder pass, which is the slowest part for database
+    rows (they already are plain str/int/float/None values).
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
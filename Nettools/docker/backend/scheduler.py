@@ -1,5 +1,6 @@
 """
 NetTools - Background Task Scheduler
+Submits periodic speed tests and scans to the shared job coordinator (jobs.py)
 """
 
 import logging
@@ -7,19 +8,11 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 import database as db
-from speedtest_service import run_speed_test
-from network_service import scan_network
-
-try:
-    from telegram_service import send_new_device_alert
-except ImportError:
-    send_new_device_alert = None
+from jobs import coordinator, JobQueueFull
 
 logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
-_scan_in_progress = False
-_test_in_progress = False
 
 
 def start_scheduler():
@@ -49,6 +42,7 @@ def start_scheduler():
             max_instances=1,
         )
         logger.info(f"Network scan scheduled every {freq} minutes")
+    _schedule_presence_check(settings)
 
     scheduler.start()
     logger.info("Scheduler started")
@@ -99,72 +93,58 @@ def update_schedule():
         )
         logger.info(f"Network scan rescheduled every {freq} minutes")
 
-
-def scheduled_speed_test():
-    """Run a scheduled speed test."""
-    global _test_in_progress
-    if _test_in_progress:
-        logger.warning("Speed test already in progress, skipping")
-        return
-
+    # Update known-device checks
     try:
-        _test_in_progress = True
-        logger.info("Running scheduled speed test...")
-        result = run_speed_test()
-        db.save_speed_test(result)
-        logger.info("Scheduled speed test completed successfully")
-    except Exception as e:
-        logger.error(f"Scheduled speed test failed: {e}")
-    finally:
-        _test_in_progress = False
+        scheduler.remove_job('presence_check')
+    except Exception:
+        pass
+    _schedule_presence_check(settings)
 
 
-def scheduled_network_scan():
-    """Run a scheduled network scan."""
-    global _scan_in_progress
-    if _scan_in_progress:
-        logger.warning("Network scan already in progress, skipping")
+def _schedule_presence_check(settings: dict):
+    """Targeted re-checks of known devices between full scans ('0' disables them)."""
+    freq = int(settings.get('presence_check_frequency', 2) or 0)
+    if not settings.get('auto_network_scan', True) or freq <= 0:
         return
+    scheduler.add_job(
+        scheduled_presence_check,
+        trigger=IntervalTrigger(minutes=freq),
+        id='presence_check',
+        replace_existing=True,
+        max_instances=1,
+    )
+    logger.info(f"Known device checks scheduled every {freq} minutes")
 
-    try:
-        _scan_in_progress = True
-        settings = db.get_settings()
-        network_range = settings.get('network_range', '192.168.1.0/24')
 
-        logger.info(f"Running scheduled network scan on {network_range}...")
+def scheduled_speed_test():
+    """Run a scheduled speed test (skipped if one is already queued or running)."""
+    _submit_scheduled('speedtest', "Speed test")
 
-        # Collect existing MAC addresses before the scan
-        existing_macs = db.get_all_mac_addresses()
 
-        db.mark_all_offline()
-        devices = scan_network(network_range)
+def scheduled_network_scan():
+    """Run a scheduled network scan (skipped if one is already queued or running)."""
+    _submit_scheduled('scan', "Network scan")
 
-        new_devices = []
-        for device_data in devices:
-            db.upsert_device_by_mac(device_data)
-            mac = device_data.get('mac_address', '')
-            if mac and mac not in existing_macs:
-                new_devices.append(device_data)
 
-        # Save historical snapshot
-        db.save_device_snapshot()
-        logger.info(f"Scheduled network scan completed: {len(devices)} devices found, {len(new_devices)} new")
+def scheduled_presence_check():
+    """Re-check known devices (skipped while a check or a full scan is running)."""
+    if coordinator.is_active('scan'):
+        return
+    _submit_scheduled('presence', "Known device check")
+
 
-        # Send Telegram notification for new devices
-        if new_devices and send_new_device_alert and settings.get('telegram_enabled', False):
-            bot_token = settings.get('telegram_bot_token', '')
-            chat_id = settings.get('telegram_chat_id', '')
-            if bot_token and chat_id:
-                send_new_device_alert(bot_token, chat_id, new_devices)
-    except Exception as e:
-        logger.error(f"Scheduled network scan failed: {e}")
-    finally:
-        _scan_in_progress = False
+def _submit_scheduled(kind: str, label: str):
+    # Speed tests and scans never queue, so a busy coordinator means one is already running
+    try:
+        job = coordinator.submit(kind, source='scheduled')
+        logger.info(f"Scheduled {label.lower()} started (job {job.id})")
+    except JobQueueFull:
+        logger.warning(f"{label} already in progress, skipping")
 
 
 def is_scan_in_progress() -> bool:
-    return _scan_in_progress
+    return coordinator.is_active('scan')
 
 
 def is_test_in_progress() -> bool:
-    return _test_in_progress
+    return coordinator.is_active('speedtest')
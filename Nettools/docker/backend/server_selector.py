@@ -0,0 +1,116 @@
+"""
+NetTools - Speed Test Server Selector
+Ranks candidate speedtest servers by measured TCP connect latency
+"""
+
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# How long a ranking stays valid (seconds)
+CACHE_TTL = 6 * 3600
+# Servers probed per ranking (closest by distance first)
+MAX_CANDIDATES = 15
+# TCP connects per server; the minimum is kept (filters out one-off queueing delays)
+PROBE_ATTEMPTS = 3
+PROBE_TIMEOUT = 2.0
+
+_cache = {'ranking': [], 'expires': 0.0}
+_lock = threading.Lock()
+
+
+def measure_tcp_latency(host: str, port: int, attempts: int = PROBE_ATTEMPTS,
+                        timeout: float = PROBE_TIMEOUT) -> Optional[float]:
+    """
+    Measure the TCP handshake time to host:port.
+    Returns the best of `attempts` connects in ms, or None if unreachable.
+    """
+    best = None
+    for _ in range(attempts):
+        started = time.perf_counter()
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                elapsed = (time.perf_counter() - started) * 1000
+        except OSError:
+            continue
+        if best is None or elapsed < best:
+            best = elapsed
+    return round(best, 2) if best is not None else None
+
+
+def _split_host(host: str):
+    """Split 'name:port' (as reported by the Ookla CLI) into (name, port)."""
+    name, _, port = (host or '').rpartition(':')
+    if not name or not port.isdigit():
+        return None, None
+    return name, int(port)
+
+
+def rank_servers(servers: list, max_candidates: int = MAX_CANDIDATES) -> list:
+    """
+    Probe the candidate servers concurrently and return them sorted by latency.
+    Each returned server dict gains a 'latency' key (ms). Servers without a
+    probeable host or that did not answer are dropped.
+    """
+    candidates = []
+    for server in servers[:max_candidates]:
+        name, port = _split_host(server.get('host', ''))
+        if name:
+            candidates.append((server, name, port))
+
+    if not candidates:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        latencies = list(pool.map(lambda c: measure_tcp_latency(c[1], c[2]), candidates))
+
+    ranked = []
+    for (server, _, _), latency in zip(candidates, latencies):
+        if latency is not None:
+            ranked.append({**server, 'latency': latency})
+
+    ranked.sort(key=lambda s: s['latency'])
+    return ranked
+
+
+def get_ranking(fetch_servers, force: bool = False) -> list:
+    """
+    Return the cached server ranking, refreshing it when expired.
+    fetch_servers is a callable returning the candidate list (with 'host' keys).
+    """
+    now = time.monotonic()
+    with _lock:
+        if not force and _cache['ranking'] and now < _cache['expires']:
+            return _cache['ranking']
+
+        # Refresh while holding the lock so concurrent callers don't probe twice
+        try:
+            ranking = rank_servers(fetch_servers())
+        except Exception as e:
+            logger.warning(f"Server ranking failed: {e}")
+            ranking = []
+
+        if ranking:
+            _cache['ranking'] = ranking
+            _cache['expires'] = now + CACHE_TTL
+            best = ranking[0]
+            logger.info(f"Best speedtest server: {best.get('sponsor')} ({best['id']}) {best['latency']} ms")
+        return ranking
+
+
+def select_best_server(fetch_servers) -> Optional[str]:
+    """Return the id of the lowest-latency server, or None to let the CLI choose."""
+    ranking = get_ranking(fetch_servers)
+    return ranking[0]['id'] if ranking else None
+
+
+def invalidate():
+    """Drop the cached ranking (e.g. after a test against the best server failed)."""
+    with _lock:
+        _cache['ranking'] = []
+        _cache['expires'] = 0.0
@@ -8,8 +8,16 @@ import json
 import logging
 import shutil
 
+import server_selector
+import bufferbloat_service
+import subprocess_runner
+from subprocess_runner import run_sync, SubprocessCancelled
+
 logger = logging.getLogger(__name__)
 
+# Maximum duration of a single speed test (seconds)
+SPEEDTEST_TIMEOUT = 120
+
 
 def _has_official_speedtest() -> bool:
     """
@@ -23,12 +31,7 @@ def _has_official_speedtest() -> bool:
         return False
 
     try:
-        result = subprocess.run(
-            ['speedtest', '--version'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        result = run_sync(['speedtest', '--version'], timeout=10)
         output = (result.stdout + result.stderr).lower()
         # Official Ookla CLI contains "speedtest by ookla" or "ookla"
         if 'ookla' in output:
@@ -46,18 +49,25 @@ def _has_official_speedtest() -> bool:
         return False
 
 
-def get_servers() -> list:
+def get_servers(probe: bool = False) -> list:
     """
     Get a list of available speedtest servers.
     Returns a list of server dicts with id, sponsor (or name), name (city), country, d (distance).
     Tries official Ookla CLI first, falls back to Python speedtest-cli.
+    With probe=True (official CLI only) the list is ordered by measured latency
+    and each server gets a 'latency' key (ms); unreachable servers go last.
     """
     try:
         logger.info("Fetching speedtest server list...")
 
         # Try official Ookla CLI first
         if _has_official_speedtest():
-            return _get_servers_official()
+            servers = _get_servers_official()
+            if probe:
+                ranking = server_selector.get_ranking(lambda: servers, force=True)
+                ranked_ids = {s['id'] for s in ranking}
+                servers = ranking + [s for s in servers if s['id'] not in ranked_ids]
+            return servers
         else:
             return _get_servers_fallback()
 
@@ -76,11 +86,9 @@ def _get_servers_official() -> list:
     try:
         logger.info("Using official Ookla Speedtest CLI for server list...")
 
-        result = subprocess.run(
+        result = run_sync(
             ['speedtest', '--servers', '--format=json', '--accept-license', '--accept-gdpr'],
-            capture_output=True,
-            text=True,
-            timeout=30
+            timeout=30,
         )
 
         if result.returncode != 0:
@@ -93,12 +101,16 @@ def _get_servers_official() -> list:
         # Parse the servers array from official CLI response
         if 'servers' in data:
             for server in data['servers']:
+                host = server.get('host', '')
+                if host and ':' not in host and server.get('port'):
+                    host = f"{host}:{server['port']}"
                 servers.append({
                     'id': str(server.get('id', '')),
                     'sponsor': server.get('sponsor', server.get('name', 'Unknown')),
                     'name': server.get('location', server.get('name', '')),
                     'country': server.get('country', ''),
                     'd': server.get('distance'),
+                    'host': host,
                 })
 
         # Sort by distance (closest first), limit to top 30
@@ -123,12 +135,7 @@ def _get_servers_fallback() -> list:
         cli_cmd = _get_speedtest_cli_cmd()
         logger.info(f"Using {cli_cmd} (Python) for server list...")
 
-        result = subprocess.run(
-            [cli_cmd, '--list'],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        result = run_sync([cli_cmd, '--list'], timeout=30)
 
         if result.returncode != 0:
             logger.error(f"speedtest-cli --list error: {result.stderr}")
@@ -194,10 +201,18 @@ def _get_servers_fallback() -> list:
         raise
 
 
-def run_speed_test(server_id: str = None) -> dict:
+def run_speed_test(server_id: str = None, on_progress=None, bufferbloat: bool = False,
+                   wan_target: str = None, cancel_event=None) -> dict:
     """
     Run a speed test using official Ookla Speedtest CLI with fallback to Python speedtest-cli.
-    Optionally specify a server_id to test against a specific server.
+    Optionally specify a server_id to test against a specific server; otherwise the
+    lowest-latency server is used, and if it fails the official CLI is retried with
+    its own server choice before falling back.
+    on_progress, if given, is called with progress dicts while the official CLI runs
+    (see _parse_progress_event). With bufferbloat=True latency is probed during the
+    download/upload phases (official CLI only, see bufferbloat_service).
+    Setting cancel_event (a threading.Event) kills the running CLI; the test
+    then fails without trying the fallback.
     Returns parsed results with keys:
     - download_speed (Mbps)
     - upload_speed (Mbps)
@@ -215,74 +230,180 @@ def run_speed_test(server_id: str = None) -> dict:
 
         # Try official Ookla CLI first
         if _has_official_speedtest():
-            return _run_speed_test_official(server_id)
+            if server_id:
+                return _run_speed_test_official(server_id, on_progress, bufferbloat, wan_target, cancel_event)
+            best_id = server_selector.select_best_server(_get_servers_official)
+            try:
+                return _run_speed_test_official(best_id, on_progress, bufferbloat, wan_target, cancel_event)
+            except Exception as e:
+                server_selector.invalidate()
+                if best_id is None or (cancel_event is not None and cancel_event.is_set()):
+                    raise
+                # The chosen server may be down: let the CLI pick one itself
+                # before giving up on it for the Python fallback
+                logger.warning(f"Speed test against server {best_id} failed ({e}), "
+                               f"retrying with the CLI's own server choice")
+                return _run_speed_test_official(None, on_progress, bufferbloat, wan_target, cancel_event)
         else:
-            return _run_speed_test_fallback(server_id)
+            return _run_speed_test_fallback(server_id, cancel_event)
 
     except Exception as e:
+        if cancel_event is not None and cancel_event.is_set():
+            raise
         logger.error(f"Speed test error: {e}")
         # Try fallback if primary fails
         try:
-            return _run_speed_test_fallback(server_id)
+            return _run_speed_test_fallback(server_id, cancel_event)
         except Exception as e2:
             logger.error(f"Fallback speed test also failed: {e2}")
             raise
 
 
-def _run_speed_test_official(server_id: str = None) -> dict:
-    """Run speed test using official Ookla Speedtest CLI."""
-    try:
-        logger.info("Using official Ookla Speedtest CLI...")
-
-        cmd = ['speedtest', '--format=json', '--accept-license', '--accept-gdpr']
-        if server_id:
-            cmd.extend(['--server-id', str(server_id)])
-
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-
-        if result.returncode != 0:
-            logger.error(f"Official speedtest error: {result.stderr}")
-            raise Exception(f"Official speedtest failed: {result.stderr}")
+def _run_speed_test_official(server_id: str = None, on_progress=None, bufferbloat: bool = False,
+                             wan_target: str = None, cancel_event=None) -> dict:
+    """Run speed test using official Ookla Speedtest CLI (blocking wrapper for threads)."""
+    return subprocess_runner.call_sync(_run_speed_test_official_async(
+        server_id, on_progress, bufferbloat, wan_target, cancel_event))
 
-        raw = json.loads(result.stdout)
 
-        # Convert bytes/sec to Mbps (multiply by 8 / 1_000_000)
-        download_bandwidth = raw.get('download', {}).get('bandwidth', 0)
-        upload_bandwidth = raw.get('upload', {}).get('bandwidth', 0)
+async def _run_speed_test_official_async(server_id: str = None, on_progress=None,
+                                         bufferbloat: bool = False, wan_target: str = None,
+                                         cancel_event=None) -> dict:
+    """
+    Run speed test using official Ookla Speedtest CLI as an async subprocess.
+    The CLI emits one JSON object per line (--format=jsonl --progress=yes);
+    ping/download/upload lines are forwarded to on_progress and the final
+    'result' line is parsed into the usual result dict.
+    With bufferbloat=True a LatencyProbe runs alongside the test and its
+    phase follows the CLI's progress lines; it probes the default gateway
+    and wan_target (default 1.1.1.1).
+    """
+    logger.info("Using official Ookla Speedtest CLI...")
 
-        download_mbps = round(download_bandwidth * 8 / 1_000_000, 2)
-        upload_mbps = round(upload_bandwidth * 8 / 1_000_000, 2)
+    cmd = ['speedtest', '--format=jsonl', '--progress=yes', '--accept-license', '--accept-gdpr']
+    if server_id:
+        cmd.extend(['--server-id', str(server_id)])
 
-        parsed = {
-            'download_speed': download_mbps,
-            'upload_speed': upload_mbps,
-            'ping': round(raw.get('ping', {}).get('latency', 0), 2),
-            'jitter': round(raw.get('ping', {}).get('jitter', 0), 2),
-            'server_name': raw.get('server', {}).get('name', 'Unknown'),
-            'server_id': str(raw.get('server', {}).get('id', '')),
-            'server_location': f"{raw.get('server', {}).get('name', '')}, {raw.get('server', {}).get('country', '')}",
-            'isp': raw.get('isp', 'Unknown'),
-            'external_ip': raw.get('interface', {}).get('externalIp', ''),
-            'raw_data': raw,
-        }
+    raw = None
+    errors = []
+    probe = None
 
-        logger.info(f"Speed test completed (official): DL={parsed['download_speed']}Mbps UL={parsed['upload_speed']}Mbps Ping={parsed['ping']}ms")
-        return parsed
+    def on_line(line):
+        nonlocal raw
+        line = line.strip()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            return
+
+        msg_type = message.get('type')
+        if probe is not None:
+            probe.phase = msg_type if msg_type in ('download', 'upload') else 'idle'
+
+        if msg_type == 'result':
+            raw = message
+        elif msg_type == 'log' and message.get('level') == 'error':
+            errors.append(message.get('message', ''))
+        elif on_progress is not None:
+            event = _parse_progress_event(message)
+            if event:
+                on_progress(event)
+
+    if bufferbloat:
+        probe = bufferbloat_service.LatencyProbe(bufferbloat_service.default_targets(wan_target))
+        await probe.start()
 
+    try:
+        result = await subprocess_runner.run(cmd, timeout=SPEEDTEST_TIMEOUT,
+                                             cancel_event=cancel_event, on_line=on_line)
     except subprocess.TimeoutExpired:
         logger.error("Official speed test timed out")
         raise Exception("El test de velocidad ha expirado (timeout)")
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse official speedtest output: {e}")
-        raise Exception("Error al procesar los resultados del test")
+    except SubprocessCancelled:
+        logger.info("Speed test cancelled")
+        raise Exception("Test de velocidad cancelado")
     except FileNotFoundError:
         logger.error("Official speedtest not found")
         raise
+    finally:
+        probe_summary = await probe.stop() if probe is not None else None
+
+    if result.returncode != 0 or raw is None:
+        detail = '; '.join(errors) or result.stderr.strip()
+        logger.error(f"Official speedtest error: {detail}")
+        raise Exception(f"Official speedtest failed: {detail}")
+
+    parsed = _parse_official_result(raw)
+    if probe_summary is not None:
+        parsed.update(bufferbloat_service.build_report(probe_summary))
+        parsed['raw_data'] = {**raw, 'bufferbloat': probe_summary}
+        logger.info(f"Bufferbloat grade: {parsed['bufferbloat_grade']} (idle {parsed['idle_latency']} ms, "
+                    f"DL p90 {parsed['download_latency_p90']} ms, UL p90 {parsed['upload_latency_p90']} ms)")
+    logger.info(f"Speed test completed (official): DL={parsed['download_speed']}Mbps UL={parsed['upload_speed']}Mbps Ping={parsed['ping']}ms")
+    return parsed
+
+
+def _parse_progress_event(message: dict) -> dict:
+    """
+    Convert an Ookla jsonl progress line into a compact progress event:
+    {'phase': 'start'|'ping'|'download'|'upload', 'progress': 0..1, ...}
+    Returns None for lines that are not progress updates.
+    """
+    msg_type = message.get('type')
+
+    if msg_type == 'testStart':
+        server = message.get('server', {})
+        return {
+            'phase': 'start',
+            'progress': 0,
+            'server_name': server.get('name', ''),
+            'server_location': f"{server.get('location', '')}, {server.get('country', '')}",
+            'isp': message.get('isp', ''),
+        }
+
+    if msg_type == 'ping':
+        ping = message.get('ping', {})
+        return {
+            'phase': 'ping',
+            'progress': ping.get('progress', 0),
+            'ping': round(ping.get('latency', 0), 2),
+            'jitter': round(ping.get('jitter', 0), 2),
+        }
+
+    if msg_type in ('download', 'upload'):
+        data = message.get(msg_type, {})
+        return {
+            'phase': msg_type,
+            'progress': data.get('progress', 0),
+            'speed': round(data.get('bandwidth', 0) * 8 / 1_000_000, 2),
+        }
+
+    return None
+
+
+def _parse_official_result(raw: dict) -> dict:
+    """Convert the official CLI result object into the NetTools result dict."""
+    # Convert bytes/sec to Mbps (multiply by 8 / 1_000_000)
+    download_bandwidth = raw.get('download', {}).get('bandwidth', 0)
+    upload_bandwidth = raw.get('upload', {}).get('bandwidth', 0)
+
+    download_mbps = round(download_bandwidth * 8 / 1_000_000, 2)
+    upload_mbps = round(upload_bandwidth * 8 / 1_000_000, 2)
+
+    return {
+        'download_speed': download_mbps,
+        'upload_speed': upload_mbps,
+        'ping': round(raw.get('ping', {}).get('latency', 0), 2),
+        'jitter': round(raw.get('ping', {}).get('jitter', 0), 2),
+        'server_name': raw.get('server', {}).get('name', 'Unknown'),
+        'server_id': str(raw.get('server', {}).get('id', '')),
+        'server_location': f"{raw.get('server', {}).get('name', '')}, {raw.get('server', {}).get('country', '')}",
+        'isp': raw.get('isp', 'Unknown'),
+        'external_ip': raw.get('interface', {}).get('externalIp', ''),
+        'raw_data': raw,
+    }
 
 
 def _get_speedtest_cli_cmd() -> str:
@@ -296,7 +417,7 @@ def _get_speedtest_cli_cmd() -> str:
     return 'speedtest-cli'  # default, let it fail with FileNotFoundError
 
 
-def _run_speed_test_fallback(server_id: str = None) -> dict:
+def _run_speed_test_fallback(server_id: str = None, cancel_event=None) -> dict:
     """Run speed test using Python speedtest-cli as fallback."""
     try:
         cli_cmd = _get_speedtest_cli_cmd()
@@ -306,12 +427,7 @@ def _run_speed_test_fallback(server_id: str = None) -> dict:
         if server_id:
             cmd.extend(['--server', str(server_id)])
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
+        result = run_sync(cmd, timeout=SPEEDTEST_TIMEOUT, cancel_event=cancel_event)
 
         if result.returncode != 0:
             logger.error(f"speedtest-cli error: {result.stderr}")
@@ -345,6 +461,8 @@ def _run_speed_test_fallback(server_id: str = None) -> dict:
     except FileNotFoundError:
         logger.error("speedtest-cli not found")
         raise Exception("speedtest-cli no esta instalado")
+    except SubprocessCancelled:
+        raise Exception("Test de velocidad cancelado")
     except Exception as e:
         logger.error(f"Fallback speed test error: {e}")
         raise
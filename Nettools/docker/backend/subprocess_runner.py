@@ -0,0 +1,202 @@
+"""
+NetTools - Async Subprocess Runner
+Single layer for every CLI tool the services call (ping, arp-scan, nmap,
+traceroute, dig, speedtest...), built on asyncio.create_subprocess_exec.
+
+- Output is read line by line (optional on_line callback for live parsing)
+- Hard timeouts kill the whole process group, not just the direct child
+- A global semaphore caps the number of concurrent child processes
+- A threading.Event (cancel_event) or task cancellation kills the process
+
+Once the app's event loop is attached (see attach), every process runs on it,
+so the semaphore really is global; sync callers in worker threads use
+run_sync(), which hands the coroutine over to that loop and waits.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT = int(os.environ.get('NETTOOLS_MAX_SUBPROCESSES', '32'))
+CANCEL_POLL_INTERVAL = 0.2
+
+_loop = None
+_semaphore = None
+
+
+class SubprocessCancelled(Exception):
+    """The process was killed because its cancel_event was set."""
+
+
+def attach(loop: asyncio.AbstractEventLoop):
+    """Run all subprocesses on `loop` (called from the app lifespan)."""
+    global _loop, _semaphore
+    _loop = loop
+    _semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+
+
+def detach():
+    global _loop, _semaphore
+    _loop = None
+    _semaphore = None
+
+
+async def run(cmd: list, timeout: float, cancel_event: threading.Event = None,
+              on_line=None, keep_stdout: bool = True) -> subprocess.CompletedProcess:
+    """
+    Run cmd and return a subprocess.CompletedProcess with text stdout/stderr.
+
+    Args:
+        cmd: argument list (no shell)
+        timeout: seconds before the process group is killed and
+                 subprocess.TimeoutExpired is raised
+        cancel_event: optional threading.Event; setting it kills the process
+                      and raises SubprocessCancelled
+        on_line: optional callback called with each stdout line (no newline)
+                 as soon as it is read
+        keep_stdout: False to not buffer stdout (result.stdout is ''), for
+                     large outputs fully consumed by on_line
+
+    Raises FileNotFoundError if the executable does not exist, like subprocess.run.
+    """
+    semaphore = _semaphore if asyncio.get_running_loop() is _loop else None
+    if semaphore is None:
+        return await _run(cmd, timeout, cancel_event, on_line, keep_stdout)
+    async with semaphore:
+        return await _run(cmd, timeout, cancel_event, on_line, keep_stdout)
+
+
+async def _run(cmd, timeout, cancel_event, on_line, keep_stdout) -> subprocess.CompletedProcess:
+    """_exec() plus per-tool duration and failure metrics."""
+    tool = os.path.basename(cmd[0])
+    started = time.perf_counter()
+    reason = None
+    try:
+        result = await _exec(cmd, timeout, cancel_event, on_line, keep_stdout)
+        if result.returncode != 0:
+            reason = 'exit'
+        return result
+    except subprocess.TimeoutExpired:
+        reason = 'timeout'
+        raise
+    except SubprocessCancelled:
+        reason = 'cancelled'
+        raise
+    except FileNotFoundError:
+        reason = 'not_found'
+        raise
+    except asyncio.CancelledError:
+        reason = 'cancelled'
+        raise
+    except Exception:
+        reason = 'error'
+        raise
+    finally:
+        metrics.subprocess_duration.labels(tool).observe(time.perf_counter() - started)
+        if reason is not None:
+            metrics.subprocess_failures.labels(tool, reason).inc()
+
+
+async def _exec(cmd, timeout, cancel_event, on_line, keep_stdout) -> subprocess.CompletedProcess:
+    if cancel_event is not None and cancel_event.is_set():
+        raise SubprocessCancelled(cmd[0])
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,  # own process group, so children die with it
+    )
+
+    stdout_lines = []
+
+    async def read_stdout():
+        async for raw in proc.stdout:
+            line = raw.decode(errors='replace')
+            if keep_stdout:
+                stdout_lines.append(line)
+            if on_line is not None:
+                try:
+                    on_line(line.rstrip('\r\n'))
+                except Exception as e:
+                    logger.warning(f"{cmd[0]}: output callback failed: {e}")
+
+    async def communicate():
+        _, stderr = await asyncio.gather(read_stdout(), proc.stderr.read())
+        await proc.wait()
+        return stderr
+
+    watcher = None
+    if cancel_event is not None:
+        watcher = asyncio.create_task(_kill_on_cancel(proc, cancel_event))
+
+    try:
+        stderr = await asyncio.wait_for(communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{cmd[0]} timed out after {timeout}s, killing process group")
+        raise subprocess.TimeoutExpired(cmd, timeout, output=''.join(stdout_lines))
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if proc.returncode is None:
+            # Timeout or task cancellation (e.g. HTTP client disconnected)
+            _kill_group(proc)
+            await proc.wait()
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise SubprocessCancelled(cmd[0])
+
+    return subprocess.CompletedProcess(
+        cmd, proc.returncode, ''.join(stdout_lines), stderr.decode(errors='replace')
+    )
+
+
+async def _kill_on_cancel(proc, cancel_event: threading.Event):
+    while not cancel_event.is_set():
+        await asyncio.sleep(CANCEL_POLL_INTERVAL)
+    if proc.returncode is None:
+        logger.info(f"Cancelling process {proc.pid}")
+        _kill_group(proc)
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def call_sync(coro):
+    """
+    Run a coroutine from a (non event loop) thread and return its result.
+    Uses the attached app loop when available, otherwise a private loop.
+    """
+    loop = _loop
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return asyncio.run(coro)
+
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("call_sync() would block the event loop; await the coroutine instead")
+
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def run_sync(cmd: list, timeout: float, cancel_event: threading.Event = None,
+             on_line=None, keep_stdout: bool = True) -> subprocess.CompletedProcess:
+    """Blocking variant of run() for service code running in worker threads."""
+    return call_sync(run(cmd, timeout, cancel_event=cancel_event, on_line=on_line,
+                         keep_stdout=keep_stdout))
@@ -8,10 +8,13 @@ import re
 import logging
 import socket
 
+from subprocess_runner import run_sync, SubprocessCancelled
+
 logger = logging.getLogger(__name__)
 
 
-def run_traceroute(target: str, max_hops: int = 30, timeout: int = 5) -> dict:
+def run_traceroute(target: str, max_hops: int = 30, timeout: int = 5,
+                   cancel_event=None, on_hop=None) -> dict:
     """
     Run a traceroute to the specified target.
     Returns hop-by-hop data with latencies.
@@ -20,6 +23,9 @@ def run_traceroute(target: str, max_hops: int = 30, timeout: int = 5) -> dict:
         target: IP address or hostname to trace
         max_hops: Maximum number of hops (default 30)
         timeout: Timeout per hop in seconds (default 5)
+        cancel_event: optional threading.Event that kills the trace when set
+        on_hop: optional callback called with each hop dict as soon as
+                traceroute prints it
 
     Returns:
         dict with keys:
@@ -58,18 +64,23 @@ def run_traceroute(target: str, max_hops: int = 30, timeout: int = 5) -> dict:
             target
         ]
 
-        result = subprocess.run(
+        def on_line(line):
+            if on_hop is not None:
+                for hop in _parse_traceroute_output(line):
+                    on_hop(hop)
+
+        result = run_sync(
             cmd,
-            capture_output=True,
-            text=True,
-            timeout=max_hops * timeout + 10
+            timeout=max_hops * timeout + 10,
+            cancel_event=cancel_event,
+            on_line=on_line,
         )
 
         # Parse output even if return code is non-zero (partial traces are valid)
         output = result.stdout
         if not output and result.stderr:
             # Try tracepath as fallback
-            return _run_tracepath(target, max_hops)
+            return _run_tracepath(target, max_hops, cancel_event)
 
         hops = _parse_traceroute_output(output)
 
@@ -99,7 +110,10 @@ def run_traceroute(target: str, max_hops: int = 30, timeout: int = 5) -> dict:
     except FileNotFoundError:
         # traceroute not installed, try tracepath
         logger.warning("traceroute not found, trying tracepath...")
-        return _run_tracepath(target, max_hops)
+        return _run_tracepath(target, max_hops, cancel_event)
+    except SubprocessCancelled:
+        logger.info(f"Traceroute to {target} cancelled")
+        raise
     except ValueError as e:
         logger.error(f"Invalid target: {e}")
         raise
@@ -108,17 +122,12 @@ def run_traceroute(target: str, max_hops: int = 30, timeout: int = 5) -> dict:
         raise
 
 
-def _run_tracepath(target: str, max_hops: int = 30) -> dict:
+def _run_tracepath(target: str, max_hops: int = 30, cancel_event=None) -> dict:
     """Fallback using tracepath (usually pre-installed on Ubuntu)."""
     try:
         cmd = ['tracepath', '-n', '-m', str(max_hops), target]
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
+        result = run_sync(cmd, timeout=120, cancel_event=cancel_event)
 
         output = result.stdout
         hops = _parse_tracepath_output(output)
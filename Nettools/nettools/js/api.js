@@ -3,6 +3,10 @@
    ========================================= */
 
 const API_BASE = '/api';
+// Job streams that drop are reconnected every JOB_RETRY_MS; the wait gives up
+// after JOB_MAX_RETRIES failed status checks in a row (server unreachable)
+const JOB_RETRY_MS = 2000;
+const JOB_MAX_RETRIES = 30;
 
 const API = {
     // --- Helper ---
@@ -17,7 +21,9 @@ const API = {
             const response = await fetch(url, config);
             if (!response.ok) {
                 const error = await response.json().catch(() => ({ detail: 'Error desconocido' }));
-                throw new Error(error.detail || `HTTP ${response.status}`);
+                const err = new Error(error.detail || `HTTP ${response.status}`);
+                err.status = response.status;
+                throw err;
             }
             return await response.json();
         } catch (err) {
@@ -28,6 +34,27 @@ const API = {
         }
     },
 
+    // --- Dashboard bootstrap ---
+    dashboard: {
+        _pending: null,
+        _requestedAt: 0,
+
+        /**
+         * Initial data of every page in one request (one database snapshot):
+         * settings, speedtest {latest, stats, results}, devices (delta sync
+         * format), device_history and jobs. Pages initialising within a few
+         * seconds of each other share the same response.
+         */
+        async get() {
+            if (!this._pending || Date.now() - this._requestedAt > 5000) {
+                this._requestedAt = Date.now();
+                this._pending = API.request('/dashboard');
+                this._pending.catch(() => { this._pending = null; });
+            }
+            return this._pending;
+        }
+    },
+
     // --- Speed Test ---
     speedtest: {
         async run(serverId = null) {
@@ -38,6 +65,34 @@ const API = {
             });
         },
 
+        /**
+         * Run a speed test streaming live progress over Server-Sent Events.
+         * Resolves with the saved result; onProgress receives
+         * { phase, progress, speed?, ping?, jitter? } updates.
+         */
+        stream(serverId = null, onProgress = () => {}) {
+            return new Promise((resolve, reject) => {
+                const query = serverId ? `?server_id=${encodeURIComponent(serverId)}` : '';
+                const source = new EventSource(`${API_BASE}/speedtest/stream${query}`);
+                let finished = false;
+
+                source.addEventListener('progress', (e) => onProgress(JSON.parse(e.data)));
+                source.addEventListener('result', (e) => {
+                    finished = true;
+                    source.close();
+                    resolve(JSON.parse(e.data));
+                });
+                source.addEventListener('error', (e) => {
+                    if (finished) return;
+                    finished = true;
+                    source.close();
+                    // Server-sent 'error' events carry data; connection errors do not
+                    const detail = e.data ? JSON.parse(e.data).detail : 'No se pudo conectar con el servidor';
+                    reject(new Error(detail));
+                });
+            });
+        },
+
         async getServers() {
             return API.request('/speedtest/servers');
         },
@@ -68,6 +123,46 @@ const API = {
         }
     },
 
+    // --- LAN Throughput Test ---
+    lan: {
+        /** Download `size` bytes, reporting received bytes through onBytes. */
+        async download(size, onBytes = () => {}) {
+            const response = await fetch(`${API_BASE}/lan/download?size=${size}`, { cache: 'no-store' });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const reader = response.body.getReader();
+            let received = 0;
+            for (;;) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                received += value.byteLength;
+                onBytes(value.byteLength);
+            }
+            return received;
+        },
+
+        async upload(blob) {
+            const response = await fetch(`${API_BASE}/lan/upload`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: blob,
+            });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            return response.json();
+        },
+
+        async saveResult(data) {
+            return API.request('/lan/results', {
+                method: 'POST',
+                body: JSON.stringify(data),
+            });
+        },
+
+        async getResults(params = {}) {
+            const query = new URLSearchParams({ ...params, test_type: 'lan' }).toString();
+            return API.request(`/speedtest/results?${query}`);
+        }
+    },
+
     // --- Devices ---
     devices: {
         async getAll(params = {}) {
@@ -75,6 +170,16 @@ const API = {
             return API.request(`/devices${query ? '?' + query : ''}`);
         },
 
+        /**
+         * Delta sync: { version, full, devices, deleted } with the devices
+         * changed after `since` and the ids deleted since then (0 = all).
+         */
+        async getChanges(since = 0, fields = null) {
+            const params = { since };
+            if (fields) params.fields = fields.join(',');
+            return API.devices.getAll(params);
+        },
+
         async get(id) {
             return API.request(`/devices/${id}`);
         },
@@ -97,8 +202,8 @@ const API = {
             return API.request(`/devices/${id}`, { method: 'DELETE' });
         },
 
-        async scan() {
-            return API.request('/devices/scan', { method: 'POST' });
+        async scan(onProgress = () => {}) {
+            return API.jobs.run('scan', {}, onProgress);
         },
 
         async getScanStatus() {
@@ -135,10 +240,7 @@ const API = {
     // --- Traceroute ---
     traceroute: {
         async run(target, maxHops = 30) {
-            return API.request('/traceroute', {
-                method: 'POST',
-                body: JSON.stringify({ target, max_hops: maxHops }),
-            });
+            return API.jobs.run('traceroute', { target, max_hops: maxHops });
         }
     },
 
@@ -179,6 +281,143 @@ const API = {
         }
     },
 
+    // --- Background jobs ---
+    jobs: {
+        async submit(type, params = {}) {
+            return API.request('/jobs', {
+                method: 'POST',
+                body: JSON.stringify({ type, params }),
+            });
+        },
+
+        async get(id) {
+            return API.request(`/jobs/${id}`);
+        },
+
+        async list() {
+            return API.request('/jobs');
+        },
+
+        async cancel(id) {
+            return API.request(`/jobs/${id}`, { method: 'DELETE' });
+        },
+
+        /**
+         * Wait for a job over Server-Sent Events.
+         * Resolves with the job result; rejects if it failed or was cancelled.
+         * A dropped stream is reconnected (the job keeps running on the
+         * server); it only rejects if the job is gone or the server stays
+         * unreachable.
+         */
+        wait(id, onProgress = () => {}) {
+            return new Promise((resolve, reject) => {
+                let source = null;
+                let finished = false;
+                let failures = 0;
+
+                const finish = (job) => {
+                    finished = true;
+                    source.close();
+                    if (job.status === 'succeeded') resolve(job.result);
+                    else reject(new Error(job.error || 'Tarea cancelada'));
+                };
+
+                const retry = () => setTimeout(() => { if (!finished) connect(); }, JOB_RETRY_MS);
+
+                const connect = () => {
+                    source = new EventSource(`${API_BASE}/jobs/${id}/events`);
+                    source.addEventListener('progress', (e) => onProgress(JSON.parse(e.data)));
+                    source.addEventListener('status', (e) => {
+                        failures = 0;
+                        const job = JSON.parse(e.data);
+                        if (['succeeded', 'failed', 'cancelled'].includes(job.status)) finish(job);
+                    });
+                    source.addEventListener('done', (e) => finish(JSON.parse(e.data)));
+                    source.addEventListener('error', () => {
+                        if (finished) return;
+                        // Connection lost: check the job, then reconnect (the
+                        // stream starts with the current state)
+                        source.close();
+                        API.jobs.get(id).then((job) => {
+                            if (finished) return;
+                            failures = 0;
+                            if (['succeeded', 'failed', 'cancelled'].includes(job.status)) finish(job);
+                            else retry();
+                        }).catch((err) => {
+                            if (finished) return;
+                            if (err.status === 404 || ++failures >= JOB_MAX_RETRIES) {
+                                finished = true;
+                                reject(err);
+                            } else {
+                                retry();
+                            }
+                        });
+                    });
+                };
+
+                connect();
+            });
+        },
+
+        /** Submit a job and wait for its result. */
+        async run(type, params = {}, onProgress = () => {}) {
+            const job = await API.jobs.submit(type, params);
+            return API.jobs.wait(job.id, onProgress);
+        }
+    },
+
+    // --- Live events (one shared EventSource per tab) ---
+    events: {
+        _source: null,
+        _handlers: {},
+        _wasOpen: false,
+
+        /**
+         * Register a handler for a push event from /api/events
+         * ('device_new', 'speedtest_saved', 'job'...). Pseudo-events:
+         * 'open' / 'close' (connection state) and 'hello' with
+         * { reconnected } (reload everything when true: events may be missed).
+         * Returns a function that removes the handler.
+         */
+        on(event, handler) {
+            if (!this._handlers[event]) {
+                this._handlers[event] = new Set();
+                if (this._source) this._listen(event);
+            }
+            this._handlers[event].add(handler);
+            this.connect();
+            return () => this._handlers[event].delete(handler);
+        },
+
+        connect() {
+            if (this._source || typeof EventSource === 'undefined') return;
+            this._source = new EventSource(`${API_BASE}/events`);
+            this._source.addEventListener('open', () => this._emit('open', {}));
+            this._source.addEventListener('error', () => this._emit('close', {}));
+            this._source.addEventListener('hello', (e) => {
+                const data = { ...JSON.parse(e.data), reconnected: this._wasOpen };
+                this._wasOpen = true;
+                this._emit('hello', data);
+            });
+            Object.keys(this._handlers).forEach((event) => this._listen(event));
+        },
+
+        _listen(event) {
+            if (['open', 'close', 'hello'].includes(event)) return;
+            this._source.addEventListener(event, (e) => this._emit(event, JSON.parse(e.data)));
+        },
+
+        _emit(event, data) {
+            (this._handlers[event] || []).forEach((handler) => {
+                try {
+                    handler(data);
+                } catch (err) {
+                    console.error(`Live event handler failed (${event}):`, err);
+                }
+            });
+        }
+    },
+
     // --- Export ---
     async exportData() {
         return API.request('/export');
@@ -346,9 +346,15 @@ const ConnectionStatus = {
         }
     },
 
-    startPolling() {
+    start() {
         this.check();
-        setInterval(() => this.check(), 30000);
+        if (typeof EventSource === 'undefined') {
+            setInterval(() => this.check(), 30000);
+            return;
+        }
+        // The live event stream doubles as the connection indicator
+        API.events.on('open', () => this.setOnline(true));
+        API.events.on('close', () => this.setOnline(false));
     }
 };
 
@@ -385,5 +391,5 @@ document.addEventListener('DOMContentLoaded', () => {
     loadSavedColors();
     Sidebar.init();
     Router.init();
-    ConnectionStatus.startPolling();
+    ConnectionStatus.start();
 });
@@ -163,7 +163,7 @@ const NetCheckPage = {
 
     async pingAllDevices() {
         try {
-            const devices = await API.devices.getAll();
+            const devices = await API.devices.getAll({ fields: 'ip_address' });
             const savedDevices = devices.filter(d => d.ip_address);
             if (savedDevices.length === 0) {
                 Toast.warning('No hay dispositivos guardados para hacer ping');
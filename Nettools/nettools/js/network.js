@@ -11,85 +11,130 @@ const NetworkPage = {
     initialized: false,
     historyChart: null,
     historyRange: '24h',
-    _refreshInterval: null,
-    _lastScanCheck: 0,
+    _subscriptions: [],
+    _version: 0,
 
     async init() {
         if (!this.initialized) {
             this.bindEvents();
             this.initialized = true;
+            await this.loadFromDashboard();
+        } else {
+            await this.loadDevices();
+            this.loadDeviceHistory();
+            this.loadAutoScanStatus();
         }
-        await this.loadDevices();
-        this.loadDeviceHistory();
-        this.loadAutoScanStatus();
         this.startAutoRefresh();
     },
 
+    // First load: devices, history, settings and scan status in one request
+    async loadFromDashboard() {
+        try {
+            const dashboard = await API.dashboard.get();
+            this.devices = dashboard.devices.devices;
+            this._version = dashboard.devices.version;
+            this._refreshView();
+            this.renderDeviceHistory(dashboard.device_history);
+            this.renderAutoScanStatus(dashboard.settings, dashboard.jobs.scan);
+        } catch {
+            await this.loadDevices();
+            this.loadDeviceHistory();
+            this.loadAutoScanStatus();
+        }
+    },
+
     destroy() {
         this.stopAutoRefresh();
     },
 
     startAutoRefresh() {
         this.stopAutoRefresh();
-        // Poll every 30 seconds to check for new data from background scans
-        this._refreshInterval = setInterval(() => this._autoRefreshTick(), 30000);
+        // Live updates pushed by the backend (/api/events) instead of polling
+        const on = (event, handler) => this._subscriptions.push(API.events.on(event, handler));
+        on('device_new', (device) => this._applyDevice(device));
+        on('device_online', (device) => this._applyDevice(device));
+        on('device_updated', (device) => this._applyDevice(device));
+        on('device_offline', ({ ids }) => {
+            const offline = new Set(ids);
+            this.devices.forEach(d => { if (offline.has(d.id)) d.is_online = 0; });
+            this._refreshView();
+        });
+        on('device_deleted', ({ id }) => {
+            this.devices = this.devices.filter(d => d.id !== id);
+            this._refreshView();
+        });
+        on('devices_cleared', () => {
+            this.devices = [];
+            this._refreshView();
+        });
+        on('scan_complete', () => this.loadDeviceHistory());
+        on('job', (job) => { if (job.type === 'scan') this.loadAutoScanStatus(); });
+        on('settings_updated', () => this.loadAutoScanStatus());
+        on('hello', ({ reconnected }) => {
+            // Events may have been missed while disconnected
+            if (reconnected) {
+                this.syncDevices();
+                this.loadDeviceHistory();
+                this.loadAutoScanStatus();
+            }
+        });
     },
 
     stopAutoRefresh() {
-        if (this._refreshInterval) {
-            clearInterval(this._refreshInterval);
-            this._refreshInterval = null;
-        }
+        this._subscriptions.forEach(unsubscribe => unsubscribe());
+        this._subscriptions = [];
     },
 
-    async _autoRefreshTick() {
-        // Only refresh if this page is currently visible
-        if (typeof Router !== 'undefined' && Router.currentPage !== 'network') return;
+    _applyDevice(device) {
+        this._mergeDevice(device);
+        this._refreshView();
+    },
+
+    _mergeDevice(device) {
+        const index = this.devices.findIndex(d => d.id === device.id);
+        if (index >= 0) this.devices[index] = device;
+        else this.devices.push(device);
+    },
 
+    _refreshView() {
+        this.updateStats();
+        this.renderDevices();
+    },
+
+    async loadAutoScanStatus() {
         try {
-            // Reload device list and history to pick up background scan results
-            const devices = await API.devices.getAll();
-            const changed = JSON.stringify(devices.map(d => d.id + ':' + d.is_online))
-                !== JSON.stringify(this.devices.map(d => d.id + ':' + d.is_online));
-            if (changed) {
-                this.devices = devices;
-                this.updateStats();
-                this.renderDevices();
-                this.loadDeviceHistory();
-            }
-            this.loadAutoScanStatus();
+            const [settings, scanStatus] = await Promise.all([
+                API.settings.getAll(),
+                API.devices.getScanStatus(),
+            ]);
+            this.renderAutoScanStatus(settings, scanStatus);
         } catch {
-            // Backend not available, skip
+            this.renderAutoScanStatus(null, null);
         }
     },
 
-    async loadAutoScanStatus() {
+    renderAutoScanStatus(settings, scanStatus) {
         const indicator = document.getElementById('autoStatusIndicator');
         const text = document.getElementById('autoStatusText');
         if (!indicator || !text) return;
 
-        try {
-            const settings = await API.settings.getAll();
-            const scanStatus = await API.devices.getScanStatus();
-
-            if (scanStatus && scanStatus.in_progress) {
-                indicator.className = 'auto-status-indicator active';
-                indicator.querySelector('i').className = 'ri-radar-line spinning';
-                text.textContent = 'Escaneo en curso...';
-            } else if (settings.auto_network_scan) {
-                const freq = settings.network_scan_frequency || '15';
-                indicator.className = 'auto-status-indicator active';
-                indicator.querySelector('i').className = 'ri-refresh-line';
-                text.textContent = `Auto-escaneo (cada ${freq} min)`;
-            } else {
-                indicator.className = 'auto-status-indicator disabled';
-                indicator.querySelector('i').className = 'ri-stop-circle-line';
-                text.textContent = 'Auto-escaneo off';
-            }
-        } catch {
+        if (!settings) {
             indicator.className = 'auto-status-indicator disabled';
             indicator.querySelector('i').className = 'ri-wifi-off-line';
             text.textContent = 'Sin backend';
+        } else if (scanStatus && scanStatus.in_progress) {
+            indicator.className = 'auto-status-indicator active';
+            indicator.querySelector('i').className = 'ri-radar-line spinning';
+            text.textContent = 'Escaneo en curso...';
+        } else if (settings.auto_network_scan) {
+            const freq = settings.network_scan_frequency || '15';
+            indicator.className = 'auto-status-indicator active';
+            indicator.querySelector('i').className = 'ri-refresh-line';
+            text.textContent = `Auto-escaneo (cada ${freq} min)`;
+        } else {
+            indicator.className = 'auto-status-indicator disabled';
+            indicator.querySelector('i').className = 'ri-stop-circle-line';
+            text.textContent = 'Auto-escaneo off';
         }
     },
 
@@ -142,7 +187,9 @@ const NetworkPage = {
     // --- Load Devices ---
     async loadDevices() {
         try {
-            this.devices = await API.devices.getAll();
+            const sync = await API.devices.getChanges(0);
+            this.devices = sync.devices;
+            this._version = sync.version;
         } catch {
             // Demo data
             this.devices = this.getDemoDevices();
@@ -151,6 +198,25 @@ const NetworkPage = {
         this.renderDevices();
     },
 
+    // Fetch only the devices changed since the last sync (e.g. after a reconnect)
+    async syncDevices() {
+        if (!this._version) return this.loadDevices();
+        try {
+            const sync = await API.devices.getChanges(this._version);
+            if (sync.full) {
+                this.devices = sync.devices;
+            } else {
+                const deleted = new Set(sync.deleted);
+                this.devices = this.devices.filter(d => !deleted.has(d.id));
+                sync.devices.forEach(device => this._mergeDevice(device));
+            }
+            this._version = sync.version;
+            this._refreshView();
+        } catch {
+            // Backend not available, keep current list
+        }
+    },
+
     updateStats() {
         const total = this.devices.length;
         const online = this.devices.filter(d => d.is_online).length;
@@ -426,14 +492,26 @@ const NetworkPage = {
         btn.innerHTML = '<i class="ri-loader-4-line" style="animation:spin 1s linear infinite"></i> Escaneando...';
 
         let pct = 0;
+        let sharded = false;
         const progressInterval = setInterval(() => {
+            if (sharded) return;
             pct = Math.min(pct + Math.random() * 8, 95);
             fill.style.width = `${pct}%`;
             text.textContent = `Escaneando red... ${Math.round(pct)}%`;
         }, 500);
 
+        // Large ranges are scanned in shards: show real progress
+        const onProgress = (event) => {
+            if (!event.shards_total || event.shards_total < 2) return;
+            sharded = true;
+            pct = event.hosts_total ? event.hosts_probed / event.hosts_total * 100 : 0;
+            fill.style.width = `${pct}%`;
+            text.textContent = `Escaneando red... ${Math.round(pct)}% ` +
+                `(${event.shards_done}/${event.shards_total} bloques, ${event.devices_found} dispositivos)`;
+        };
+
         try {
-            const result = await API.devices.scan();
+            const result = await API.devices.scan(onProgress);
             clearInterval(progressInterval);
             fill.style.width = '100%';
             text.textContent = `Escaneo completado - ${result.found || 0} dispositivos encontrados`;
@@ -635,19 +713,22 @@ const NetworkPage = {
     // ==========================================
     async loadDeviceHistory() {
         try {
-            const data = await API.devices.getHistory({ range: this.historyRange });
-            if (data && data.length > 0) {
-                this.renderHistoryChart(data);
-            } else {
-                // Backend connected but no snapshots yet — generate from current devices
-                this.renderHistoryChart(this.generateSnapshotsFromDevices());
-            }
+            this.renderDeviceHistory(await API.devices.getHistory({ range: this.historyRange }));
         } catch {
             // No backend — generate demo history from loaded devices
             this.renderHistoryChart(this.generateSnapshotsFromDevices());
         }
     },
 
+    renderDeviceHistory(data) {
+        if (data && data.length > 0) {
+            this.renderHistoryChart(data);
+        } else {
+            // Backend connected but no snapshots yet — generate from current devices
+            this.renderHistoryChart(this.generateSnapshotsFromDevices());
+        }
+    },
+
     /**
      * Build synthetic history snapshots from the current device list so the
      * chart always has something meaningful to show, even without backend
@@ -227,12 +227,21 @@ const SettingsPage = {
         if (settings.speed_test_retention) {
             document.getElementById('speedTestRetention').value = settings.speed_test_retention;
         }
+        if (settings.bufferbloat_test !== undefined) {
+            document.getElementById('bufferbloatTest').checked = settings.bufferbloat_test;
+        }
         if (settings.auto_network_scan !== undefined) {
             document.getElementById('autoNetworkScan').checked = settings.auto_network_scan;
         }
         if (settings.network_scan_frequency) {
             document.getElementById('networkScanFrequency').value = settings.network_scan_frequency;
         }
+        if (settings.presence_check_frequency !== undefined) {
+            document.getElementById('presenceCheckFrequency').value = settings.presence_check_frequency;
+        }
+        if (settings.offline_after_misses) {
+            document.getElementById('offlineAfterMisses').value = settings.offline_after_misses;
+        }
         if (settings.network_range) {
             document.getElementById('networkRange').value = settings.network_range;
         }
@@ -264,9 +273,12 @@ const SettingsPage = {
             auto_speed_test: true,
             speed_test_frequency: '60',
             speed_test_retention: '30',
+            bufferbloat_test: true,
             auto_network_scan: true,
             network_scan_frequency: '15',
-            network_range: '192.168.1.0/24',
+            presence_check_frequency: '2',
+            offline_after_misses: '3',
+            network_range: 'auto',
             notify_new_devices: true,
             telegram_enabled: false,
             telegram_bot_token: '',
@@ -280,8 +292,11 @@ const SettingsPage = {
             auto_speed_test: document.getElementById('autoSpeedTest').checked,
             speed_test_frequency: document.getElementById('speedTestFrequency').value,
             speed_test_retention: document.getElementById('speedTestRetention').value,
+            bufferbloat_test: document.getElementById('bufferbloatTest').checked,
             auto_network_scan: document.getElementById('autoNetworkScan').checked,
             network_scan_frequency: document.getElementById('networkScanFrequency').value,
+            presence_check_frequency: document.getElementById('presenceCheckFrequency').value,
+            offline_after_misses: document.getElementById('offlineAfterMisses').value,
             network_range: document.getElementById('networkRange').value,
             notify_new_devices: document.getElementById('notifyNewDevices').checked,
             telegram_enabled: document.getElementById('telegramEnabled').checked,
@@ -338,7 +353,6 @@ const SettingsPage = {
         }
         // Reset SpeedTestPage UI
         if (typeof SpeedTestPage !== 'undefined' && SpeedTestPage.chartsInitialized) {
-            SpeedTestPage._lastResultCount = 0;
             // Clear stats
             document.getElementById('bestDownload').textContent = '-- Mbps';
             document.getElementById('bestUpload').textContent = '-- Mbps';
@@ -10,9 +10,9 @@ const SpeedTestPage = {
     chartPing: null,
     chartHourly: null,
     isTesting: false,
+    isLanTesting: false,
     currentRange: '24h',
-    _refreshInterval: null,
-    _lastResultCount: 0,
+    _subscriptions: [],
 
     init() {
         if (!this.chartsInitialized) {
@@ -21,73 +21,88 @@ const SpeedTestPage = {
             this.bindEvents();
             this.loadServers();
             this.chartsInitialized = true;
+            this.loadFromDashboard();
+        } else {
+            this.loadData();
+            this.loadAutoTestStatus();
         }
-        this.loadData();
-        this.loadAutoTestStatus();
         this.startAutoRefresh();
     },
 
+    // First load: results, stats, settings and test status in one request
+    async loadFromDashboard() {
+        try {
+            const dashboard = await API.dashboard.get();
+            this.updateDashboard(dashboard.speedtest.results, dashboard.speedtest.stats);
+            this.renderAutoTestStatus(dashboard.settings, dashboard.jobs.speedtest);
+        } catch {
+            this.loadData();
+            this.loadAutoTestStatus();
+        }
+    },
+
     destroy() {
         this.stopAutoRefresh();
     },
 
     startAutoRefresh() {
         this.stopAutoRefresh();
-        // Poll every 30 seconds to detect background speed test results
-        this._refreshInterval = setInterval(() => this._autoRefreshTick(), 30000);
+        // Live updates pushed by the backend (/api/events) instead of polling
+        const on = (event, handler) => this._subscriptions.push(API.events.on(event, handler));
+        const reload = () => { if (!this.isTesting) this.loadData(); };
+        on('speedtest_saved', reload);
+        on('speedtest_deleted', reload);
+        on('speedtest_cleared', reload);
+        on('job', (job) => { if (job.type === 'speedtest') this.loadAutoTestStatus(); });
+        on('settings_updated', () => this.loadAutoTestStatus());
+        on('hello', ({ reconnected }) => {
+            // Events may have been missed while disconnected
+            if (reconnected) {
+                reload();
+                this.loadAutoTestStatus();
+            }
+        });
     },
 
     stopAutoRefresh() {
-        if (this._refreshInterval) {
-            clearInterval(this._refreshInterval);
-            this._refreshInterval = null;
-        }
+        this._subscriptions.forEach(unsubscribe => unsubscribe());
+        this._subscriptions = [];
     },
 
-    async _autoRefreshTick() {
-        // Only refresh if this page is currently visible and not mid-test
-        if (typeof Router !== 'undefined' && Router.currentPage !== 'speed') return;
-        if (this.isTesting) return;
-
+    async loadAutoTestStatus() {
         try {
-            const stats = await API.speedtest.getStats();
-            if (stats && stats.total_tests !== this._lastResultCount) {
-                this._lastResultCount = stats.total_tests;
-                this.loadData();
-            }
-            this.loadAutoTestStatus();
+            const [settings, testStatus] = await Promise.all([
+                API.settings.getAll(),
+                API.speedtest.getStatus(),
+            ]);
+            this.renderAutoTestStatus(settings, testStatus);
         } catch {
-            // Backend not available, skip
+            this.renderAutoTestStatus(null, null);
         }
     },
 
-    async loadAutoTestStatus() {
+    renderAutoTestStatus(settings, testStatus) {
         const indicator = document.getElementById('autoStatusIndicator');
         const text = document.getElementById('autoStatusText');
         if (!indicator || !text) return;
 
-        try {
-            const settings = await API.settings.getAll();
-            const testStatus = await API.speedtest.getStatus();
-
-            if (testStatus && testStatus.in_progress) {
-                indicator.className = 'auto-status-indicator active';
-                indicator.querySelector('i').className = 'ri-speed-up-line spinning';
-                text.textContent = 'Speed test en curso...';
-            } else if (settings.auto_speed_test) {
-                const freq = settings.speed_test_frequency || '60';
-                indicator.className = 'auto-status-indicator active';
-                indicator.querySelector('i').className = 'ri-refresh-line';
-                text.textContent = `Auto-test (cada ${freq} min)`;
-            } else {
-                indicator.className = 'auto-status-indicator disabled';
-                indicator.querySelector('i').className = 'ri-stop-circle-line';
-                text.textContent = 'Auto-test off';
-            }
-        } catch {
+        if (!settings) {
             indicator.className = 'auto-status-indicator disabled';
             indicator.querySelector('i').className = 'ri-wifi-off-line';
             text.textContent = 'Sin backend';
+        } else if (testStatus && testStatus.in_progress) {
+            indicator.className = 'auto-status-indicator active';
+            indicator.querySelector('i').className = 'ri-speed-up-line spinning';
+            text.textContent = 'Speed test en curso...';
+        } else if (settings.auto_speed_test) {
+            const freq = settings.speed_test_frequency || '60';
+            indicator.className = 'auto-status-indicator active';
+            indicator.querySelector('i').className = 'ri-refresh-line';
+            text.textContent = `Auto-test (cada ${freq} min)`;
+        } else {
+            indicator.className = 'auto-status-indicator disabled';
+            indicator.querySelector('i').className = 'ri-stop-circle-line';
+            text.textContent = 'Auto-test off';
         }
     },
 
@@ -98,6 +113,10 @@ const SpeedTestPage = {
 
         document.getElementById('refreshServersBtn').addEventListener('click', () => this.loadServers());
 
+        document.getElementById('startLanTestBtn').addEventListener('click', () => {
+            if (!this.isLanTesting) this.runLanTest();
+        });
+
         // Chart filters
         document.querySelectorAll('#page-speed .chart-filters .filter-btn').forEach(btn => {
             btn.addEventListener('click', () => {
@@ -353,7 +372,6 @@ const SpeedTestPage = {
             document.getElementById('bestUpload').textContent = `${Utils.formatSpeed(stats.best_upload)} Mbps`;
             document.getElementById('bestPing').textContent = `${Utils.formatPing(stats.best_ping)} ms`;
             document.getElementById('totalTests').textContent = stats.total_tests || 0;
-            this._lastResultCount = stats.total_tests || 0;
         }
 
         if (results && results.length > 0) {
@@ -367,6 +385,7 @@ const SpeedTestPage = {
             document.getElementById('liveJitter').textContent = `${Utils.formatPing(latest.jitter)} ms`;
             document.getElementById('liveServer').textContent = latest.server_name || '--';
             document.getElementById('liveISP').textContent = latest.isp || '--';
+            this.updateBufferbloat(latest);
 
             // Speed history chart
             this.chartHistory.updateSeries([
@@ -482,27 +501,20 @@ const SpeedTestPage = {
             { text: 'Finalizando...', pct: 100 },
         ];
 
-        try {
-            // Simulate phases for UI while waiting for backend
-            let phaseIdx = 0;
-            const phaseInterval = setInterval(() => {
-                if (phaseIdx < phases.length) {
-                    phase.textContent = phases[phaseIdx].text;
-                    const offset = circumference - (phases[phaseIdx].pct / 100) * circumference;
-                    progress.style.strokeDashoffset = offset;
-                    phaseIdx++;
-                }
-            }, 3000);
+        const setProgress = (pct) => {
+            progress.style.strokeDashoffset = circumference - (pct / 100) * circumference;
+        };
 
+        try {
             phase.textContent = phases[0].text;
+            setProgress(phases[0].pct);
 
             // Get selected server (if any)
             const serverSelect = document.getElementById('serverSelect');
             const serverId = serverSelect.value || null;
 
-            const result = await API.speedtest.run(serverId);
+            const result = await API.speedtest.stream(serverId, (ev) => this.onTestProgress(ev, phases, setProgress));
 
-            clearInterval(phaseInterval);
             progress.style.strokeDashoffset = 0;
             phase.textContent = 'Test completado!';
 
@@ -515,6 +527,7 @@ const SpeedTestPage = {
             document.getElementById('liveJitter').textContent = `${Utils.formatPing(result.jitter)} ms`;
             document.getElementById('liveServer').textContent = result.server_name || '--';
             document.getElementById('liveISP').textContent = result.isp || '--';
+            this.updateBufferbloat(result);
 
             Toast.success(`Test completado: ${Utils.formatSpeed(result.download_speed)} Mbps / ${Utils.formatSpeed(result.upload_speed)} Mbps`);
 
@@ -538,6 +551,104 @@ const SpeedTestPage = {
         }
     },
 
+    updateBufferbloat(result) {
+        const el = document.getElementById('liveBufferbloat');
+        if (!result.bufferbloat_grade) {
+            el.textContent = '--';
+            return;
+        }
+        el.textContent = `${result.bufferbloat_grade} (${Utils.formatPing(result.download_latency_p90)} / ${Utils.formatPing(result.upload_latency_p90)} ms)`;
+    },
+
+    // --- LAN Throughput Test ---
+    async runLanTest() {
+        const LAN_TEST_SIZE = 25 * 1024 * 1024; // bytes per stream and direction
+        const streams = parseInt(document.getElementById('lanStreamsSelect').value, 10) || 4;
+        const btn = document.getElementById('startLanTestBtn');
+        const phase = document.getElementById('lanTestPhase');
+        const dlValue = document.getElementById('lanDownloadValue');
+        const ulValue = document.getElementById('lanUploadValue');
+        const toMbps = (bytes, seconds) => seconds > 0 ? bytes * 8 / seconds / 1e6 : 0;
+
+        this.isLanTesting = true;
+        btn.disabled = true;
+        dlValue.textContent = '-- Mbps';
+        ulValue.textContent = '-- Mbps';
+
+        try {
+            // Download: all streams in parallel, aggregate bytes over wall-clock time
+            phase.textContent = 'Descarga...';
+            let dlLive = 0;
+            const dlStart = performance.now();
+            const dlCounts = await Promise.all(Array.from({ length: streams }, () =>
+                API.lan.download(LAN_TEST_SIZE, (n) => {
+                    dlLive += n;
+                    dlValue.textContent = `${Utils.formatSpeed(toMbps(dlLive, (performance.now() - dlStart) / 1000))} Mbps`;
+                })
+            ));
+            const dlElapsed = (performance.now() - dlStart) / 1000;
+            const dlBytes = dlCounts.reduce((a, b) => a + b, 0);
+            dlValue.textContent = `${Utils.formatSpeed(toMbps(dlBytes, dlElapsed))} Mbps`;
+
+            // Upload: one shared payload blob posted by every stream
+            phase.textContent = 'Subida...';
+            const payload = new Blob([new Uint8Array(LAN_TEST_SIZE)]);
+            const ulStart = performance.now();
+            await Promise.all(Array.from({ length: streams }, () => API.lan.upload(payload)));
+            const ulElapsed = (performance.now() - ulStart) / 1000;
+            const ulBytes = LAN_TEST_SIZE * streams;
+            ulValue.textContent = `${Utils.formatSpeed(toMbps(ulBytes, ulElapsed))} Mbps`;
+
+            const saved = await API.lan.saveResult({
+                download_bytes: dlBytes,
+                download_elapsed: dlElapsed,
+                upload_bytes: ulBytes,
+                upload_elapsed: ulElapsed,
+                streams,
+            });
+            phase.textContent = 'Completado';
+            Toast.success(`Test LAN: ${Utils.formatSpeed(saved.download_speed)} / ${Utils.formatSpeed(saved.upload_speed)} Mbps`);
+        } catch (err) {
+            phase.textContent = 'Error';
+            Toast.error(`Error en test LAN: ${err.message}`);
+        } finally {
+            this.isLanTesting = false;
+            btn.disabled = false;
+        }
+    },
+
+    // Live progress from the backend (SSE)
+    onTestProgress(ev, phases, setProgress) {
+        const phase = document.getElementById('testPhase');
+        // Map each phase's 0..1 progress onto its slice of the ring
+        const ranges = {
+            start: [0, 1, 5],
+            ping: [1, 5, 15],
+            download: [2, 15, 50],
+            upload: [3, 50, 85],
+        };
+        const range = ranges[ev.phase];
+        if (!range) return;
+
+        const [idx, from, to] = range;
+        phase.textContent = phases[idx].text;
+        setProgress(from + (to - from) * Math.min(ev.progress || 0, 1));
+
+        if (ev.phase === 'start') {
+            document.getElementById('liveServer').textContent = ev.server_name || '--';
+            document.getElementById('liveISP').textContent = ev.isp || '--';
+        } else if (ev.phase === 'ping') {
+            document.getElementById('livePing').textContent = `${Utils.formatPing(ev.ping)} ms`;
+            document.getElementById('liveJitter').textContent = `${Utils.formatPing(ev.jitter)} ms`;
+        } else if (ev.phase === 'download') {
+            document.getElementById('downloadValue').textContent = Utils.formatSpeed(ev.speed);
+            this.updateGauge(this.gaugeDownload, ev.speed);
+        } else if (ev.phase === 'upload') {
+            document.getElementById('uploadValue').textContent = Utils.formatSpeed(ev.speed);
+            this.updateGauge(this.gaugeUpload, ev.speed);
+        }
+    },
+
     // Demo simulation for when backend is not available
     async simulateTest(phases, circumference, progress, phase) {
         for (let i = 0; i < phases.length; i++) {